@@ -0,0 +1,73 @@
+"""Create the base tables when they do not exist yet
+
+Revision ID: 2a6d4c8e9f13
+Revises:
+Create Date: 2024-12-16 17:24:10.318640
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa  # noqa: F401
+
+
+# revision identifiers, used by Alembic.
+revision: str = "2a6d4c8e9f13"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Databases set up by init.sql or by the application already have the tables
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id UUID PRIMARY KEY,
+            username VARCHAR UNIQUE,
+            reputation_score INTEGER
+        )
+        """
+    )
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS products (
+            id UUID PRIMARY KEY,
+            title VARCHAR,
+            description VARCHAR,
+            price FLOAT,
+            seller_id UUID REFERENCES users (id),
+            average_rating FLOAT,
+            rating_count INTEGER
+        )
+        """
+    )
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS transactions (
+            id UUID PRIMARY KEY,
+            buyer_id UUID REFERENCES users (id),
+            product_id UUID REFERENCES products (id),
+            status VARCHAR,
+            amount FLOAT
+        )
+        """
+    )
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS reviews (
+            id UUID PRIMARY KEY,
+            user_id UUID REFERENCES users (id),
+            product_id UUID REFERENCES products (id),
+            rating INTEGER,
+            content VARCHAR
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    # The tables may have been created by init.sql or the application instead, so
+    # they are left in place
+    pass
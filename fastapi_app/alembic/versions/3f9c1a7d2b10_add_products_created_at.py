@@ -0,0 +1,31 @@
+"""Add products.created_at for keyset pagination
+
+Revision ID: 3f9c1a7d2b10
+Revises: b47542e9dc7e
+Create Date: 2026-10-18 09:12:41.518230
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa  # noqa: F401
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3f9c1a7d2b10"
+down_revision: Union[str, None] = "b47542e9dc7e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # init.sql already creates the column, tables created from the models did not
+    op.execute(
+        "ALTER TABLE products "
+        "ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ DEFAULT NOW()"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("products", "created_at")
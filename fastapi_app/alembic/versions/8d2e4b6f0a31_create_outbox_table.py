@@ -0,0 +1,37 @@
+"""Create the outbox table for transactional event publishing
+
+Revision ID: 8d2e4b6f0a31
+Revises: 3f9c1a7d2b10
+Create Date: 2026-10-18 11:47:05.204918
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa  # noqa: F401
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8d2e4b6f0a31"
+down_revision: Union[str, None] = "3f9c1a7d2b10"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS outbox (
+            id BIGSERIAL PRIMARY KEY,
+            subject VARCHAR NOT NULL,
+            payload JSON NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMPTZ DEFAULT NOW()
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("outbox")
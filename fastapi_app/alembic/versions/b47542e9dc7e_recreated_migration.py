@@ -1,7 +1,7 @@
 """Recreated migration
 
 Revision ID: b47542e9dc7e
-Revises:
+Revises: 2a6d4c8e9f13
 Create Date: 2024-12-16 17:25:53.871123
 
 """
@@ -14,7 +14,7 @@ import sqlalchemy as sa  # noqa: F401
 
 # revision identifiers, used by Alembic.
 revision: str = "b47542e9dc7e"
-down_revision: Union[str, None] = None
+down_revision: Union[str, None] = "2a6d4c8e9f13"
 branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
@@ -0,0 +1,35 @@
+"""Add products.rating_sum for atomic rating aggregation
+
+Revision ID: c71e5a9d4f28
+Revises: 8d2e4b6f0a31
+Create Date: 2026-10-18 12:08:17.904512
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa  # noqa: F401
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c71e5a9d4f28"
+down_revision: Union[str, None] = "8d2e4b6f0a31"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "ALTER TABLE products "
+        "ADD COLUMN IF NOT EXISTS rating_sum FLOAT NOT NULL DEFAULT 0"
+    )
+    # Seed the running sum from the ratings aggregated so far
+    op.execute(
+        "UPDATE products "
+        "SET rating_sum = COALESCE(average_rating, 0) * COALESCE(rating_count, 0)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("products", "rating_sum")
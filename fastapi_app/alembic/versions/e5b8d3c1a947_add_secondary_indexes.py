@@ -0,0 +1,62 @@
+"""Add indexes on the foreign keys and the product keyset
+
+Revision ID: e5b8d3c1a947
+Revises: c71e5a9d4f28
+Create Date: 2026-10-18 13:40:06.215873
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e5b8d3c1a947"
+down_revision: Union[str, None] = "c71e5a9d4f28"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = {
+    # GET /transactions/{user_id}
+    "ix_transactions_buyer_id": "transactions (buyer_id)",
+    "ix_transactions_product_id": "transactions (product_id)",
+    # GET /reviews/{product_id}
+    "ix_reviews_product_id": "reviews (product_id)",
+    "ix_reviews_user_id": "reviews (user_id)",
+    # Keyset pagination of GET /products/, with and without the seller filter
+    "ix_products_created_at_id": "products (created_at DESC, id DESC)",
+    "ix_products_seller_id_created_at_id": (
+        "products (seller_id, created_at DESC, id DESC)"
+    ),
+}
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY does not lock out writes, but cannot run inside
+    # a transaction. A build that failed halfway leaves an INVALID index behind,
+    # which IF NOT EXISTS would keep, so those are dropped and built again.
+    with op.get_context().autocommit_block():
+        invalid = set(
+            op.get_bind()
+            .execute(
+                sa.text(
+                    "SELECT pg_class.relname FROM pg_index "
+                    "JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+                    "WHERE NOT pg_index.indisvalid AND pg_class.relname = ANY(:names)"
+                ),
+                {"names": list(INDEXES)},
+            )
+            .scalars()
+        )
+        for name, columns in INDEXES.items():
+            if name in invalid:
+                op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {columns}")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -4,7 +4,10 @@
 
     Endpoints:
     - **POST /products/**: Add a new product to the catalog.
-    - **GET /products/**: Retrieve a list of all products.
+    - **POST /products/bulk**: Add several products at once, reporting the
+        rejected ones per item.
+    - **GET /products/**: Retrieve a page of products, optionally filtered by
+        ID, price, rating and seller, or stream all of them as NDJSON.
     - **GET /products/{product_id}**: Retrieve details of a specific product by its ID.
     - **POST /products/{product_id}/review/**: Update the average rating and
         rating count of a specific product.
@@ -14,31 +17,78 @@
     - **ProductCreateRequest**: Pydantic model for creating a new product.
     - **ProductResponse**: Pydantic model representing
         the response schema for a product.
+    - **ProductPageResponse**: Pydantic model representing a page of products.
     - **ErrorResponse**: Pydantic model used to represent error responses in the API.
 
     Dependencies:
     - **get_db**: Dependency to get the database session.
+    - **get_async_db**: Dependency to get the asyncio database session.
 
     Utilities:
     - **build_event**: Utility to build an event for NATS.
-    - **publish_event**: Utility to publish an event to NATS.
+    - **stage_event**: Utility to stage an event in the outbox, to be published
+        to NATS once the transaction commits.
+    - **ndjson_response**: Utility to stream query results as NDJSON.
 
     Raises:
     - **HTTPException**: Raised when a requested resource is not found
         or an error occurs during processing.
     """
 
+import uuid
+from typing import Annotated, Literal, Optional
+
 from dverse_nats_helper.event_builder import build_event
-from dverse_nats_helper.nats_connection import publish_event
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, status
 from pydantic import BaseModel
+from sqlalchemy import insert, literal, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.database import create_product, get_db, update_product
-from app.models import Product, User
+from app.bulk import (
+    MAX_BULK_ITEMS,
+    BulkCreateResponse,
+    BulkItemError,
+    BulkItemResult,
+    EventBatch,
+    batch_actor,
+    fetch_usernames,
+    parse_uuid,
+)
+from app.database import (
+    SessionLocal,
+    create_product_async,
+    get_async_db,
+    get_db,
+    update_product_async,
+    violated_foreign_key,
+)
+from app.models import Product
+from app.outbox import stage_event
+from app.pagination import decode_cursor, encode_cursor
+from app.streaming import NDJSON_MEDIA_TYPE, ndjson_response
 
 router = APIRouter()
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def product_to_dict(product: Product) -> dict:
+    """
+    Convert a Product to the dictionary returned by the list endpoints.
+    """
+    return {
+        "id": str(product.id),
+        "title": product.title,
+        "price": product.price,
+        "description": product.description,
+        "seller_id": str(product.seller_id),
+        "average_rating": product.average_rating,
+        "rating_count": product.rating_count,
+    }
+
 
 class ProductCreateRequest(BaseModel):
     """
@@ -115,6 +165,19 @@ class ProductResponse(BaseModel):
         }
 
 
+class ProductPageResponse(BaseModel):
+    """
+    ProductPageResponse is a Pydantic model representing a page of products.
+    Attributes:
+        products (list[ProductResponse]): The products on this page.
+        next_cursor (str, optional): Opaque token to fetch the next page with, or
+        None if this is the last page.
+    """
+
+    products: list[ProductResponse]
+    next_cursor: Optional[str] = None
+
+
 class ErrorResponse(BaseModel):
     """ErrorResponse model used to represent error responses in the API.
     Attributes:
@@ -149,7 +212,7 @@ class ErrorResponse(BaseModel):
     },
 )
 async def add_product(
-    product_data: ProductCreateRequest, db: Session = Depends(get_db)
+    product_data: ProductCreateRequest, db: AsyncSession = Depends(get_async_db)
 ):
     """
     Add a new product.
@@ -161,26 +224,29 @@ async def add_product(
     - **average_rating**: Average rating of the product (float, default: 0.0).
     - **rating_count**: Number of product ratings (int, default: 0).
     """
-    seller = db.query(User).filter(User.id == product_data.seller_id).first()
-    if not seller:
+    # The foreign key rejects a missing seller
+    try:
+        product, seller_username = await create_product_async(
+            db,
+            title=product_data.title,
+            description=product_data.description,
+            price=product_data.price,
+            seller_id=product_data.seller_id,
+            average_rating=product_data.average_rating,
+            rating_count=product_data.rating_count,
+            commit=False,
+        )
+    except IntegrityError as e:
+        if violated_foreign_key(e, "seller_id") is None:
+            raise
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Seller with id {product_data.seller_id} not found",
-        )
-
-    product = create_product(
-        db,
-        title=product_data.title,
-        description=product_data.description,
-        price=product_data.price,
-        seller_id=product_data.seller_id,
-        average_rating=product_data.average_rating,
-        rating_count=product_data.rating_count,
-    )
+        ) from e
 
     new_event = build_event(
         product,
-        actor={"actor_id": str(seller.id), "username": seller.username},
+        actor={"actor_id": str(product.seller_id), "username": seller_username},
         system={
             "platform": "marketplace",
             "service": "products",
@@ -188,7 +254,8 @@ async def add_product(
         },
     )
 
-    await publish_event("product.created", new_event)
+    stage_event(db, "product.created", new_event)
+    await db.commit()
 
     return {
         "message": "Product created successfully",
@@ -196,23 +263,153 @@ async def add_product(
     }
 
 
+# Add products in bulk
+@router.post(
+    "/products/bulk",
+    status_code=status.HTTP_201_CREATED,
+    summary="Create products in bulk",
+    description=(
+        f"Add up to {MAX_BULK_ITEMS} products to the catalog at once. The products "
+        "are inserted in a single transaction and announced with one batched event. "
+        "Products referring to a missing seller are skipped and reported by their "
+        "index."
+    ),
+    response_description="The created and the rejected products.",
+    responses={
+        201: {"model": BulkCreateResponse, "description": "Products processed."},
+        404: {
+            "model": ErrorResponse,
+            "description": "A seller was deleted while the products were created.",
+        },
+        500: {"description": "Internal server error."},
+    },
+)
+async def add_products_bulk(
+    products_data: Annotated[
+        list[ProductCreateRequest], Body(min_length=1, max_length=MAX_BULK_ITEMS)
+    ],
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Add several products at once.
+
+    Takes an array of products with the same fields as `POST /products/`.
+    """
+    errors = []
+    seller_ids = {}
+    for index, product_data in enumerate(products_data):
+        seller_id = parse_uuid(product_data.seller_id)
+        if seller_id is None:
+            errors.append(
+                BulkItemError(
+                    index=index, detail=f"Invalid seller id {product_data.seller_id}"
+                )
+            )
+        else:
+            seller_ids[index] = seller_id
+
+    sellers = await fetch_usernames(db, seller_ids.values())
+
+    rows = []
+    created = []
+    for index, seller_id in seller_ids.items():
+        if seller_id not in sellers:
+            errors.append(
+                BulkItemError(
+                    index=index, detail=f"Seller with id {seller_id} not found"
+                )
+            )
+            continue
+        product_data = products_data[index]
+        row = {
+            "id": uuid.uuid4(),
+            "title": product_data.title,
+            "description": product_data.description,
+            "price": product_data.price,
+            "seller_id": seller_id,
+            "average_rating": product_data.average_rating,
+            "rating_count": product_data.rating_count,
+            "rating_sum": product_data.average_rating * product_data.rating_count,
+        }
+        rows.append(row)
+        created.append(BulkItemResult(index=index, id=str(row["id"])))
+
+    if rows:
+        # The foreign key rejects a seller deleted since it was looked up
+        try:
+            await db.execute(insert(Product), rows)
+        except IntegrityError as e:
+            if violated_foreign_key(e, "seller_id") is None:
+                raise
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="A seller was deleted, no products were created",
+            ) from e
+        new_event = build_event(
+            EventBatch([Product(**row) for row in rows]),
+            actor=batch_actor((row["seller_id"] for row in rows), sellers),
+            system={
+                "platform": "marketplace",
+                "service": "products",
+                "event_type": "created",
+            },
+        )
+        stage_event(db, "product.created.batch", new_event)
+        await db.commit()
+
+    return BulkCreateResponse(
+        message=f"Created {len(created)} of {len(products_data)} products",
+        created=created,
+        errors=sorted(errors, key=lambda error: error.index),
+    )
+
+
 # Get all products
 @router.get(
     "/products/",
     status_code=status.HTTP_200_OK,
     summary="Retrieve all products",
-    description="Fetch a list of all products available in the catalog.",
-    response_description="A list of products with their details.",
+    description=(
+        "Fetch a page of products available in the catalog, newest first. "
+        "Pass the returned `next_cursor` back as `cursor` to fetch the next page."
+    ),
+    response_description="A page of products with their details.",
     responses={
-        200: {"model": list[ProductResponse], "description": "List of products."},
+        200: {
+            "model": ProductPageResponse,
+            "description": "Page of products, or an NDJSON stream of products.",
+            "content": {NDJSON_MEDIA_TYPE: {}},
+        },
+        400: {"model": ErrorResponse, "description": "Invalid cursor."},
+        404: {"model": ErrorResponse, "description": "No products found."},
         500: {"description": "Internal server error."},
     },
 )
-def get_products(db: Session = Depends(get_db)):
+def get_products(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    price_min: Optional[float] = None,
+    price_max: Optional[float] = None,
+    min_rating: Optional[float] = None,
+    seller_id: Optional[uuid.UUID] = None,
+    ids: Optional[list[uuid.UUID]] = Query(None, max_length=MAX_PAGE_SIZE),
+    response_format: Literal["json", "ndjson"] = Query("json", alias="format"),
+):
     """
-    Retrieve all products.
-
-    Returns a list of all products with details such as:
+    Retrieve a page of products.
+
+    - **limit**: Maximum number of products to return (default: 50, max: 500).
+    - **cursor**: Opaque `next_cursor` token returned by the previous page.
+    - **price_min**: Only return products priced at or above this value.
+    - **price_max**: Only return products priced at or below this value.
+    - **min_rating**: Only return products with at least this average rating.
+    - **seller_id**: Only return products listed by this seller.
+    - **ids**: Only return the products with these IDs; repeat the parameter to
+        fetch several products in one request (max: 500).
+    - **format**: `json` (default) for a page of products, or `ndjson` to stream
+        every matching product, one JSON document per line, ignoring `limit`.
+
+    Returns a list of products with details such as:
     - **id**: Product ID.
     - **title**: Product title.
     - **price**: Product price.
@@ -221,23 +418,52 @@ def get_products(db: Session = Depends(get_db)):
     - **average_rating**: Average rating of the product.
     - **rating_count**: Number of ratings the product has received.
     """
-    products = db.query(Product).all()
-    if products:
-        return {
-            "message": "Products found",
-            "products": [
-                {
-                    "id": str(product.id),
-                    "title": product.title,
-                    "price": product.price,
-                    "description": product.description,
-                    "seller_id": str(product.seller_id),
-                    "average_rating": product.average_rating,
-                    "rating_count": product.rating_count,
-                }
-                for product in products
-            ],
-        }
+    statement = select(Product)
+    if price_min is not None:
+        statement = statement.where(Product.price >= price_min)
+    if price_max is not None:
+        statement = statement.where(Product.price <= price_max)
+    if min_rating is not None:
+        statement = statement.where(Product.average_rating >= min_rating)
+    if seller_id is not None:
+        statement = statement.where(Product.seller_id == seller_id)
+    if ids:
+        statement = statement.where(Product.id.in_(ids))
+    if cursor is not None:
+        try:
+            cursor_created_at, cursor_id = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e),
+            ) from e
+        statement = statement.where(
+            tuple_(Product.created_at, Product.id)
+            < tuple_(
+                literal(cursor_created_at, Product.created_at.type),
+                literal(cursor_id, Product.id.type),
+            )
+        )
+    statement = statement.order_by(Product.created_at.desc(), Product.id.desc())
+
+    if response_format == "ndjson":
+        return ndjson_response(statement, product_to_dict)
+
+    # Not a `get_db` dependency, which would be held while a stream is sent
+    with SessionLocal() as db:
+        # Fetch one extra row to find out whether there is a next page
+        products = db.scalars(statement.limit(limit + 1)).all()
+        if products:
+            next_cursor = None
+            if len(products) > limit:
+                products = products[:limit]
+                next_cursor = encode_cursor(products[-1].created_at, products[-1].id)
+
+            return {
+                "message": "Products found",
+                "products": [product_to_dict(product) for product in products],
+                "next_cursor": next_cursor,
+            }
 
     raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
@@ -313,7 +539,7 @@ async def update_product_rating(
     product_id: str,
     average_rating: float,
     rating_count: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Update a product's rating details.
@@ -322,15 +548,29 @@ async def update_product_rating(
     - **average_rating**: The new average rating for the product.
     - **rating_count**: The updated count of ratings for the product.
     """
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await db.scalar(select(Product).where(Product.id == product_id))
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Product with id {product_id} not found",
         )
 
-    product = update_product(db, product, average_rating, rating_count)
-    await publish_event("product.updated", f"Product {product_id} rating updated.")
+    product = await update_product_async(
+        db, product, average_rating, rating_count, commit=False
+    )
+
+    new_event = build_event(
+        product,
+        actor={"actor_id": "", "username": ""},
+        system={
+            "platform": "marketplace",
+            "service": "products",
+            "event_type": "updated",
+        },
+    )
+
+    stage_event(db, "product.updated", new_event)
+    await db.commit()
     return {
         "message": "Product rating updated successfully",
         "new_average_rating": product.average_rating,
@@ -351,22 +591,19 @@ async def update_product_rating(
         500: {"description": "Internal server error."},
     },
 )
-async def delete_product(product_id: str, db: Session = Depends(get_db)):
+async def delete_product(product_id: str, db: AsyncSession = Depends(get_async_db)):
     """
     Delete a product by its ID.
 
     - **product_id**: The ID of the product to delete.
     """
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await db.scalar(select(Product).where(Product.id == product_id))
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Product with id {product_id} not found",
         )
 
-    db.delete(product)
-    db.commit()
-
     new_event = build_event(
         product,
         actor={"actor_id": "", "username": ""},
@@ -377,6 +614,8 @@ async def delete_product(product_id: str, db: Session = Depends(get_db)):
         },
     )
 
-    await publish_event("product.deleted", new_event)
+    await db.delete(product)
+    stage_event(db, "product.deleted", new_event)
+    await db.commit()
 
     return {"message": "Product deleted successfully"}
@@ -3,7 +3,10 @@ This module defines the API endpoints for managing product reviews using FastAPI
 
 Endpoints:
 - POST /reviews/: Add a new review for a product.
-- GET /reviews/: Retrieve all reviews across all products.
+- POST /reviews/bulk: Add several reviews at once, reporting the rejected ones
+    per item.
+- GET /reviews/: Retrieve all reviews across all products, optionally streamed
+    as NDJSON.
 - GET /reviews/{product_id}: Retrieve all reviews for a specific product.
 
 Classes:
@@ -14,21 +17,65 @@ Classes:
 
 Functions:
 - add_review: Endpoint to create a new review for a product.
+- add_reviews_bulk: Endpoint to create several reviews at once.
 - get_reviews: Endpoint to retrieve all reviews.
 - get_reviews_per_product: Endpoint to retrieve all reviews for a specific product.
 """
 
+import uuid
+from typing import Annotated, Literal
+
 from dverse_nats_helper.event_builder import build_event
-from dverse_nats_helper.nats_connection import publish_event
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, status
 from pydantic import BaseModel
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.database import create_review, get_db, update_product
-from app.models import Product, Review, User
+from app.bulk import (
+    MAX_BULK_ITEMS,
+    BulkCreateResponse,
+    BulkItemError,
+    BulkItemResult,
+    EventBatch,
+    batch_actor,
+    fetch_product_ids,
+    fetch_usernames,
+    parse_uuid,
+)
+from app.database import (
+    SessionLocal,
+    add_product_rating_async,
+    add_product_ratings_async,
+    create_review_async,
+    get_async_db,
+    get_db,
+    violated_foreign_key,
+)
+from app.models import Review
+from app.outbox import stage_event
+from app.streaming import NDJSON_MEDIA_TYPE, ndjson_response
 
 router = APIRouter()
 
+# Range of the ratings accepted by the reviews table
+MIN_RATING = 1
+MAX_RATING = 5
+
+
+def review_to_dict(review: Review) -> dict:
+    """
+    Convert a Review to the dictionary returned by the list endpoints.
+    """
+    return {
+        "id": str(review.id),
+        "rating": review.rating,
+        "content": review.content,
+        "user_id": str(review.user_id),
+        "product_id": str(review.product_id),
+    }
+
 
 class ReviewCreateRequest(BaseModel):
     """
@@ -136,7 +183,9 @@ class ErrorResponse(BaseModel):
         500: {"description": "Internal server error."},
     },
 )
-async def add_review(review_data: ReviewCreateRequest, db: Session = Depends(get_db)):
+async def add_review(
+    review_data: ReviewCreateRequest, db: AsyncSession = Depends(get_async_db)
+):
     """
     Create a review for a product.
 
@@ -145,44 +194,38 @@ async def add_review(review_data: ReviewCreateRequest, db: Session = Depends(get
     - **rating**: Rating given to the product (e.g., 1-5).
     - **content**: Written feedback about the product.
     """
-    user = db.query(User).filter(User.id == review_data.user_id).first()
-    if not user:
+    # Count the rating in the same transaction as the review, without reading
+    # the product first
+    product_rating = await add_product_rating_async(
+        db, review_data.product_id, review_data.rating
+    )
+    if product_rating is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"User with id {review_data.user_id} not found",
+            detail=f"Product with id {review_data.product_id} not found",
         )
 
-    # Check if product exists
-    product = db.query(Product).filter(Product.id == review_data.product_id).first()
-    if not product:
+    # The foreign key rejects a missing user
+    try:
+        review, username = await create_review_async(
+            db,
+            user_id=review_data.user_id,
+            product_id=review_data.product_id,
+            rating=review_data.rating,
+            content=review_data.content,
+            commit=False,
+        )
+    except IntegrityError as e:
+        if violated_foreign_key(e, "user_id") is None:
+            raise
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Product with id {review_data.product_id} not found",
-        )
-
-    average_rating = product.average_rating or 0
-    rating_count = product.rating_count or 0
-
-    # Update the average rating and rating count
-    average_rating = (average_rating * rating_count + review_data.rating) / (
-        rating_count + 1
-    )
-    rating_count += 1
-
-    # Create the review
-    review = create_review(
-        db,
-        user_id=review_data.user_id,
-        product_id=review_data.product_id,
-        rating=review_data.rating,
-        content=review_data.content,
-    )
-
-    product = update_product(db, product, average_rating, rating_count)
+            detail=f"User with id {review_data.user_id} not found",
+        ) from e
 
     new_event = build_event(
         review,
-        actor={"actor_id": str(user.id), "username": user.username},
+        actor={"actor_id": str(review.user_id), "username": username},
         system={
             "platform": "marketplace",
             "service": "reviews",
@@ -190,7 +233,8 @@ async def add_review(review_data: ReviewCreateRequest, db: Session = Depends(get
         },
     )
 
-    await publish_event("review.created", new_event)
+    stage_event(db, "review.created", new_event)
+    await db.commit()
 
     return {
         "message": "Review created successfully",
@@ -200,12 +244,127 @@ async def add_review(review_data: ReviewCreateRequest, db: Session = Depends(get
             "content": review.content,
             "user_id": str(review.user_id),
             "product_id": str(review.product_id),
-            "new_average_rating": product.average_rating,
-            "rating_count": product.rating_count,
+            "new_average_rating": product_rating.average_rating,
+            "rating_count": product_rating.rating_count,
         },
     }
 
 
+# Add reviews in bulk
+@router.post(
+    "/reviews/bulk",
+    status_code=status.HTTP_201_CREATED,
+    summary="Create reviews in bulk",
+    description=(
+        f"Add up to {MAX_BULK_ITEMS} reviews at once. The reviews and the rating "
+        "changes of their products are written in a single transaction and "
+        "announced with one batched event. Reviews referring to a missing user or "
+        "product, or with a rating outside 1-5, are skipped and reported by their "
+        "index."
+    ),
+    response_description="The created and the rejected reviews.",
+    responses={
+        201: {"model": BulkCreateResponse, "description": "Reviews processed."},
+        404: {
+            "model": ErrorResponse,
+            "description": "A user or product was deleted while the reviews were "
+            "created.",
+        },
+        500: {"description": "Internal server error."},
+    },
+)
+async def add_reviews_bulk(
+    reviews_data: Annotated[
+        list[ReviewCreateRequest], Body(min_length=1, max_length=MAX_BULK_ITEMS)
+    ],
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Add several reviews at once.
+
+    Takes an array of reviews with the same fields as `POST /reviews/`.
+    """
+    errors = []
+    references = {}
+    for index, review_data in enumerate(reviews_data):
+        user_id = parse_uuid(review_data.user_id)
+        product_id = parse_uuid(review_data.product_id)
+        if user_id is None:
+            detail = f"Invalid user id {review_data.user_id}"
+        elif product_id is None:
+            detail = f"Invalid product id {review_data.product_id}"
+        elif not MIN_RATING <= review_data.rating <= MAX_RATING:
+            detail = f"Rating must be between {MIN_RATING} and {MAX_RATING}"
+        else:
+            references[index] = (user_id, product_id)
+            continue
+        errors.append(BulkItemError(index=index, detail=detail))
+
+    users = await fetch_usernames(db, (user for user, _ in references.values()))
+    products = await fetch_product_ids(
+        db, (product for _, product in references.values())
+    )
+
+    rows = []
+    created = []
+    ratings = {}
+    for index, (user_id, product_id) in references.items():
+        if user_id not in users:
+            detail = f"User with id {user_id} not found"
+        elif product_id not in products:
+            detail = f"Product with id {product_id} not found"
+        else:
+            review_data = reviews_data[index]
+            row = {
+                "id": uuid.uuid4(),
+                "user_id": user_id,
+                "product_id": product_id,
+                "rating": review_data.rating,
+                "content": review_data.content,
+            }
+            rows.append(row)
+            ratings.setdefault(product_id, []).append(review_data.rating)
+            created.append(BulkItemResult(index=index, id=str(row["id"])))
+            continue
+        errors.append(BulkItemError(index=index, detail=detail))
+
+    if rows:
+        # The foreign keys reject a user or product deleted since it was looked up
+        try:
+            await db.execute(insert(Review), rows)
+        except IntegrityError as e:
+            column = violated_foreign_key(e, "user_id", "product_id")
+            if column == "user_id":
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="A user was deleted, no reviews were created",
+                ) from e
+            if column == "product_id":
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="A product was deleted, no reviews were created",
+                ) from e
+            raise
+        await add_product_ratings_async(db, ratings)
+        new_event = build_event(
+            EventBatch([Review(**row) for row in rows]),
+            actor=batch_actor((row["user_id"] for row in rows), users),
+            system={
+                "platform": "marketplace",
+                "service": "reviews",
+                "event_type": "posted",
+            },
+        )
+        stage_event(db, "review.created.batch", new_event)
+        await db.commit()
+
+    return BulkCreateResponse(
+        message=f"Created {len(created)} of {len(reviews_data)} reviews",
+        created=created,
+        errors=sorted(errors, key=lambda error: error.index),
+    )
+
+
 # Get all reviews
 @router.get(
     "/reviews/",
@@ -217,6 +376,7 @@ async def add_review(review_data: ReviewCreateRequest, db: Session = Depends(get
         200: {
             "description": "List of reviews retrieved successfully.",
             "content": {
+                NDJSON_MEDIA_TYPE: {},
                 "application/json": {
                     "example": {
                         "message": "Reviews found",
@@ -230,17 +390,22 @@ async def add_review(review_data: ReviewCreateRequest, db: Session = Depends(get
                             }
                         ],
                     }
-                }
+                },
             },
         },
         404: {"model": ErrorResponse, "description": "No reviews found."},
         500: {"description": "Internal server error."},
     },
 )
-def get_reviews(db: Session = Depends(get_db)):
+def get_reviews(
+    response_format: Literal["json", "ndjson"] = Query("json", alias="format"),
+):
     """
     Retrieve all reviews.
 
+    - **format**: `json` (default) for a single JSON document, or `ndjson` to stream
+        the reviews one JSON document per line.
+
     Returns a list of all reviews with details such as:
     - **id**: Review ID
     - **rating**: Product rating
@@ -248,21 +413,17 @@ def get_reviews(db: Session = Depends(get_db)):
     - **user_id**: User ID of the reviewer
     - **product_id**: Product ID of the reviewed product
     """
-    reviews = db.query(Review).all()
-    if reviews:
-        return {
-            "message": "Reviews found",
-            "reviews": [
-                {
-                    "id": str(review.id),
-                    "rating": review.rating,
-                    "content": review.content,
-                    "user_id": str(review.user_id),
-                    "product_id": str(review.product_id),
-                }
-                for review in reviews
-            ],
-        }
+    if response_format == "ndjson":
+        return ndjson_response(select(Review), review_to_dict)
+
+    # Not a `get_db` dependency, which would be held while a stream is sent
+    with SessionLocal() as db:
+        reviews = db.query(Review).all()
+        if reviews:
+            return {
+                "message": "Reviews found",
+                "reviews": [review_to_dict(review) for review in reviews],
+            }
 
     raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
@@ -312,16 +473,7 @@ def get_reviews_per_product(product_id: str, db: Session = Depends(get_db)):
     if reviews:
         return {
             "message": "Reviews found",
-            "reviews": [
-                {
-                    "id": str(review.id),
-                    "rating": review.rating,
-                    "content": review.content,
-                    "user_id": str(review.user_id),
-                    "product_id": str(review.product_id),
-                }
-                for review in reviews
-            ],
+            "reviews": [review_to_dict(review) for review in reviews],
         }
 
     raise HTTPException(
@@ -6,14 +6,17 @@ and retrieving transactions for a specific user.
 
 Endpoints:
 - POST /transactions/: Create a new transaction.
-- GET /transactions/: Retrieve all transactions.
+- POST /transactions/bulk: Create several transactions at once, reporting the
+    rejected ones per item.
+- GET /transactions/: Retrieve all transactions, optionally streamed as NDJSON.
 - GET /transactions/{user_id}: Retrieve transactions for a specific user.
 
 Dependencies:
 - FastAPI for API routing and request handling.
 - SQLAlchemy for database interactions.
 - Pydantic for data validation and serialization.
-- dverse_nats_helper for event building and publishing.
+- dverse_nats_helper for event building.
+- app.outbox for publishing events once the transaction commits.
 
 Models:
 - TransactionCreateRequest: Schema for creating a new transaction.
@@ -22,22 +25,60 @@ Models:
 
 Functions:
 - add_transaction: Endpoint to add a new transaction.
+- add_transactions_bulk: Endpoint to add several transactions at once.
 - get_all_transactions: Endpoint to retrieve all transactions.
 - get_user_transactions: Endpoint to retrieve transactions for a specific user.
 """
 
+import uuid
+from typing import Annotated, Literal
+
 from dverse_nats_helper.event_builder import build_event
-from dverse_nats_helper.nats_connection import publish_event
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, status
 from pydantic import BaseModel
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.database import create_transaction, get_db
-from app.models import Product, Transaction, User
+from app.bulk import (
+    MAX_BULK_ITEMS,
+    BulkCreateResponse,
+    BulkItemError,
+    BulkItemResult,
+    EventBatch,
+    batch_actor,
+    fetch_product_ids,
+    fetch_usernames,
+    parse_uuid,
+)
+from app.database import (
+    SessionLocal,
+    create_transaction_async,
+    get_async_db,
+    get_db,
+    violated_foreign_key,
+)
+from app.models import Transaction, User
+from app.outbox import stage_event
+from app.streaming import NDJSON_MEDIA_TYPE, ndjson_response
 
 router = APIRouter()
 
 
+def transaction_to_dict(transaction: Transaction) -> dict:
+    """
+    Convert a Transaction to the dictionary returned by the list endpoints.
+    """
+    return {
+        "id": str(transaction.id),
+        "status": transaction.status,
+        "buyer_id": str(transaction.buyer_id),
+        "product_id": str(transaction.product_id),
+        "amount": transaction.amount,
+    }
+
+
 class TransactionCreateRequest(BaseModel):
     """
     Represents a request to create a new transaction.
@@ -133,7 +174,8 @@ class ErrorResponse(BaseModel):
     },
 )
 async def add_transaction(
-    transaction_data: TransactionCreateRequest, db: Session = Depends(get_db)
+    transaction_data: TransactionCreateRequest,
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Add a new transaction.
@@ -143,36 +185,33 @@ async def add_transaction(
     - **status**: Status of the transaction (e.g., 'Pending', 'Completed', etc.).
     - **amount**: Amount of the transaction.
     """
-    # Check if buyer (user) exists
-    buyer = db.query(User).filter(User.id == transaction_data.buyer_id).first()
-    if not buyer:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Buyer (user) with id {transaction_data.buyer_id} not found",
+    # The foreign keys reject a missing buyer or product
+    try:
+        transaction, buyer_username = await create_transaction_async(
+            db,
+            buyer_id=transaction_data.buyer_id,
+            product_id=transaction_data.product_id,
+            status=transaction_data.status,
+            amount=transaction_data.amount,
+            commit=False,
         )
-
-    # Check if product exists
-    product = (
-        db.query(Product).filter(Product.id == transaction_data.product_id).first()
-    )
-    if not product:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Product with id {transaction_data.product_id} not found",
-        )
-
-    # Create the transaction
-    transaction = create_transaction(
-        db,
-        buyer_id=transaction_data.buyer_id,
-        product_id=transaction_data.product_id,
-        status=transaction_data.status,
-        amount=transaction_data.amount,
-    )
+    except IntegrityError as e:
+        column = violated_foreign_key(e, "buyer_id", "product_id")
+        if column == "buyer_id":
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Buyer (user) with id {transaction_data.buyer_id} not found",
+            ) from e
+        if column == "product_id":
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Product with id {transaction_data.product_id} not found",
+            ) from e
+        raise
 
     new_event = build_event(
         transaction,
-        actor={"actor_id": str(buyer.id), "username": buyer.username},
+        actor={"actor_id": str(transaction.buyer_id), "username": buyer_username},
         system={
             "platform": "marketplace",
             "service": "transactions",
@@ -180,7 +219,8 @@ async def add_transaction(
         },
     )
 
-    await publish_event("transaction.created", new_event)
+    stage_event(db, "transaction.created", new_event)
+    await db.commit()
 
     return {
         "message": "Transaction created successfully",
@@ -188,6 +228,116 @@ async def add_transaction(
     }
 
 
+# Add transactions in bulk
+@router.post(
+    "/transactions/bulk",
+    status_code=status.HTTP_201_CREATED,
+    summary="Create transactions in bulk",
+    description=(
+        f"Record up to {MAX_BULK_ITEMS} transactions at once. The transactions are "
+        "inserted in a single database transaction and announced with one batched "
+        "event. Transactions referring to a missing buyer or product are skipped "
+        "and reported by their index."
+    ),
+    response_description="The created and the rejected transactions.",
+    responses={
+        201: {"model": BulkCreateResponse, "description": "Transactions processed."},
+        404: {
+            "model": ErrorResponse,
+            "description": "A buyer or product was deleted while the transactions "
+            "were created.",
+        },
+        500: {"description": "Internal server error."},
+    },
+)
+async def add_transactions_bulk(
+    transactions_data: Annotated[
+        list[TransactionCreateRequest],
+        Body(min_length=1, max_length=MAX_BULK_ITEMS),
+    ],
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Add several transactions at once.
+
+    Takes an array of transactions with the same fields as `POST /transactions/`.
+    """
+    errors = []
+    references = {}
+    for index, transaction_data in enumerate(transactions_data):
+        buyer_id = parse_uuid(transaction_data.buyer_id)
+        product_id = parse_uuid(transaction_data.product_id)
+        if buyer_id is None:
+            detail = f"Invalid buyer id {transaction_data.buyer_id}"
+        elif product_id is None:
+            detail = f"Invalid product id {transaction_data.product_id}"
+        else:
+            references[index] = (buyer_id, product_id)
+            continue
+        errors.append(BulkItemError(index=index, detail=detail))
+
+    buyers = await fetch_usernames(db, (buyer for buyer, _ in references.values()))
+    products = await fetch_product_ids(
+        db, (product for _, product in references.values())
+    )
+
+    rows = []
+    created = []
+    for index, (buyer_id, product_id) in references.items():
+        if buyer_id not in buyers:
+            detail = f"Buyer (user) with id {buyer_id} not found"
+        elif product_id not in products:
+            detail = f"Product with id {product_id} not found"
+        else:
+            transaction_data = transactions_data[index]
+            row = {
+                "id": uuid.uuid4(),
+                "buyer_id": buyer_id,
+                "product_id": product_id,
+                "status": transaction_data.status,
+                "amount": transaction_data.amount,
+            }
+            rows.append(row)
+            created.append(BulkItemResult(index=index, id=str(row["id"])))
+            continue
+        errors.append(BulkItemError(index=index, detail=detail))
+
+    if rows:
+        # The foreign keys reject a buyer or product deleted since it was looked up
+        try:
+            await db.execute(insert(Transaction), rows)
+        except IntegrityError as e:
+            column = violated_foreign_key(e, "buyer_id", "product_id")
+            if column == "buyer_id":
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="A buyer (user) was deleted, no transactions were created",
+                ) from e
+            if column == "product_id":
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="A product was deleted, no transactions were created",
+                ) from e
+            raise
+        new_event = build_event(
+            EventBatch([Transaction(**row) for row in rows]),
+            actor=batch_actor((row["buyer_id"] for row in rows), buyers),
+            system={
+                "platform": "marketplace",
+                "service": "transactions",
+                "event_type": "started",
+            },
+        )
+        stage_event(db, "transaction.created.batch", new_event)
+        await db.commit()
+
+    return BulkCreateResponse(
+        message=f"Created {len(created)} of {len(transactions_data)} transactions",
+        created=created,
+        errors=sorted(errors, key=lambda error: error.index),
+    )
+
+
 # Get all transactions
 @router.get(
     "/transactions/",
@@ -202,6 +352,7 @@ async def add_transaction(
         200: {
             "description": "List of transactions retrieved successfully.",
             "content": {
+                NDJSON_MEDIA_TYPE: {},
                 "application/json": {
                     "example": {
                         "message": "Transactions found",
@@ -215,17 +366,22 @@ async def add_transaction(
                             }
                         ],
                     }
-                }
+                },
             },
         },
         404: {"model": ErrorResponse, "description": "No transactions found."},
         500: {"description": "Internal server error."},
     },
 )
-def get_all_transactions(db: Session = Depends(get_db)):
+def get_all_transactions(
+    response_format: Literal["json", "ndjson"] = Query("json", alias="format"),
+):
     """
     Retrieve all transactions.
 
+    - **format**: `json` (default) for a single JSON document, or `ndjson` to stream
+        the transactions one JSON document per line.
+
     Returns a list of transactions with details such as:
     - **id**: Transaction ID.
     - **status**: Transaction status (e.g., 'Pending', 'Completed').
@@ -233,22 +389,20 @@ def get_all_transactions(db: Session = Depends(get_db)):
     - **product_id**: ID of the product involved in the transaction.
     - **amount**: Transaction amount.
     """
-    transactions = db.query(Transaction).all()
-
-    if transactions:
-        return {
-            "message": "Transactions found",
-            "transactions": [
-                {
-                    "id": str(transaction.id),
-                    "status": transaction.status,
-                    "buyer_id": str(transaction.buyer_id),
-                    "product_id": str(transaction.product_id),
-                    "amount": transaction.amount,
-                }
-                for transaction in transactions
-            ],
-        }
+    if response_format == "ndjson":
+        return ndjson_response(select(Transaction), transaction_to_dict)
+
+    # Not a `get_db` dependency, which would be held while a stream is sent
+    with SessionLocal() as db:
+        transactions = db.query(Transaction).all()
+
+        if transactions:
+            return {
+                "message": "Transactions found",
+                "transactions": [
+                    transaction_to_dict(transaction) for transaction in transactions
+                ],
+            }
 
     raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
@@ -309,14 +463,7 @@ def get_user_transactions(user_id: int, db: Session = Depends(get_db)):
         return {
             "message": "Transactions found",
             "transactions": [
-                {
-                    "id": str(transaction.id),
-                    "status": transaction.status,
-                    "buyer_id": str(transaction.buyer_id),
-                    "product_id": str(transaction.product_id),
-                    "amount": transaction.amount,
-                }
-                for transaction in transactions
+                transaction_to_dict(transaction) for transaction in transactions
             ],
         }
 
@@ -15,6 +15,7 @@ Models:
 
 Dependencies:
 - get_db: Dependency to get the database session.
+- get_async_db: Dependency to get the asyncio database session.
 
 Exceptions:
 - HTTPException: Raised for various HTTP errors such as user not found
@@ -23,9 +24,11 @@ Exceptions:
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.database import create_user, get_db
+from app.database import create_user_async, get_async_db, get_db
 from app.models import User
 
 router = APIRouter()
@@ -111,21 +114,22 @@ class ErrorResponse(BaseModel):
         500: {"description": "Internal server error."},
     },
 )
-def add_user(user_data: UserCreateRequest, db: Session = Depends(get_db)):
+async def add_user(
+    user_data: UserCreateRequest, db: AsyncSession = Depends(get_async_db)
+):
     """
     Create a new user.
 
     - **username**: The unique username for the new user.
     """
-    # Check if the user already exists
-    existing_user = db.query(User).filter(User.username == user_data.username).first()
-    if existing_user:
+    # The unique constraint rejects a username that already exists
+    try:
+        user = await create_user_async(db, username=user_data.username)
+    except IntegrityError as e:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="Username already exists",
-        )
-
-    user = create_user(db, username=user_data.username)
+        ) from e
     return {
         "message": "User created successfully",
         "user": {"id": str(user.id), "username": user.username},
@@ -0,0 +1,165 @@
+"""
+This module provides the shared building blocks of the bulk create endpoints.
+
+The bulk endpoints accept an array of create requests and handle it in a single
+database transaction:
+
+1. All items are validated in one pass. The users and products they refer to are
+   looked up with one query per table instead of one per item.
+2. The valid items are inserted with a single executemany statement.
+3. One batched event describing all created items is staged in the outbox.
+
+Items failing validation are skipped and reported back by their index in the
+request array, so a single bad item does not reject the whole batch.
+
+Classes:
+    BulkItemResult: An item created by a bulk request.
+    BulkItemError: An item rejected by a bulk request.
+    BulkCreateResponse: The response of a bulk create endpoint.
+    EventBatch: Groups the entities created by a bulk request into one event.
+
+Functions:
+    parse_uuid: Parse an id from a request, or return None if it is malformed.
+    fetch_usernames: Look up the usernames of a set of users in one query.
+    fetch_product_ids: Look up which of a set of products exist in one query.
+    batch_actor: Build the actor of a batched event.
+"""
+
+import uuid
+from typing import Iterable, Optional
+
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Product, User
+
+# Maximum number of items accepted by a single bulk request
+MAX_BULK_ITEMS = 1000
+
+
+class BulkItemResult(BaseModel):
+    """
+    An item created by a bulk request.
+
+    Attributes:
+        index (int): The position of the item in the request array.
+        id (str): The ID of the created row.
+    """
+
+    index: int
+    id: str
+
+
+class BulkItemError(BaseModel):
+    """
+    An item rejected by a bulk request.
+
+    Attributes:
+        index (int): The position of the item in the request array.
+        detail (str): Why the item was rejected.
+    """
+
+    index: int
+    detail: str
+
+
+class BulkCreateResponse(BaseModel):
+    """
+    The response of a bulk create endpoint.
+
+    Attributes:
+        message (str): A summary of the request.
+        created (list[BulkItemResult]): The items that were created.
+        errors (list[BulkItemError]): The items that were rejected.
+    """
+
+    message: str
+    created: list[BulkItemResult]
+    errors: list[BulkItemError]
+
+    class Config:
+        """
+        Configuration for the schema example.
+        """
+
+        json_schema_extra = {
+            "example": {
+                "message": "Created 1 of 2 items",
+                "created": [{"index": 0, "id": "3fa85f64-5717-4562-b3fc-2c963f66afa6"}],
+                "errors": [{"index": 1, "detail": "User with id 1 not found"}],
+            }
+        }
+
+
+class EventBatch:
+    """
+    Groups the entities created by a bulk request into the object of one event.
+
+    Attributes:
+        entities (list): The created entities, each providing `to_event_object`.
+    """
+
+    def __init__(self, entities: list):
+        self.entities = entities
+
+    def to_event_object(self):
+        """
+        Converts the batch to a dictionary that can be used in events."""
+        return {
+            "count": len(self.entities),
+            "items": [entity.to_event_object() for entity in self.entities],
+        }
+
+
+def parse_uuid(value) -> Optional[uuid.UUID]:
+    """
+    Parse an id from a request, or return None if it is malformed.
+    """
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+async def fetch_usernames(
+    db: AsyncSession, user_ids: Iterable[uuid.UUID]
+) -> dict[uuid.UUID, str]:
+    """
+    Look up the usernames of a set of users in one query.
+
+    Returns:
+        dict[UUID, str]: The username per id, for the users that exist.
+    """
+    user_ids = set(user_ids)
+    if not user_ids:
+        return {}
+    rows = await db.execute(select(User.id, User.username).where(User.id.in_(user_ids)))
+    return {user_id: username for user_id, username in rows}
+
+
+async def fetch_product_ids(
+    db: AsyncSession, product_ids: Iterable[uuid.UUID]
+) -> set[uuid.UUID]:
+    """
+    Look up which of a set of products exist in one query.
+
+    Returns:
+        set[UUID]: The ids of the products that exist.
+    """
+    product_ids = set(product_ids)
+    if not product_ids:
+        return set()
+    return set(await db.scalars(select(Product.id).where(Product.id.in_(product_ids))))
+
+
+def batch_actor(actor_ids: Iterable[uuid.UUID], usernames: dict) -> dict:
+    """
+    Build the actor of a batched event: the user behind all items if they share
+    one, and an anonymous actor otherwise.
+    """
+    actor_ids = set(actor_ids)
+    if len(actor_ids) == 1:
+        actor_id = actor_ids.pop()
+        return {"actor_id": str(actor_id), "username": usernames[actor_id]}
+    return {"actor_id": "", "username": ""}
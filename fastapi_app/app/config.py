@@ -12,6 +12,8 @@
 
     Functions:
         load_dotenv: Loads environment variables from a .env file.
+        to_async_database_url: Switches a PostgreSQL database URL to asyncpg.
+        env_flag: Reads a boolean flag from the environment.
 
     Environment Variables:
         FASTAPI_URL: The URL for the FastAPI application.
@@ -22,15 +24,79 @@
         POSTGRES_HOST: The host address for the PostgreSQL database.
         POSTGRES_PORT: The port number for the PostgreSQL database.
         DATABASE_URL: The full database URL for the PostgreSQL database.
+        ASYNC_DATABASE_URL: The database URL used by the asyncio engine. Defaults to
+        DATABASE_URL with its driver switched to asyncpg.
+        DB_POOL_SIZE: Number of connections the sync engine keeps open.
+        DB_MAX_OVERFLOW: Number of connections the sync engine opens on top of
+        DB_POOL_SIZE under load.
+        DB_ASYNC_POOL_SIZE: Number of connections the asyncio engine keeps open.
+        Defaults to DB_POOL_SIZE.
+        DB_ASYNC_MAX_OVERFLOW: Number of connections the asyncio engine opens on
+        top of DB_ASYNC_POOL_SIZE under load. Defaults to DB_MAX_OVERFLOW.
+        DB_POOL_TIMEOUT: Seconds to wait for a free connection before failing.
+        DB_POOL_RECYCLE: Seconds after which a connection is replaced, -1 to never
+        recycle connections.
+        DB_POOL_PRE_PING: Whether to test connections for liveness on checkout.
+        OUTBOX_BATCH_SIZE: Maximum number of outbox events published per batch.
+        OUTBOX_POLL_INTERVAL: Seconds the outbox relay waits for new events when
+        idle.
+        OUTBOX_MAX_BACKOFF: Upper bound in seconds of the outbox retry delay.
+        EVENT_QUEUE_SIZE: Maximum number of events waiting in the publisher queue.
+        EVENT_BATCH_SIZE: Maximum number of events published per NATS flush.
+        EVENT_FLUSH_INTERVAL: Seconds the publisher waits for a batch to fill up.
+        EVENT_OVERFLOW_POLICY: What the publisher does with events when its queue is
+        full: block, drop_oldest or spill.
+        EVENT_SPILL_PATH: File the spill overflow policy appends events to.
+        Defaults to a file of the current host and process in the temporary
+        directory.
 """
 
 import os
+import socket
+import tempfile
+
 from dotenv import load_dotenv
 
 # Load the environment variables from the .env file
 load_dotenv(dotenv_path="./.env")
 
 
+def to_async_database_url(database_url):
+    """
+    Switch the driver of a PostgreSQL database URL to asyncpg.
+
+    Args:
+        database_url (str): A database URL such as `postgresql://...`.
+
+    Returns:
+        str: The same URL using the `postgresql+asyncpg` driver, or the URL
+        unchanged if it does not point at PostgreSQL.
+    """
+    if not database_url:
+        return database_url
+    scheme, separator, rest = database_url.partition("://")
+    if scheme in ("postgres", "postgresql", "postgresql+psycopg2"):
+        return f"postgresql+asyncpg{separator}{rest}"
+    return database_url
+
+
+def env_flag(name, default):
+    """
+    Read a boolean flag from the environment.
+
+    Args:
+        name (str): The name of the environment variable.
+        default (bool): The value to use if the variable is not set.
+
+    Returns:
+        bool: True if the variable is set to 1, true, yes or on.
+    """
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
 class Config:
     """
     Configuration settings for the FastAPI application.
@@ -53,4 +119,42 @@ class Config:
     POSTGRES_HOST = os.getenv("POSTGRES_HOST", "localhost")
     POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5435")
     DATABASE_URL = os.getenv("DATABASE_URL")
+    ASYNC_DATABASE_URL = os.getenv(
+        "ASYNC_DATABASE_URL", to_async_database_url(DATABASE_URL)
+    )
+
+    # Connection pool settings. The sync and the asyncio engine each have a pool,
+    # so a replica opens up to DB_POOL_SIZE + DB_MAX_OVERFLOW + DB_ASYNC_POOL_SIZE
+    # + DB_ASYNC_MAX_OVERFLOW connections, 30 with the defaults. The outbox relay
+    # holding the relay lock keeps one of the asyncio connections
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_ASYNC_POOL_SIZE = int(os.getenv("DB_ASYNC_POOL_SIZE", str(DB_POOL_SIZE)))
+    DB_ASYNC_MAX_OVERFLOW = int(
+        os.getenv("DB_ASYNC_MAX_OVERFLOW", str(DB_MAX_OVERFLOW))
+    )
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING = env_flag("DB_POOL_PRE_PING", True)
+
+    # Transactional outbox relay settings
+    OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+    OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1.0"))
+    OUTBOX_MAX_BACKOFF = float(os.getenv("OUTBOX_MAX_BACKOFF", "30.0"))
+
+    # Event publisher settings
+    EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "10000"))
+    EVENT_BATCH_SIZE = int(os.getenv("EVENT_BATCH_SIZE", "100"))
+    EVENT_FLUSH_INTERVAL = float(os.getenv("EVENT_FLUSH_INTERVAL", "0.01"))
+    EVENT_OVERFLOW_POLICY = os.getenv("EVENT_OVERFLOW_POLICY", "block")
+    # Each process spills to a file of its own, so processes sharing a temporary
+    # directory do not replay each other's events
+    EVENT_SPILL_PATH = os.getenv(
+        "EVENT_SPILL_PATH",
+        os.path.join(
+            tempfile.gettempdir(),
+            f"marketplace-events-{socket.gethostname()}-{os.getpid()}.ndjson",
+        ),
+    )
+
     TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
@@ -2,27 +2,84 @@
 This module sets up the database connection and provides functions to interact with the
 database.
 
+The synchronous engine backs the plain `def` endpoints, which FastAPI runs in a
+threadpool. The `async def` endpoints use the asyncio engine instead, so their
+queries do not block the event loop.
+
 Functions:
     get_db: Dependency to create and close database sessions.
-    create_user: Create a new user in the database.
-    create_product: Create a new product in the database.
-    update_product: Update product average rating and rating count in the database.
-    create_transaction: Create a new transaction in the database.
-    create_review: Create a new review in the database.
+    get_async_db: Dependency to create and close asyncio database sessions.
     insert_user_if_empty: Create a new admin user in the database if the table is empty.
+    create_user_async: Create a new user using an asyncio session.
+    create_product_async: Create a new product using an asyncio session.
+    update_product_async: Update product rating details using an asyncio session.
+    create_transaction_async: Create a new transaction using an asyncio session.
+    create_review_async: Create a new review using an asyncio session.
+    add_product_rating_async: Atomically add a rating to a product using an asyncio
+        session.
+    add_product_ratings_async: Atomically add the ratings of a batch of reviews to
+        their products using an asyncio session.
+    violated_foreign_key: Find which foreign key constraint rejected a write.
 """
 
 import uuid
-from sqlalchemy import create_engine
+from typing import Optional
+
+from sqlalchemy import (
+    Float,
+    Integer,
+    bindparam,
+    create_engine,
+    func,
+    insert,
+    select,
+    update,
+)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.config import Config
+from app.metrics import (
+    InstrumentedAsyncQueuePool,
+    InstrumentedQueuePool,
+    instrument_engine,
+)
 from app.models import Product, Review, Transaction, User
 
+# Connection pool settings shared by both engines, each engine is sized on its own
+POOL_OPTIONS = {
+    "pool_timeout": Config.DB_POOL_TIMEOUT,
+    "pool_recycle": Config.DB_POOL_RECYCLE,
+    "pool_pre_ping": Config.DB_POOL_PRE_PING,
+}
+
 # Set up the SQLAlchemy engine and session
-engine = create_engine(Config.DATABASE_URL)
+engine = create_engine(
+    Config.DATABASE_URL,
+    poolclass=InstrumentedQueuePool,
+    pool_size=Config.DB_POOL_SIZE,
+    max_overflow=Config.DB_MAX_OVERFLOW,
+    **POOL_OPTIONS,
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Set up the asyncio engine and session used by the async endpoints
+async_engine = create_async_engine(
+    Config.ASYNC_DATABASE_URL,
+    poolclass=InstrumentedAsyncQueuePool,
+    pool_size=Config.DB_ASYNC_POOL_SIZE,
+    max_overflow=Config.DB_ASYNC_MAX_OVERFLOW,
+    **POOL_OPTIONS,
+)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
+# Export the pool gauges on the /metrics endpoint
+instrument_engine(engine, "sync")
+instrument_engine(async_engine.sync_engine, "async")
+
 
 def get_db():
     """
@@ -34,104 +91,263 @@ def get_db():
         db.close()
 
 
-def create_user(db, username: str):
+async def get_async_db():
+    """
+    Dependency to create and close asyncio database sessions."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def insert_user_if_empty(db):
+    """
+    Create a new admin user in the database if the table is empty."""
+
+    user_count = db.query(User).count()
+
+    if user_count == 0:
+        new_user = User(id=uuid.uuid4(), username="admin", reputation_score=0)
+
+        db.add(new_user)
+        db.commit()
+        db.refresh(new_user)
+
+        print("Inserted new user:", new_user.username)
+    else:
+        print("User table is not empty.")
+
+
+async def _insert_returning_username(
+    db: AsyncSession, model, values: dict, user_id: str, commit: bool
+):
+    """
+    Insert a row with a single `INSERT ... RETURNING` statement, returning the new
+    entity together with the username of the user it references.
+
+    Missing users, products or sellers are not looked up first: the foreign key
+    constraints reject the row, raising an `IntegrityError` the caller maps to a
+    404 with `violated_foreign_key`."""
+    username = select(User.username).where(User.id == user_id).scalar_subquery()
+    result = await db.execute(insert(model).values(**values).returning(model, username))
+    entity, username = result.one()
+    if commit:
+        await db.commit()
+    return entity, username
+
+
+async def create_user_async(db: AsyncSession, username: str, commit: bool = True):
     """
-    Create a new user in the database."""
+    Create a new user using an asyncio session.
+
+    A taken username is rejected by its unique constraint with an
+    `IntegrityError`, instead of being checked with a separate query."""
     new_user = User(id=uuid.uuid4(), username=username, reputation_score=0)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    if not commit:
+        await db.flush()
+        return new_user
+    await db.commit()
     return new_user
 
 
-def create_product(
-    db,
+async def create_product_async(
+    db: AsyncSession,
     title: str,
     description: str,
     price: float,
     seller_id: str,
     average_rating: float = 0.0,
     rating_count: int = 0,
+    commit: bool = True,
 ):
     """
-    Create a new product in the database."""
-    new_product = Product(
-        id=uuid.uuid4(),
-        title=title,
-        description=description,
-        price=price,
-        seller_id=seller_id,
-        average_rating=average_rating,
-        rating_count=rating_count,
-    )
-    db.add(new_product)
-    db.commit()
-    db.refresh(new_product)
-    return new_product
+    Create a new product using an asyncio session.
+
+    With `commit=False` the transaction is left open for the caller to stage its
+    events in.
+
+    Returns:
+        tuple[Product, str]: The new product and the username of its seller."""
+    values = {
+        "id": uuid.uuid4(),
+        "title": title,
+        "description": description,
+        "price": price,
+        "seller_id": seller_id,
+        "average_rating": average_rating,
+        "rating_count": rating_count,
+        "rating_sum": (average_rating or 0) * (rating_count or 0),
+    }
+    return await _insert_returning_username(db, Product, values, seller_id, commit)
 
 
-def update_product(db, product: Product, average_rating: float, rating_count: int):
+async def update_product_async(
+    db: AsyncSession,
+    product: Product,
+    average_rating: float,
+    rating_count: int,
+    commit: bool = True,
+):
     """
-    Update product average rating and rating count in the database."""
+    Update product average rating and rating count using an asyncio session.
+
+    With `commit=False` the change is left in the open transaction."""
 
     if product is None:
         return None
 
     product.average_rating = average_rating
     product.rating_count = rating_count
+    product.rating_sum = (average_rating or 0) * (rating_count or 0)
 
-    db.commit()
-    db.refresh(product)
+    if not commit:
+        return product
+    await db.commit()
     return product
 
 
-def create_transaction(db, buyer_id: str, product_id: str, status: str, amount: float):
+async def create_transaction_async(
+    db: AsyncSession,
+    buyer_id: str,
+    product_id: str,
+    status: str,
+    amount: float,
+    commit: bool = True,
+):
     """
-    Create a new transaction in the database."""
-
-    new_transaction = Transaction(
-        id=uuid.uuid4(),
-        buyer_id=buyer_id,
-        product_id=product_id,
-        status=status,
-        amount=amount,
-    )
-    db.add(new_transaction)
-    db.commit()
-    db.refresh(new_transaction)
-    return new_transaction
+    Create a new transaction using an asyncio session.
+
+    With `commit=False` the database transaction is left open for the caller to
+    stage its events in.
+
+    Returns:
+        tuple[Transaction, str]: The new transaction and the username of its
+        buyer."""
+    values = {
+        "id": uuid.uuid4(),
+        "buyer_id": buyer_id,
+        "product_id": product_id,
+        "status": status,
+        "amount": amount,
+    }
+    return await _insert_returning_username(db, Transaction, values, buyer_id, commit)
+
+
+async def create_review_async(
+    db: AsyncSession,
+    user_id: str,
+    product_id: str,
+    rating: int,
+    content: str,
+    commit: bool = True,
+):
+    """
+    Create a new review using an asyncio session.
+
+    With `commit=False` the transaction is left open for the caller to stage its
+    events in.
+
+    Returns:
+        tuple[Review, str]: The new review and the username of its author."""
+    values = {
+        "id": uuid.uuid4(),
+        "user_id": user_id,
+        "product_id": product_id,
+        "rating": rating,
+        "content": content,
+    }
+    return await _insert_returning_username(db, Review, values, user_id, commit)
 
 
-def create_review(db, user_id: str, product_id: str, rating: int, content: str):
+def _add_ratings(count, total):
     """
-    Create a new review in the database."""
-
-    new_review = Review(
-        id=uuid.uuid4(),
-        user_id=user_id,
-        product_id=product_id,
-        rating=rating,
-        content=content,
+    The SET clause adding `count` ratings summing to `total` to a product, computed
+    from the current row."""
+    rating_count = func.coalesce(Product.rating_count, 0)
+    rating_sum = func.coalesce(Product.rating_sum, 0)
+    return {
+        "rating_count": rating_count + count,
+        "rating_sum": rating_sum + total,
+        "average_rating": (rating_sum + total) / (rating_count + count),
+    }
+
+
+async def add_product_rating_async(db: AsyncSession, product_id: str, rating: int):
+    """
+    Atomically add a rating to a product using an asyncio session.
+
+    The rating count, rating sum and average rating are updated by a single
+    `UPDATE ... RETURNING` statement computed from the current row, so concurrent
+    reviews of the same product neither lose updates nor need to read the product
+    first. The change is left in the open transaction.
+
+    Returns:
+        Row | None: The new `average_rating` and `rating_count` of the product, or
+        None if the product does not exist."""
+
+    statement = (
+        update(Product)
+        .where(Product.id == product_id)
+        .values(**_add_ratings(1, rating))
+        .returning(Product.average_rating, Product.rating_count)
+        .execution_options(synchronize_session=False)
     )
-    db.add(new_review)
-    db.commit()
-    db.refresh(new_review)
-    return new_review
+    result = await db.execute(statement)
+    return result.one_or_none()
 
 
-def insert_user_if_empty(db):
+async def add_product_ratings_async(db: AsyncSession, ratings: dict):
     """
-    Create a new admin user in the database if the table is empty."""
+    Atomically add the ratings of a batch of reviews to their products using an
+    asyncio session.
 
-    user_count = db.query(User).count()
+    All products are updated by one executemany `UPDATE` statement, adding the
+    number and sum of the new ratings per product. The change is left in the open
+    transaction.
 
-    if user_count == 0:
-        new_user = User(id=uuid.uuid4(), username="admin", reputation_score=0)
+    Args:
+        ratings (dict[UUID, list[int]]): The new ratings per product id."""
 
-        db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+    if not ratings:
+        return
+    statement = (
+        update(Product.__table__)
+        .where(Product.id == bindparam("target_id"))
+        .values(
+            **_add_ratings(
+                bindparam("added_count", type_=Integer),
+                bindparam("added_sum", type_=Float),
+            )
+        )
+    )
+    await db.execute(
+        statement,
+        [
+            {
+                "target_id": product_id,
+                "added_count": len(product_ratings),
+                "added_sum": sum(product_ratings),
+            }
+            for product_id, product_ratings in ratings.items()
+        ],
+    )
 
-        print("Inserted new user:", new_user.username)
-    else:
-        print("User table is not empty.")
+
+def violated_foreign_key(error: IntegrityError, *columns: str) -> Optional[str]:
+    """
+    Find which foreign key constraint rejected a write.
+
+    PostgreSQL names the constraints `<table>_<column>_fkey`, and includes the name
+    in the error message.
+
+    Args:
+        error (IntegrityError): The error raised by the write.
+        columns (str): The foreign key columns the write could have violated.
+
+    Returns:
+        str | None: The first of `columns` whose constraint was violated, or None
+        if the error is not a violation of one of them."""
+    message = str(error.orig)
+    for column in columns:
+        if f"_{column}_fkey" in message:
+            return column
+    return None
@@ -9,7 +9,9 @@ The application includes the following functionalities:
 - Review management
 
 The application also handles startup and shutdown events to manage
-database initialization and NATS server connections.
+database initialization and NATS server connections. The database schema is
+managed by the Alembic migrations, which run once per deployment as a
+separate step before the replicas start.
 
 Modules and packages imported:
 - dverse_nats_helper.nats_connection: For connecting to the NATS server.
@@ -21,7 +23,6 @@ Modules and packages imported:
 - app.api.users: User-related API routes.
 - app.config: Configuration settings for the application.
 - app.database: Database engine and session management.
-- app.models: Database models.
 
 Routes included:
 - /api/products: Product-related endpoints.
@@ -31,8 +32,10 @@ Routes included:
 - /: Root endpoint returning a welcome message.
 
 Startup and shutdown events:
-- startup_event: Initializes the database and connects to the NATS server.
-- shutdown_event: Closes the connection to the NATS server.
+- startup_event: Initializes the database, connects to the NATS server and starts
+  the event publisher and the outbox relay.
+- shutdown_event: Stops the outbox relay, flushes the event publisher and closes
+  the connection to the NATS server.
 """
 
 from dverse_nats_helper.nats_connection import connect_nats, nc
@@ -47,8 +50,14 @@ from app.api.reviews import router as reviews_router
 from app.api.transactions import router as transactions_router
 from app.api.users import router as users_router
 from app.config import Config
-from app.database import engine, get_db, insert_user_if_empty
-from app.models import Base
+from app.database import (
+    AsyncSessionLocal,
+    async_engine,
+    get_db,
+    insert_user_if_empty,
+)
+from app.outbox import OutboxRelay
+from app.publisher import EventPublisher
 from starlette.middleware.base import BaseHTTPMiddleware
 from loguru import logger
 
@@ -62,6 +71,9 @@ app = FastAPI(
 
 CACHE_CONTROL = "no-store, no-cache, must-revalidate, max-age=0"
 
+event_publisher = EventPublisher()
+outbox_relay = OutboxRelay(AsyncSessionLocal, event_publisher)
+
 
 class SecurityHeadersMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request, call_next):
@@ -79,8 +91,6 @@ app.add_middleware(
     env="dev",
 )
 
-Base.metadata.create_all(bind=engine)
-
 app.include_router(products_router, prefix="/api", tags=["Products"])
 app.include_router(users_router, prefix="/api", tags=["Users"])
 app.include_router(transactions_router, prefix="/api", tags=["Transactions"])
@@ -95,6 +105,7 @@ async def startup_event():
     This function performs the following tasks during the startup of the application:
     1. Initializes a database session and inserts a user if the database is empty.
     2. Establishes a connection to a NATS server using the provided server URL.
+    3. Starts the event publisher and the relay feeding it the outbox events.
 
     Raises:
     Exception: If there is an error connecting to the NATS server."""
@@ -102,6 +113,8 @@ async def startup_event():
     db: Session = next(get_db())
     insert_user_if_empty(db=db)
     await connect_nats(server_url=Config.NATS_SERVER_URL)
+    event_publisher.start()
+    outbox_relay.start()
 
 
 @app.on_event("shutdown")
@@ -110,10 +123,23 @@ async def shutdown_event():
     Handles shutdown events for the FastAPI application.
 
     Tasks during shutdown:
-    1. Closes the NATS connection.
-    2. Closes the database session.
-    3. Logs the shutdown process.
+    1. Stops the outbox relay.
+    2. Flushes the queued events and stops the event publisher.
+    3. Closes the NATS connection.
+    4. Closes the database session.
+    5. Disposes the asyncio database engine.
+    6. Logs the shutdown process.
     """
+    try:
+        await outbox_relay.stop()
+    except Exception as e:
+        logger.error(f"Error stopping the outbox relay: {e}")
+
+    try:
+        await event_publisher.stop()
+    except Exception as e:
+        logger.error(f"Error stopping the event publisher: {e}")
+
     try:
         # Close NATS connection
         if nc.is_connected:
@@ -130,6 +156,13 @@ async def shutdown_event():
     except Exception as e:
         logger.error(f"Error closing the database session: {e}")
 
+    try:
+        # Close the connections held by the asyncio engine
+        await async_engine.dispose()
+        logger.info("Async database engine disposed successfully.")
+    except Exception as e:
+        logger.error(f"Error disposing the async database engine: {e}")
+
     logger.info("Application shutdown complete.")
 
 
@@ -0,0 +1,140 @@
+"""
+This module defines the Prometheus metrics for the database connection pools and
+the event publisher.
+
+The metrics are registered in the default `prometheus_client` registry, so they are
+served next to the HTTP metrics on the `/metrics` endpoint exposed by the
+instrumentator in `app.main`. Each pool metric carries a `pool` label naming the
+engine it belongs to (`sync` or `async`).
+
+Metrics:
+    DB_POOL_SIZE: Number of connections the pool keeps open.
+    DB_POOL_CHECKED_OUT: Number of connections currently checked out of the pool.
+    DB_POOL_OVERFLOW: Number of overflow connections currently open.
+    DB_POOL_CHECKOUT_WAIT: Time spent waiting to check a connection out of the pool.
+    EVENT_QUEUE_DEPTH: Number of events waiting in the publisher queue.
+    EVENT_FLUSH_LATENCY: Time taken to publish and flush a batch of events.
+    EVENT_BATCH_SIZE: Number of events per flushed batch.
+    EVENTS_DROPPED: Number of events dropped by the publisher, by reason.
+    EVENTS_SPILLED: Number of events spilled to disk by the publisher.
+
+Classes:
+    InstrumentedQueuePool: QueuePool recording the checkout wait time.
+    InstrumentedAsyncQueuePool: AsyncAdaptedQueuePool recording the checkout
+        wait time.
+
+Functions:
+    instrument_engine: Export the pool gauges of an engine.
+"""
+
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+DB_POOL_SIZE = Gauge(
+    "db_pool_size",
+    "Number of connections the database pool keeps open.",
+    ["pool"],
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections",
+    "Number of database connections currently checked out of the pool.",
+    ["pool"],
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow_connections",
+    "Number of overflow database connections currently open.",
+    ["pool"],
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting to check a database connection out of the pool.",
+    ["pool"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+EVENT_QUEUE_DEPTH = Gauge(
+    "event_publisher_queue_depth",
+    "Number of events waiting in the publisher queue.",
+)
+EVENT_FLUSH_LATENCY = Histogram(
+    "event_publisher_flush_latency_seconds",
+    "Time taken to publish and flush a batch of events to NATS.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+EVENT_BATCH_SIZE = Histogram(
+    "event_publisher_batch_size",
+    "Number of events per batch flushed to NATS.",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+EVENTS_DROPPED = Counter(
+    "event_publisher_dropped_total",
+    "Number of events dropped by the publisher.",
+    ["reason"],
+)
+EVENTS_SPILLED = Counter(
+    "event_publisher_spilled_total",
+    "Number of events spilled to disk because the publisher queue was full.",
+)
+
+
+class _CheckoutTimingMixin:
+    """
+    Records how long each connection checkout takes, including the time spent
+    waiting for a connection to be returned when the pool is exhausted.
+
+    Attributes:
+        metrics_label (str): Value of the `pool` label of the recorded metrics.
+    """
+
+    metrics_label = "sync"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.labels(pool=self.metrics_label).observe(
+                time.perf_counter() - start
+            )
+
+
+class InstrumentedQueuePool(_CheckoutTimingMixin, QueuePool):
+    """
+    QueuePool recording the checkout wait time of the synchronous engine.
+    """
+
+    metrics_label = "sync"
+
+
+class InstrumentedAsyncQueuePool(_CheckoutTimingMixin, AsyncAdaptedQueuePool):
+    """
+    AsyncAdaptedQueuePool recording the checkout wait time of the asyncio engine.
+    """
+
+    metrics_label = "async"
+
+
+def instrument_engine(engine, label: str):
+    """
+    Export the pool gauges of an engine.
+
+    The gauges read the pool of the engine on every scrape, so they keep working
+    after the pool is recreated by `engine.dispose()`.
+
+    Args:
+        engine (Engine): The engine whose pool to export.
+        label (str): Value of the `pool` label of the exported gauges.
+    """
+
+    def pool_stat(name):
+        def read():
+            stat = getattr(engine.pool, name, None)
+            return max(stat(), 0) if stat else 0
+
+        return read
+
+    DB_POOL_SIZE.labels(pool=label).set_function(pool_stat("size"))
+    DB_POOL_CHECKED_OUT.labels(pool=label).set_function(pool_stat("checkedout"))
+    DB_POOL_OVERFLOW.labels(pool=label).set_function(pool_stat("overflow"))
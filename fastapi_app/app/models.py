@@ -6,6 +6,7 @@ Models:
     Product: Represents a product in the marketplace.
     Transaction: Represents a transaction in the marketplace.
     Review: Represents a review for a product in the marketplace.
+    OutboxEvent: Represents an event waiting to be published to NATS.
 
 Each model includes attributes that map to the corresponding database columns and
 relationships to other models.
@@ -14,7 +15,18 @@ the model instance to a dictionary format suitable for events.
 """
 
 import uuid
-from sqlalchemy import Column, Float, ForeignKey, Integer, String
+from sqlalchemy import (
+    JSON,
+    BigInteger,
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    func,
+)
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -74,6 +86,10 @@ class Product(Base):
         average_rating (float): The average rating for the product,
         calculated from all reviews.
         rating_count (int): The number of reviews for this product.
+        rating_sum (float): The sum of all ratings, kept next to `rating_count` so
+        a review can update the average in a single atomic statement.
+        created_at (datetime): Timestamp of when the product was listed, used
+        together with `id` as the keyset for paginating the catalog.
         seller (User): The user who listed the product.
         transactions (list[Transaction]): List of transactions associated
         with this product.
@@ -89,6 +105,8 @@ class Product(Base):
     seller_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
     average_rating = Column(Float)
     rating_count = Column(Integer)
+    rating_sum = Column(Float, nullable=False, default=0.0, server_default="0")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
     seller = relationship("User", back_populates="products")
@@ -101,10 +119,22 @@ class Product(Base):
         return {
             "product_id": str(self.id),
             "title": self.title,
+            "description": self.description,
             "price": str(self.price),
         }
 
 
+# Indexes serving the keyset pagination of the catalog, with and without the
+# seller filter. The seller index also covers lookups by seller_id alone.
+Index("ix_products_created_at_id", Product.created_at.desc(), Product.id.desc())
+Index(
+    "ix_products_seller_id_created_at_id",
+    Product.seller_id,
+    Product.created_at.desc(),
+    Product.id.desc(),
+)
+
+
 # Transaction model
 class Transaction(Base):
     """
@@ -123,8 +153,8 @@ class Transaction(Base):
     __tablename__ = "transactions"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    buyer_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
-    product_id = Column(UUID(as_uuid=True), ForeignKey("products.id"))
+    buyer_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), index=True)
+    product_id = Column(UUID(as_uuid=True), ForeignKey("products.id"), index=True)
     status = Column(String)
     amount = Column(Float)
 
@@ -161,8 +191,8 @@ class Review(Base):
     __tablename__ = "reviews"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
-    product_id = Column(UUID(as_uuid=True), ForeignKey("products.id"))
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), index=True)
+    product_id = Column(UUID(as_uuid=True), ForeignKey("products.id"), index=True)
     rating = Column(Integer)
     content = Column(String)
 
@@ -179,3 +209,33 @@ class Review(Base):
             "rating": self.rating,
             "content": self.content,
         }
+
+
+# Outbox model
+class OutboxEvent(Base):
+    """
+    Represents an event waiting to be published to NATS.
+
+    Write endpoints insert the event in the same database transaction as the row
+    it describes, and the outbox relay publishes and removes it afterwards. An
+    event is therefore published if and only if its transaction commits.
+
+    Attributes:
+        id (int): Auto-incrementing identifier, defining the publishing order.
+        subject (str): The NATS subject to publish the event on.
+        payload (dict): The event message, as built by `build_event`.
+        attempts (int): The number of failed attempts to publish the event.
+        created_at (datetime): Timestamp of when the event was staged.
+    """
+
+    __tablename__ = "outbox"
+
+    id = Column(
+        BigInteger().with_variant(Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=True,
+    )
+    subject = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,308 @@
+"""
+This module implements the transactional outbox used to publish events to NATS.
+
+Write endpoints do not publish their events inline. Instead they stage them with
+`stage_event`, which inserts an `OutboxEvent` row in the same database transaction
+as the product, transaction or review it describes. The `OutboxRelay` background
+task then drains the outbox table in batches through the `EventPublisher`, which
+publishes the events with as few flushes to NATS as it can.
+
+This keeps the NATS round trip off the request path and makes delivery
+at-least-once: an event is published if and only if its transaction commits, and
+is only removed from the outbox once NATS accepted it. Events are published in
+the order they were staged: each event is published after the previous one, so
+when publishing fails the publisher holds back the rest of the batch, which is
+retried with an exponential backoff.
+
+To keep that order across replicas, only one relay publishes at a time: the one
+holding a PostgreSQL advisory lock. The relays of the other replicas stand by and
+take over once the lock is released, for instance when its replica stops. No
+transaction is kept open while events are published.
+
+Classes:
+    OutboxRelay: Background task publishing the staged events to NATS.
+
+Functions:
+    stage_event: Stage an event to be published when the transaction commits.
+"""
+
+import asyncio
+
+from jsonschema import ValidationError
+from loguru import logger
+from sqlalchemy import delete, event, select, text, update
+from sqlalchemy.orm import Session
+
+from app.config import Config
+from app.models import OutboxEvent
+from app.publisher import EventPublisher
+
+# Relays to wake up when a transaction staging events commits
+_running_relays = set()
+
+# Key of the PostgreSQL advisory lock held by the relay publishing the events
+RELAY_LOCK_KEY = 0x6F7574626F78
+
+
+def stage_event(db, subject: str, new_event: dict) -> OutboxEvent:
+    """
+    Stage an event to be published when the transaction commits.
+
+    Args:
+        db (Session | AsyncSession): The session of the current transaction.
+        subject (str): The NATS subject to publish the event on.
+        new_event (dict): The event message, as built by `build_event`.
+
+    Returns:
+        OutboxEvent: The staged outbox row.
+    """
+    outbox_event = OutboxEvent(subject=subject, payload=new_event, attempts=0)
+    db.add(outbox_event)
+    db.info["outbox_staged"] = True
+    return outbox_event
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_relays(session):
+    """
+    Wake up the running relays once a transaction staging events has committed, so
+    the events do not have to wait for the next poll.
+    """
+    if session.info.pop("outbox_staged", False):
+        for relay in _running_relays:
+            relay.notify()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_staged(session):
+    """
+    Forget about staged events when their transaction is rolled back.
+    """
+    session.info.pop("outbox_staged", None)
+
+
+class OutboxRelay:
+    """
+    Background task publishing the staged events to NATS.
+
+    Attributes:
+        session_factory (Callable): Factory creating asyncio database sessions.
+        publisher (EventPublisher): The publisher sending the events to NATS.
+        batch_size (int): Maximum number of events published per batch.
+        poll_interval (float): Seconds to wait for new events when idle.
+        max_backoff (float): Upper bound of the retry delay after a failure.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        publisher: EventPublisher,
+        batch_size: int = Config.OUTBOX_BATCH_SIZE,
+        poll_interval: float = Config.OUTBOX_POLL_INTERVAL,
+        max_backoff: float = Config.OUTBOX_MAX_BACKOFF,
+    ):
+        self.session_factory = session_factory
+        self.publisher = publisher
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self._task = None
+        self._wakeup = None
+        self._loop = None
+        self._lock_connection = None
+
+    def start(self):
+        """
+        Start relaying events in a background task of the running event loop.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self.run())
+        _running_relays.add(self)
+        logger.info("Outbox relay started.")
+
+    async def stop(self):
+        """
+        Stop the background task. Events still in the outbox are published by the
+        next relay to start.
+        """
+        _running_relays.discard(self)
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self._release_lock()
+        logger.info("Outbox relay stopped.")
+
+    def notify(self):
+        """
+        Wake the relay up to publish newly committed events. Safe to call from
+        any thread.
+        """
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def run(self):
+        """
+        Relay events until cancelled, backing off while publishing fails.
+        """
+        failures = 0
+        while True:
+            try:
+                published, complete = await self.relay_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error relaying outbox events: {e}")
+                published, complete = 0, False
+
+            if not complete:
+                failures += 1
+                await asyncio.sleep(
+                    min(self.poll_interval * 2**failures, self.max_backoff)
+                )
+                continue
+
+            failures = 0
+            if published < self.batch_size:
+                # The outbox is drained, wait for new events
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    async def _hold_lock(self):
+        """
+        Take or keep the advisory lock that lets this relay publish. The lock is
+        held by a dedicated connection, idle outside of any transaction, and is
+        released by PostgreSQL when that connection closes.
+
+        Returns:
+            bool: Whether this relay holds the lock. Always True on databases
+            without advisory locks, which are only used by a single process.
+        """
+        engine = self.session_factory.kw["bind"]
+        if engine.dialect.name != "postgresql":
+            return True
+
+        if self._lock_connection is not None:
+            try:
+                # Make sure the connection, and with it the lock, is still alive
+                await self._lock_connection.execute(text("SELECT 1"))
+                await self._lock_connection.commit()
+                return True
+            except Exception as e:
+                logger.warning(f"Lost the outbox relay lock: {e}")
+                await self._release_lock()
+
+        connection = await engine.connect()
+        try:
+            locked = await connection.scalar(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": RELAY_LOCK_KEY}
+            )
+            await connection.commit()
+        except Exception:
+            await connection.close()
+            raise
+        if not locked:
+            await connection.close()
+            return False
+        self._lock_connection = connection
+        logger.info("Outbox relay took the lock, publishing the outbox events.")
+        return True
+
+    async def _release_lock(self):
+        """
+        Release the advisory lock by closing the connection holding it.
+        """
+        if self._lock_connection is None:
+            return
+        connection, self._lock_connection = self._lock_connection, None
+        try:
+            await connection.close()
+        except Exception as e:
+            logger.debug(f"Failed to close the outbox relay lock connection: {e}")
+
+    async def relay_batch(self):
+        """
+        Publish the oldest batch of staged events and remove them from the outbox.
+
+        Only the relay holding the advisory lock publishes. The batch is read in a
+        short transaction, published without holding any transaction open, and the
+        handled events are removed in a second short transaction. Events that do
+        not match the event schema can never be published and are dropped.
+
+        Returns:
+            tuple[int, bool]: The number of events published, and whether the whole
+            batch was handled without a publishing failure. A relay standing by
+            for the one holding the lock publishes nothing.
+        """
+        if not await self._hold_lock():
+            return 0, True
+
+        async with self.session_factory() as db:
+            outbox_events = (
+                await db.execute(
+                    select(
+                        OutboxEvent.id,
+                        OutboxEvent.subject,
+                        OutboxEvent.payload,
+                        OutboxEvent.attempts,
+                    )
+                    .order_by(OutboxEvent.id)
+                    .limit(self.batch_size)
+                )
+            ).all()
+
+        # Queue the whole batch so it is sent with as few flushes as possible, but
+        # chain every event to the previous one so nothing is published past a
+        # failure
+        deliveries = []
+        previous = None
+        for outbox_event in outbox_events:
+            previous = await self.publisher.publish(
+                outbox_event.subject, outbox_event.payload, after=previous
+            )
+            deliveries.append(previous)
+        results = await asyncio.gather(*deliveries, return_exceptions=True)
+
+        published = 0
+        complete = True
+        handled = []
+        failed = None
+        for outbox_event, result in zip(outbox_events, results):
+            if isinstance(result, ValidationError):
+                logger.error(
+                    f"Dropping outbox event {outbox_event.id} on "
+                    f"'{outbox_event.subject}': {result.message}"
+                )
+            elif isinstance(result, Exception):
+                # Hold back the rest of the batch to keep the events in order
+                failed = outbox_event.id
+                logger.warning(
+                    f"Failed to publish outbox event {outbox_event.id} on "
+                    f"'{outbox_event.subject}' "
+                    f"(attempt {outbox_event.attempts + 1}): {result}"
+                )
+                complete = False
+                break
+            else:
+                published += 1
+            handled.append(outbox_event.id)
+
+        async with self.session_factory() as db:
+            if handled:
+                await db.execute(delete(OutboxEvent).where(OutboxEvent.id.in_(handled)))
+            if failed is not None:
+                await db.execute(
+                    update(OutboxEvent)
+                    .where(OutboxEvent.id == failed)
+                    .values(attempts=OutboxEvent.attempts + 1)
+                )
+            await db.commit()
+        return published, complete
@@ -0,0 +1,54 @@
+"""
+This module provides helpers for keyset (cursor) pagination of list endpoints.
+
+Instead of OFFSET based paging, list endpoints order their rows by a stable
+`(created_at, id)` key and hand out an opaque cursor pointing at the last row of
+the page. The next page is then fetched with a `WHERE (created_at, id) < cursor`
+predicate, so the cost of a page depends on its size and not on its position in
+the table.
+
+Functions:
+    encode_cursor: Encode the keyset of the last row of a page into an opaque token.
+    decode_cursor: Decode an opaque token back into its keyset.
+"""
+
+import base64
+import json
+import uuid
+from datetime import datetime
+
+
+def encode_cursor(created_at: datetime, row_id: uuid.UUID) -> str:
+    """
+    Encode the keyset of the last row of a page into an opaque token.
+
+    Args:
+        created_at (datetime): The creation timestamp of the row.
+        row_id (UUID): The unique identifier of the row.
+
+    Returns:
+        str: A URL-safe token that can be passed back as the `cursor` parameter.
+    """
+    payload = json.dumps([created_at.isoformat(), str(row_id)])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    """
+    Decode an opaque token back into its keyset.
+
+    Args:
+        cursor (str): A token previously returned by `encode_cursor`.
+
+    Returns:
+        tuple[datetime, UUID]: The creation timestamp and id of the row.
+
+    Raises:
+        ValueError: If the token is malformed.
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor.encode("ascii"))
+        created_at, row_id = json.loads(payload)
+        return datetime.fromisoformat(created_at), uuid.UUID(row_id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
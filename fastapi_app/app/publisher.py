@@ -0,0 +1,409 @@
+"""
+This module implements the in-process event publisher used to send events to NATS.
+
+Callers hand events to `EventPublisher.publish`, which only puts them on a bounded
+asyncio queue and returns. A single sender task takes the events off the queue,
+coalesces them into batches, and publishes each batch followed by one flush to the
+NATS server. A batch is flushed as soon as it holds `batch_size` events or when
+`flush_interval` seconds have passed since its first event arrived.
+
+`publish` returns a future which resolves once the event has been flushed to the
+server, or fails if the event could not be delivered. The outbox relay awaits these
+futures before removing events from the outbox; fire-and-forget callers can ignore
+them. An event can be published `after` the future of another event: it is then held
+back, and fails with `EventDropped`, when that event failed or is still spilled, so
+the relay keeps its events in order.
+
+When the queue is full, the overflow policy decides what happens to a new event:
+
+- `block`: wait until the sender has made room in the queue.
+- `drop_oldest`: drop the oldest queued event to make room for the new one.
+- `spill`: append the new event to a file on local disk. Spilled events are queued
+  again once the queue has drained, and are not kept in order with newer events.
+  Their futures only resolve once they are flushed; events left in the spill file
+  by a previous run are published without one. The spill file is only read and
+  written in a worker thread, off the event loop.
+
+Classes:
+    OverflowPolicy: The policies for handling events when the queue is full.
+    EventDropped: Raised on the future of an event dropped by the publisher.
+    EventPublisher: Bounded, batching publisher for NATS events.
+"""
+
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass
+from enum import Enum
+
+from dverse_nats_helper.event_schema import event_schema
+from dverse_nats_helper.nats_connection import nc
+from jsonschema import ValidationError, validate
+from loguru import logger
+
+from app.config import Config
+from app.metrics import (
+    EVENT_BATCH_SIZE,
+    EVENT_FLUSH_LATENCY,
+    EVENT_QUEUE_DEPTH,
+    EVENTS_DROPPED,
+    EVENTS_SPILLED,
+)
+
+
+class OverflowPolicy(str, Enum):
+    """
+    The policies for handling events when the publisher queue is full.
+    """
+
+    BLOCK = "block"
+    DROP_OLDEST = "drop_oldest"
+    SPILL = "spill"
+
+
+class EventDropped(Exception):
+    """
+    Raised on the future of an event dropped by the publisher.
+    """
+
+
+@dataclass
+class _QueuedEvent:
+    subject: str
+    data: dict
+    future: asyncio.Future
+    after: asyncio.Future = None
+
+
+def _consume_exception(future):
+    # Mark failures as retrieved, fire-and-forget callers never await the future
+    if not future.cancelled():
+        future.exception()
+
+
+class EventPublisher:
+    """
+    Bounded, batching publisher for NATS events.
+
+    Attributes:
+        client (Client): The NATS client to publish with.
+        max_queue_size (int): Maximum number of events waiting to be sent.
+        batch_size (int): Maximum number of events published per flush.
+        flush_interval (float): Seconds to wait for a batch to fill up.
+        overflow_policy (OverflowPolicy): What to do with events when the queue
+            is full.
+        spill_path (str): File the `spill` policy appends events to.
+    """
+
+    def __init__(
+        self,
+        client=nc,
+        max_queue_size: int = Config.EVENT_QUEUE_SIZE,
+        batch_size: int = Config.EVENT_BATCH_SIZE,
+        flush_interval: float = Config.EVENT_FLUSH_INTERVAL,
+        overflow_policy: str = Config.EVENT_OVERFLOW_POLICY,
+        spill_path: str = Config.EVENT_SPILL_PATH,
+    ):
+        self.client = client
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = OverflowPolicy(overflow_policy)
+        self.spill_path = spill_path
+        self._queue = None
+        self._task = None
+        self._spilled = {}
+        self._spill_id = 0
+        self._spill_lock = None
+        self._spill_pending = False
+        self._replayed = None
+
+    def start(self):
+        """
+        Start the sender task in the running event loop. The task first re-queues
+        the events left in the spill file by a previous run.
+        """
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        EVENT_QUEUE_DEPTH.set_function(self._queue.qsize)
+        self._spill_lock = asyncio.Lock()
+        self._spill_pending = bool(self.spill_path)
+        self._replayed = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            "Event publisher started with overflow policy "
+            f"'{self.overflow_policy.value}'."
+        )
+
+    async def stop(self, timeout: float = 5.0):
+        """
+        Flush the queued events and stop the sender task.
+
+        Args:
+            timeout (float): Seconds to wait for the queue to drain.
+        """
+        if self._task is None:
+            return
+
+        async def drain():
+            await self._replayed.wait()
+            await self._queue.join()
+
+        try:
+            await asyncio.wait_for(drain(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Stopping event publisher with {self._queue.qsize()} queued events."
+            )
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        while not self._queue.empty():
+            self._fail(self._queue.get_nowait(), EventDropped("Publisher stopped"))
+            self._queue.task_done()
+        # Spilled events stay in the spill file for the next run
+        for queued_event in self._spilled.values():
+            self._fail(queued_event, EventDropped("Publisher stopped"))
+        self._spilled.clear()
+        logger.info("Event publisher stopped.")
+
+    async def publish(
+        self, subject: str, data: dict, after: asyncio.Future = None
+    ) -> asyncio.Future:
+        """
+        Queue an event to be published on a NATS subject.
+
+        Only waits when the queue is full and the overflow policy is `block`.
+
+        Args:
+            subject (str): The NATS subject to publish the event on.
+            data (dict): The event message, as built by `build_event`.
+            after (asyncio.Future, optional): The future of an event that has to
+                be delivered first; if it failed or is still spilled, this event is
+                held back and fails too.
+
+        Returns:
+            asyncio.Future: Resolves once the event is flushed to the server, or
+            raises if it could not be delivered.
+        """
+        if self._queue is None:
+            raise RuntimeError("Event publisher is not started")
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_consume_exception)
+        queued_event = _QueuedEvent(subject, data, future, after)
+
+        if self.overflow_policy == OverflowPolicy.BLOCK:
+            await self._queue.put(queued_event)
+        elif not self._queue.full():
+            self._queue.put_nowait(queued_event)
+        elif self.overflow_policy == OverflowPolicy.DROP_OLDEST:
+            oldest = self._queue.get_nowait()
+            self._queue.task_done()
+            EVENTS_DROPPED.labels(reason="overflow").inc()
+            self._fail(oldest, EventDropped("Publisher queue is full"))
+            self._queue.put_nowait(queued_event)
+        else:
+            await self._spill(queued_event)
+        return future
+
+    async def _run(self):
+        """
+        Send the queued events in batches until cancelled.
+        """
+        await self._replay_spilled()
+        self._replayed.set()
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                if self._queue.empty():
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(
+                            await asyncio.wait_for(self._queue.get(), remaining)
+                        )
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    batch.append(self._queue.get_nowait())
+
+            try:
+                await self._send(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+            if self._queue.empty() and self._spill_pending:
+                await self._replay_spilled()
+
+    async def _replay_spilled(self):
+        try:
+            await self._load_spilled()
+        except OSError as e:
+            logger.error(f"Failed to load spilled events: {e}")
+
+    async def _send(self, batch):
+        """
+        Publish a batch of events and flush them to the NATS server.
+
+        Args:
+            batch (list[_QueuedEvent]): The events to publish.
+        """
+        start = time.perf_counter()
+        if not self.client.is_connected:
+            error = ConnectionError("NATS connection is not established")
+            EVENTS_DROPPED.labels(reason="error").inc(len(batch))
+            for queued_event in batch:
+                self._fail(queued_event, error)
+            return
+
+        published = []
+        for queued_event in batch:
+            if self._held_back(queued_event):
+                self._fail(
+                    queued_event, EventDropped("An earlier event was not delivered")
+                )
+                continue
+            try:
+                validate(instance=queued_event.data, schema=event_schema)
+                await self.client.publish(
+                    queued_event.subject, json.dumps(queued_event.data).encode("utf-8")
+                )
+            except ValidationError as e:
+                logger.error(f"Invalid event on '{queued_event.subject}': {e.message}")
+                EVENTS_DROPPED.labels(reason="invalid").inc()
+                self._fail(queued_event, e)
+            except Exception as e:
+                logger.error(f"Failed to publish on '{queued_event.subject}': {e}")
+                EVENTS_DROPPED.labels(reason="error").inc()
+                self._fail(queued_event, e)
+            else:
+                published.append(queued_event)
+
+        if published:
+            try:
+                await self.client.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush {len(published)} events: {e}")
+                EVENTS_DROPPED.labels(reason="error").inc(len(published))
+                for queued_event in published:
+                    self._fail(queued_event, e)
+            else:
+                for queued_event in published:
+                    if not queued_event.future.done():
+                        queued_event.future.set_result(None)
+
+        EVENT_BATCH_SIZE.observe(len(batch))
+        EVENT_FLUSH_LATENCY.observe(time.perf_counter() - start)
+
+    def _held_back(self, queued_event):
+        """
+        Whether an event waits on an earlier event that failed or is still spilled.
+        Invalid earlier events are dropped for good and do not hold events back.
+        """
+        after = queued_event.after
+        if after is None:
+            return False
+        if any(spilled.future is after for spilled in self._spilled.values()):
+            return True
+        if not after.done():
+            return False
+        if after.cancelled():
+            return True
+        error = after.exception()
+        return error is not None and not isinstance(error, ValidationError)
+
+    @staticmethod
+    def _fail(queued_event, error):
+        if not queued_event.future.done():
+            queued_event.future.set_exception(error)
+
+    async def _spill(self, queued_event):
+        """
+        Append an event to the spill file. Its future stays pending until the event
+        is loaded back and flushed.
+        """
+        self._spill_id += 1
+        record = {
+            "id": f"{os.getpid()}-{self._spill_id}",
+            "subject": queued_event.subject,
+            "data": queued_event.data,
+        }
+        # Registered before writing, so later events are held back behind it
+        self._spilled[record["id"]] = queued_event
+        try:
+            async with self._spill_lock:
+                await asyncio.to_thread(
+                    _append_lines, self.spill_path, [json.dumps(record) + "\n"]
+                )
+        except OSError as e:
+            del self._spilled[record["id"]]
+            logger.error(f"Failed to spill event on '{queued_event.subject}': {e}")
+            EVENTS_DROPPED.labels(reason="overflow").inc()
+            self._fail(queued_event, e)
+            return
+        self._spill_pending = True
+        EVENTS_SPILLED.inc()
+
+    async def _load_spilled(self):
+        """
+        Move as many spilled events back onto the queue as it has room for, and
+        keep the rest in the spill file.
+        """
+        if not self.spill_path:
+            return
+        async with self._spill_lock:
+            lines = await asyncio.to_thread(_read_lines, self.spill_path)
+            room = self._queue.maxsize - self._queue.qsize()
+            self._queue_spilled(lines[:room])
+            await asyncio.to_thread(_rewrite_lines, self.spill_path, lines[room:])
+            self._spill_pending = len(lines) > room
+
+    def _queue_spilled(self, lines):
+        """
+        Put spilled events back on the queue, skipping corrupt records.
+        """
+        loop = asyncio.get_running_loop()
+        for line in lines:
+            try:
+                spilled = json.loads(line)
+                queued_event = self._spilled.pop(spilled.get("id"), None)
+                if queued_event is None:
+                    # Spilled by a previous run, nobody waits for it
+                    future = loop.create_future()
+                    future.add_done_callback(_consume_exception)
+                    queued_event = _QueuedEvent(
+                        spilled["subject"], spilled["data"], future
+                    )
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                logger.error(f"Skipping corrupt spilled event: {e}")
+                continue
+            self._queue.put_nowait(queued_event)
+
+
+def _append_lines(path, lines):
+    with open(path, "a", encoding="utf-8") as spill_file:
+        spill_file.writelines(lines)
+
+
+def _read_lines(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as spill_file:
+        return spill_file.readlines()
+
+
+def _rewrite_lines(path, lines):
+    # Keep the lines left over, or remove the file once it is empty
+    if lines:
+        with open(path, "w", encoding="utf-8") as spill_file:
+            spill_file.writelines(lines)
+    elif os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,66 @@
+"""
+This module provides helpers for streaming large result sets as NDJSON.
+
+List endpoints can be asked for `format=ndjson` to export a whole table. Rather than
+loading every ORM row and serializing one huge JSON document, the rows are read
+through a server-side cursor in batches of `STREAM_BATCH_SIZE` and written to the
+client one JSON document per line as they arrive.
+
+Functions:
+    ndjson_response: Build a `StreamingResponse` that streams the rows of a query.
+"""
+
+import json
+from typing import Any, Callable, Iterator
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select
+
+from app.database import SessionLocal
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Number of rows fetched from the server-side cursor per round trip
+STREAM_BATCH_SIZE = 1000
+
+
+def _iter_ndjson(statement: Select, serialize: Callable[[Any], dict]) -> Iterator[str]:
+    """
+    Yield the rows selected by a statement as NDJSON lines.
+
+    The rows are read with a session of their own, opened when the first line is
+    sent and closed after the last one. Streaming endpoints do not depend on
+    `get_db`, so no other session is held for the duration of the stream.
+
+    Args:
+        statement (Select): The statement selecting the ORM entities to export.
+        serialize (Callable): Converts an ORM entity to a JSON serializable dict.
+
+    Yields:
+        str: One JSON document followed by a newline per row.
+    """
+    db = SessionLocal()
+    try:
+        rows = db.scalars(statement.execution_options(yield_per=STREAM_BATCH_SIZE))
+        for row in rows:
+            yield json.dumps(serialize(row)) + "\n"
+    finally:
+        db.close()
+
+
+def ndjson_response(
+    statement: Select, serialize: Callable[[Any], dict]
+) -> StreamingResponse:
+    """
+    Build a response that streams the rows selected by a statement as NDJSON.
+
+    Args:
+        statement (Select): The statement selecting the ORM entities to export.
+        serialize (Callable): Converts an ORM entity to a JSON serializable dict.
+
+    Returns:
+        StreamingResponse: The streaming NDJSON response.
+    """
+    return StreamingResponse(
+        _iter_ndjson(statement, serialize), media_type=NDJSON_MEDIA_TYPE
+    )
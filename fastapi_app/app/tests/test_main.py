@@ -72,6 +72,9 @@ def test_metrics_endpoint():
         response.status_code == 200
     ), f"Unexpected status code: {response.status_code}"
     assert "http_requests_total" in response.text, "Metrics not found in response."
+    assert (
+        "db_pool_checked_out_connections" in response.text
+    ), "Database pool metrics not found in response."
     print("Metrics endpoint test passed.")
 
 
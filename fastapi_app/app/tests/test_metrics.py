@@ -0,0 +1,73 @@
+"""
+Unit tests for the database pool metrics in `app.metrics`.
+
+Fixtures:
+    instrumented_engine: SQLite engine using the instrumented pool.
+
+Functions:
+    test_pool_gauges_track_checkouts(instrumented_engine): Tests that the pool
+        gauges follow connections being checked out and returned.
+    test_pool_checkout_wait_is_recorded(instrumented_engine): Tests that each
+        checkout is observed by the wait time histogram.
+"""
+
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine
+
+from app.metrics import InstrumentedQueuePool, instrument_engine
+
+LABEL = "test"
+
+
+@pytest.fixture
+def instrumented_engine(tmp_path):
+    """
+    Creates a SQLite engine using the instrumented pool.
+
+    Yields:
+        Engine: An engine whose pool gauges are exported with the `test` label.
+    """
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'metrics.db'}",
+        poolclass=InstrumentedQueuePool,
+        pool_size=2,
+        max_overflow=1,
+    )
+    instrument_engine(engine, LABEL)
+    yield engine
+    engine.dispose()
+
+
+def sample(name, pool=LABEL):
+    """
+    Reads the current value of a pool metric from the default registry.
+    """
+    return REGISTRY.get_sample_value(name, {"pool": pool})
+
+
+def test_pool_gauges_track_checkouts(instrumented_engine):
+    """
+    Tests that the pool gauges follow connections being checked out and returned.
+    """
+    assert sample("db_pool_size") == 2
+
+    connections = [instrumented_engine.connect() for _ in range(3)]
+    assert sample("db_pool_checked_out_connections") == 3
+    assert sample("db_pool_overflow_connections") == 1
+
+    for connection in connections:
+        connection.close()
+    assert sample("db_pool_checked_out_connections") == 0
+
+
+def test_pool_checkout_wait_is_recorded(instrumented_engine):
+    """
+    Tests that each checkout is observed by the wait time histogram.
+    """
+    before = sample("db_pool_checkout_wait_seconds_count", "sync") or 0
+
+    with instrumented_engine.connect():
+        pass
+
+    assert sample("db_pool_checkout_wait_seconds_count", "sync") == before + 1
@@ -0,0 +1,206 @@
+"""
+Unit tests for the transactional outbox in `app.outbox`.
+
+Fixtures:
+    session_factory: Asyncio session factory bound to a temporary SQLite database.
+
+Classes:
+    FakeClient: Stand-in for the NATS client recording the published subjects.
+
+Functions:
+    test_staged_events_are_committed_with_the_transaction(session_factory):
+        Tests that staged events are only written when the transaction commits.
+    test_relay_publishes_events_in_order(session_factory): Tests that the relay
+        publishes and removes the events in the order they were staged.
+    test_relay_holds_back_events_after_a_failure(session_factory): Tests that a
+        failing event keeps itself and later events in the outbox.
+    test_relay_drops_invalid_events(session_factory): Tests that events failing
+        schema validation are dropped.
+    test_relay_stands_by_without_the_lock(session_factory): Tests that a relay
+        not holding the relay lock leaves the outbox alone.
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.models import Base, OutboxEvent
+from app.outbox import OutboxRelay, stage_event
+from app.publisher import EventPublisher
+
+
+class FakeClient:
+    """
+    Stand-in for the NATS client recording the published subjects.
+
+    Attributes:
+        published (list[str]): The subjects published so far.
+        failing_subjects (set[str]): Subjects on which publishing fails.
+    """
+
+    is_connected = True
+
+    def __init__(self, failing_subjects=()):
+        self.published = []
+        self.failing_subjects = set(failing_subjects)
+
+    async def publish(self, subject, payload):
+        if subject in self.failing_subjects:
+            raise ConnectionError("NATS connection is not established")
+        self.published.append(subject)
+
+    async def flush(self):
+        pass
+
+
+def make_event(subject):
+    """
+    Builds an event message matching the event schema.
+    """
+    return {
+        "event_id": subject,
+        "timestamp": "2024-11-13T12:34:56Z",
+        "platform": "MarketPlace",
+        "service": "test",
+        "event_type": subject.split(".")[-1],
+        "actor": {"actor_id": "", "username": ""},
+        "object": {},
+    }
+
+
+async def relay_batch(session_factory, client, locked=True):
+    """
+    Relays one batch of outbox events through a publisher using the given client.
+    """
+    publisher = EventPublisher(client=client, flush_interval=0, spill_path=None)
+    publisher.start()
+    try:
+        relay = OutboxRelay(session_factory, publisher, batch_size=10)
+        if not locked:
+
+            async def hold_lock():
+                return False
+
+            relay._hold_lock = hold_lock
+        return await relay.relay_batch()
+    finally:
+        await publisher.stop()
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """
+    Creates an asyncio session factory bound to a temporary SQLite database.
+
+    Yields:
+        async_sessionmaker: The session factory.
+    """
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'outbox.db'}")
+
+    async def create_tables():
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create_tables())
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    asyncio.run(engine.dispose())
+
+
+async def stage(session_factory, *subjects, commit=True, valid=True):
+    """
+    Stages one event per subject in a single transaction.
+    """
+    async with session_factory() as db:
+        for subject in subjects:
+            stage_event(db, subject, make_event(subject) if valid else {})
+        if commit:
+            await db.commit()
+        else:
+            await db.rollback()
+
+
+async def outbox_subjects(session_factory):
+    """
+    Returns the subjects of the events left in the outbox, oldest first.
+    """
+    async with session_factory() as db:
+        return list(
+            await db.scalars(select(OutboxEvent.subject).order_by(OutboxEvent.id))
+        )
+
+
+def test_staged_events_are_committed_with_the_transaction(session_factory):
+    """
+    Tests that staged events are only written when the transaction commits.
+    """
+    asyncio.run(stage(session_factory, "product.created", commit=False))
+    assert asyncio.run(outbox_subjects(session_factory)) == []
+
+    asyncio.run(stage(session_factory, "product.created"))
+    assert asyncio.run(outbox_subjects(session_factory)) == ["product.created"]
+
+
+def test_relay_publishes_events_in_order(session_factory):
+    """
+    Tests that the relay publishes and removes the events in the order they were
+    staged.
+    """
+    client = FakeClient()
+    asyncio.run(stage(session_factory, "product.created", "review.created"))
+    asyncio.run(stage(session_factory, "product.deleted"))
+
+    assert asyncio.run(relay_batch(session_factory, client)) == (3, True)
+    assert client.published == ["product.created", "review.created", "product.deleted"]
+    assert asyncio.run(outbox_subjects(session_factory)) == []
+
+
+def test_relay_holds_back_events_after_a_failure(session_factory):
+    """
+    Tests that a failing event keeps itself and later events in the outbox.
+    """
+    client = FakeClient(failing_subjects={"review.created"})
+    asyncio.run(
+        stage(session_factory, "product.created", "review.created", "product.deleted")
+    )
+
+    assert asyncio.run(relay_batch(session_factory, client)) == (1, False)
+    assert client.published == ["product.created"]
+    assert asyncio.run(outbox_subjects(session_factory)) == [
+        "review.created",
+        "product.deleted",
+    ]
+
+    async def attempts():
+        async with session_factory() as db:
+            return await db.scalar(select(func.max(OutboxEvent.attempts)))
+
+    assert asyncio.run(attempts()) == 1
+
+
+def test_relay_drops_invalid_events(session_factory):
+    """
+    Tests that events failing schema validation are dropped.
+    """
+    client = FakeClient()
+    asyncio.run(stage(session_factory, "product.updated", valid=False))
+
+    assert asyncio.run(relay_batch(session_factory, client)) == (0, True)
+    assert client.published == []
+    assert asyncio.run(outbox_subjects(session_factory)) == []
+
+
+def test_relay_stands_by_without_the_lock(session_factory):
+    """
+    Tests that a relay not holding the relay lock leaves the outbox alone.
+    """
+    client = FakeClient()
+    asyncio.run(stage(session_factory, "product.created"))
+
+    assert asyncio.run(relay_batch(session_factory, client, locked=False)) == (
+        0,
+        True,
+    )
+    assert client.published == []
+    assert asyncio.run(outbox_subjects(session_factory)) == ["product.created"]
@@ -0,0 +1,37 @@
+"""
+Unit tests for the cursor helpers in `app.pagination`.
+
+Functions:
+    test_cursor_round_trip(): Tests that a cursor decodes to the keyset it encodes.
+    test_decode_invalid_cursor(): Tests that malformed cursors are rejected.
+"""
+
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from app.pagination import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    """
+    Tests that a cursor decodes back to the keyset it was encoded from.
+    """
+    created_at = datetime(2024, 12, 16, 17, 25, 53, 871123, tzinfo=timezone.utc)
+    row_id = uuid.uuid4()
+
+    cursor = encode_cursor(created_at, row_id)
+
+    assert decode_cursor(cursor) == (created_at, row_id)
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "", "W10=", "WzEsIDJd"])
+def test_decode_invalid_cursor(cursor):
+    """
+    Tests that malformed cursors raise a ValueError.
+
+    Args:
+        cursor (str): A token that was not produced by `encode_cursor`.
+    """
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
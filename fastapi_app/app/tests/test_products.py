@@ -15,8 +15,15 @@ Fixtures:
 
 Tests:
 - test_get_products: Verifies that all products can be fetched successfully.
+- test_get_products_paginated: Verifies that the catalog can be paged through
+  with the returned cursor.
+- test_get_products_ndjson: Verifies that products can be exported as NDJSON.
+- test_get_products_by_ids: Verifies that several products can be fetched by
+  their IDs in one request.
 - test_get_product_by_id: Verifies that a product can be fetched by its ID.
 - test_delete_product: Verifies that a product can be deleted by its ID.
+- test_add_products_bulk: Verifies that products can be added in bulk, with the
+  rejected ones reported per item.
 
 Usage:
 Run the tests using pytest.
@@ -25,6 +32,7 @@ Run the tests using pytest.
 import json
 import secrets
 import string
+import uuid
 
 import pytest
 import requests
@@ -121,6 +129,94 @@ def test_get_products(add_product):
     print(f"Products data: {json.dumps(response.json(), indent=4)}")
 
 
+def test_get_products_paginated(add_product):
+    """
+    Test paging through products with a cursor.
+
+    This test requests single-product pages from the `/products/` endpoint and
+    follows the returned `next_cursor` to verify that pages do not overlap.
+
+    Args:
+        add_product (dict): The details of the created product.
+    """
+    print("Added test product: ", add_product)
+    params = {"limit": 1}
+    print("Fetching the first page of products...")
+    response = requests.get(f"{BASE_URL}/products/", params=params, timeout=60)
+    assert (
+        response.status_code == 200
+    ), f"Failed to fetch products page: {response.status_code} {response.text}"
+    first_page = response.json()
+    assert len(first_page["products"]) == 1
+
+    if first_page["next_cursor"] is None:
+        return
+
+    print("Fetching the second page of products...")
+    params["cursor"] = first_page["next_cursor"]
+    response = requests.get(f"{BASE_URL}/products/", params=params, timeout=60)
+    assert (
+        response.status_code == 200
+    ), f"Failed to fetch products page: {response.status_code} {response.text}"
+    second_page = response.json()
+    assert first_page["products"][0]["id"] != second_page["products"][0]["id"]
+
+
+def test_get_products_invalid_cursor():
+    """
+    Test fetching products with a malformed cursor.
+
+    Verifies that the `/products/` endpoint rejects cursors it did not issue.
+    """
+    response = requests.get(
+        f"{BASE_URL}/products/", params={"cursor": "not-a-cursor"}, timeout=60
+    )
+    assert (
+        response.status_code == 400
+    ), f"Unexpected status code: {response.status_code} {response.text}"
+
+
+def test_get_products_ndjson(add_product):
+    """
+    Test exporting products as NDJSON.
+
+    This test verifies that `format=ndjson` streams one JSON document per product.
+
+    Args:
+        add_product (dict): The details of the created product.
+    """
+    print("Added test product: ", add_product)
+    print("Exporting all products...")
+    response = requests.get(
+        f"{BASE_URL}/products/", params={"format": "ndjson"}, timeout=60
+    )
+    assert (
+        response.status_code == 200
+    ), f"Failed to export products: {response.status_code} {response.text}"
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    products = [json.loads(line) for line in response.text.splitlines()]
+    assert add_product["product"]["id"] in [product["id"] for product in products]
+
+
+def test_get_products_by_ids(add_product):
+    """
+    Test fetching several products by their IDs in one request.
+
+    Verifies that the `ids` filter only returns the requested products, and ignores
+    unknown IDs.
+
+    Args:
+        add_product (dict): The details of the created product.
+    """
+    product_id = add_product["product"]["id"]
+    params = {"ids": [product_id, str(uuid.uuid4())]}
+    response = requests.get(f"{BASE_URL}/products/", params=params, timeout=60)
+    assert (
+        response.status_code == 200
+    ), f"Failed to fetch products by ID: {response.status_code} {response.text}"
+    assert [product["id"] for product in response.json()["products"]] == [product_id]
+
+
 def test_get_product_by_id(add_product):
     """
     Test fetching a product by its ID.
@@ -159,6 +255,41 @@ def test_delete_product(add_product):
     print("Product deleted successfully")
 
 
+def test_add_products_bulk(add_user):
+    """
+    Test adding products in bulk.
+
+    This test sends two valid products and one with a missing seller to the
+    `/products/bulk` endpoint, and verifies that only the valid ones are created.
+
+    Args:
+        add_user (str): The ID of the seller (user).
+    """
+    unknown_seller_id = str(uuid.uuid4())
+    data = [
+        {
+            "title": f"Bulk Product {index}",
+            "description": "test description",
+            "price": 10,
+            "seller_id": seller_id,
+        }
+        for index, seller_id in enumerate([add_user, unknown_seller_id, add_user])
+    ]
+    response = requests.post(f"{BASE_URL}/products/bulk", json=data, timeout=60)
+    assert (
+        response.status_code == 201
+    ), f"Failed to add products: {response.status_code} {response.text}"
+    response_json = response.json()
+    assert [item["index"] for item in response_json["created"]] == [0, 2]
+    assert response_json["errors"] == [
+        {"index": 1, "detail": f"Seller with id {unknown_seller_id} not found"}
+    ]
+
+    for item in response_json["created"]:
+        response = requests.get(f"{BASE_URL}/products/{item['id']}", timeout=60)
+        assert response.status_code == 200
+
+
 if __name__ == "__main__":
     print("Starting product API tests...")
     pytest.main(["-v", "-s", __file__])
@@ -0,0 +1,167 @@
+"""
+Unit tests for the batching event publisher in `app.publisher`.
+
+Classes:
+    FakeClient: Stand-in for the NATS client recording publishes and flushes.
+
+Functions:
+    test_publisher_batches_events_per_flush(): Tests that queued events are
+        published with a single flush per batch.
+    test_publisher_drops_oldest_event_when_full(): Tests that the drop_oldest
+        policy fails the oldest queued event to make room.
+    test_publisher_spills_and_replays_events(tmp_path): Tests that the spill policy
+        writes events to disk and publishes them once the queue drained.
+    test_publisher_skips_corrupt_spilled_events(tmp_path): Tests that corrupt
+        records in the spill file are skipped.
+    test_publisher_fails_events_when_disconnected(): Tests that events fail when
+        the NATS connection is not established.
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from app.publisher import EventDropped, EventPublisher
+from app.tests.test_outbox import make_event
+
+
+class FakeClient:
+    """
+    Stand-in for the NATS client recording publishes and flushes.
+
+    Attributes:
+        published (list[str]): The subjects published so far.
+        flushes (int): The number of flushes.
+    """
+
+    def __init__(self, is_connected=True):
+        self.is_connected = is_connected
+        self.published = []
+        self.flushes = 0
+
+    async def publish(self, subject, payload):
+        self.published.append(subject)
+
+    async def flush(self):
+        self.flushes += 1
+
+
+def test_publisher_batches_events_per_flush():
+    """
+    Tests that queued events are published with a single flush per batch.
+    """
+    client = FakeClient()
+
+    async def publish_all():
+        publisher = EventPublisher(
+            client=client, batch_size=10, flush_interval=0.05, spill_path=None
+        )
+        publisher.start()
+        subjects = [f"product.created.{i}" for i in range(5)]
+        deliveries = [
+            await publisher.publish(subject, make_event(subject))
+            for subject in subjects
+        ]
+        await asyncio.gather(*deliveries)
+        await publisher.stop()
+        return subjects
+
+    assert client.published == asyncio.run(publish_all())
+    assert client.flushes == 1
+
+
+def test_publisher_drops_oldest_event_when_full():
+    """
+    Tests that the drop_oldest policy fails the oldest queued event to make room.
+    """
+    client = FakeClient()
+
+    async def overflow():
+        publisher = EventPublisher(
+            client=client,
+            max_queue_size=2,
+            overflow_policy="drop_oldest",
+            spill_path=None,
+        )
+        publisher.start()
+        # Queue the events before the sender task gets to run
+        deliveries = [
+            await publisher.publish(subject, make_event(subject))
+            for subject in ("product.created", "product.updated", "product.deleted")
+        ]
+        with pytest.raises(EventDropped):
+            await deliveries[0]
+        await asyncio.gather(*deliveries[1:])
+        await publisher.stop()
+
+    asyncio.run(overflow())
+    assert client.published == ["product.updated", "product.deleted"]
+
+
+def test_publisher_spills_and_replays_events(tmp_path):
+    """
+    Tests that the spill policy writes events to disk and publishes them once the
+    queue drained.
+    """
+    client = FakeClient()
+    spill_path = tmp_path / "events.ndjson"
+
+    async def overflow():
+        publisher = EventPublisher(
+            client=client,
+            max_queue_size=1,
+            overflow_policy="spill",
+            spill_path=str(spill_path),
+        )
+        publisher.start()
+        first = await publisher.publish("product.created", make_event("created"))
+        spilled = await publisher.publish("product.deleted", make_event("deleted"))
+        assert spill_path.exists()
+        assert not spilled.done()
+        await asyncio.gather(first, spilled)
+        await publisher.stop()
+
+    asyncio.run(overflow())
+    assert client.published == ["product.created", "product.deleted"]
+    assert not spill_path.exists()
+
+
+def test_publisher_skips_corrupt_spilled_events(tmp_path):
+    """
+    Tests that corrupt records in the spill file are skipped.
+    """
+    client = FakeClient()
+    spill_path = tmp_path / "events.ndjson"
+    valid = {"subject": "product.deleted", "data": make_event("deleted")}
+    spill_path.write_text(
+        '{"subject": "product.created", "data": {}\n'
+        '{"data": {}}\n' + json.dumps(valid) + "\n"
+    )
+
+    async def replay():
+        publisher = EventPublisher(client=client, spill_path=str(spill_path))
+        publisher.start()
+        await publisher.stop()
+
+    asyncio.run(replay())
+    assert client.published == ["product.deleted"]
+    assert not spill_path.exists()
+
+
+def test_publisher_fails_events_when_disconnected():
+    """
+    Tests that events fail when the NATS connection is not established.
+    """
+    client = FakeClient(is_connected=False)
+
+    async def publish():
+        publisher = EventPublisher(client=client, spill_path=None)
+        publisher.start()
+        delivery = await publisher.publish("product.created", make_event("created"))
+        with pytest.raises(ConnectionError):
+            await delivery
+        await publisher.stop()
+
+    asyncio.run(publish())
+    assert client.published == []
@@ -9,11 +9,15 @@ Fixtures:
 Tests:
     test_get_reviews_per_product: Tests fetching reviews for a specific product
     by product ID.
+    test_get_reviews_ndjson: Tests exporting all reviews as NDJSON.
+    test_concurrent_reviews_update_rating: Tests that concurrent reviews of a
+    product are all counted in its rating.
 """
 
 import json
 import secrets
 import string
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
 import requests
@@ -106,6 +110,44 @@ def test_get_reviews_per_product(add_review):
     print(f"Reviews for product ID {product_id}: {reviews_json}")
 
 
+def test_get_reviews_ndjson(add_review):
+    """Export all reviews as NDJSON."""
+    review_id = add_review["review"]["id"]
+    print("Exporting all reviews...")
+    response = requests.get(
+        f"{BASE_URL}/reviews/", params={"format": "ndjson"}, timeout=60
+    )
+    assert (
+        response.status_code == 200
+    ), f"Failed to export reviews: {response.status_code} {response.text}"
+    reviews = [json.loads(line) for line in response.text.splitlines()]
+    assert review_id in [review["id"] for review in reviews]
+
+
+def test_concurrent_reviews_update_rating(add_user, add_product):
+    """Post concurrent reviews and check none of them is lost in the rating."""
+    ratings = [secrets.randbelow(5) + 1 for _ in range(20)]
+
+    def post_review(rating):
+        data = {
+            "user_id": add_user,
+            "product_id": add_product,
+            "rating": rating,
+            "content": "This is a concurrent test review.",
+        }
+        return requests.post(f"{BASE_URL}/reviews/", json=data, timeout=60)
+
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        responses = list(executor.map(post_review, ratings))
+    assert all(response.status_code == 201 for response in responses)
+
+    response = requests.get(f"{BASE_URL}/products/{add_product}", timeout=60)
+    assert response.status_code == 200
+    product = response.json()["product"]
+    assert product["rating_count"] == len(ratings)
+    assert product["average_rating"] == pytest.approx(sum(ratings) / len(ratings))
+
+
 if __name__ == "__main__":
     print("Starting review API tests...")
     pytest.main(["-v", "-s", __file__])
@@ -9,11 +9,15 @@ Fixtures:
 
 Tests:
     test_get_user_transactions: Tests fetching transactions by user ID.
+    test_get_transactions_ndjson: Tests exporting all transactions as NDJSON.
+    test_add_transaction_unknown_product: Tests that a transaction for a missing
+    product is rejected with a 404.
 """
 
 import json
 import secrets
 import string
+import uuid
 
 import pytest
 import requests
@@ -81,6 +85,33 @@ def test_get_user_transactions(add_transaction):
     print(f"Transactions for user ID {buyer_id}: {transactions}")
 
 
+def test_get_transactions_ndjson():
+    """Export all transactions as NDJSON."""
+    print("Exporting all transactions...")
+    response = requests.get(
+        f"{BASE_URL}/transactions/", params={"format": "ndjson"}, timeout=60
+    )
+    assert (
+        response.status_code == 200
+    ), f"Failed to export transactions: {response.status_code} {response.text}"
+    for line in response.text.splitlines():
+        assert "id" in json.loads(line)
+
+
+def test_add_transaction_unknown_product(add_user):
+    """Add a transaction for a product that does not exist."""
+    product_id = str(uuid.uuid4())
+    data = {
+        "buyer_id": add_user,
+        "product_id": product_id,
+        "status": "pending",
+        "amount": 100.0,
+    }
+    response = requests.post(f"{BASE_URL}/transactions/", json=data, timeout=60)
+    assert response.status_code == 404
+    assert response.json()["detail"] == f"Product with id {product_id} not found"
+
+
 if __name__ == "__main__":
     print("Starting transaction API tests...")
     pytest.main(["-v", "-s", __file__])
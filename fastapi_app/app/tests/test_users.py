@@ -12,6 +12,7 @@ Fixtures:
 Tests:
 - test_get_user_by_username: Verifies that user data can be fetched by username.
 - test_delete_user: Verifies that a user profile can be deleted.
+- test_add_user_duplicate_username: Verifies that a taken username is rejected.
 
 Usage:
 Run the tests using pytest.
@@ -69,6 +70,16 @@ def test_delete_user(add_user):
     print("User deleted successfully")
 
 
+def test_add_user_duplicate_username(add_user):
+    """Add a user with a username that is already taken."""
+    username = add_user["user"]["username"]
+    response = requests.post(
+        f"{BASE_URL}/users/", json={"username": username}, timeout=60
+    )
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Username already exists"
+
+
 if __name__ == "__main__":
     print("Starting user API tests...")
     pytest.main(["-v", "-s", __file__])
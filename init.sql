@@ -52,6 +52,7 @@ CREATE TABLE IF NOT EXISTS products (
     seller_id UUID REFERENCES users(id) ON DELETE SET NULL,
     average_rating FLOAT DEFAULT 0,
     rating_count INTEGER DEFAULT 0,
+    rating_sum FLOAT NOT NULL DEFAULT 0,
     created_at TIMESTAMPTZ DEFAULT NOW() -- Add timestamp for record creation
 );
 
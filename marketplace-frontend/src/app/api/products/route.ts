@@ -33,23 +33,32 @@ export async function POST(req: NextRequest) {
   }
 }
 
-// Get all products
+// Get all products, following the pages of the products endpoint
 export async function GET() {
   try {
-    const res = await fetch(`${API_BASE_URL}/products/`, {
-      method: "GET",
-    });
+    const products: unknown[] = [];
+    let cursor: string | null = null;
+    do {
+      const params = new URLSearchParams({ limit: "500" });
+      if (cursor) params.set("cursor", cursor);
+      const res = await fetch(`${API_BASE_URL}/products/?${params}`, {
+        method: "GET",
+      });
 
-    if (!res.ok) {
-      const errorResponse = await res.json();
-      return NextResponse.json(
-        { error: errorResponse.detail || "No products found" },
-        { status: res.status }
-      );
-    }
+      if (!res.ok) {
+        const errorResponse = await res.json();
+        return NextResponse.json(
+          { error: errorResponse.detail || "No products found" },
+          { status: res.status }
+        );
+      }
 
-    const data = await res.json();
-    return NextResponse.json(data, { status: 200 });
+      const page = await res.json();
+      products.push(...page.products);
+      cursor = page.next_cursor;
+    } while (cursor);
+
+    return NextResponse.json(products, { status: 200 });
   } catch (error) {
     return NextResponse.json(
       { error: `Failed to fetch products, ${error}` },
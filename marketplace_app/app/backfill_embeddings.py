@@ -0,0 +1,35 @@
+from config import Config
+from components import embed_texts, embedding_store
+from marketplace import fetch_products
+from recommender import open_product_index
+
+# Number of products embedded and stored per step
+BATCH_SIZE = 256
+
+
+def backfill():
+    """Embed every product of the catalog missing from the embedding store, and
+    rebuild the vector index snapshot from the store."""
+    product_index = open_product_index()
+    products = fetch_products()
+    product_ids = list(products)
+    for start in range(0, len(product_ids), BATCH_SIZE):
+        end = min(start + BATCH_SIZE, len(product_ids))
+        batch = {
+            product_id: products[product_id] for product_id in product_ids[start:end]
+        }
+        vectors, _ = embedding_store.sync(batch, embed_texts)
+        product_index.insert(vectors, list(vectors.values()), embedding_store.vectors)
+        print(f"Synced {end}/{len(product_ids)}")
+
+    # Drop the vectors of products that no longer exist
+    stale = set(embedding_store.product_ids()) - set(products)
+    stale.update(set(product_index.ids()) - set(products))
+    embedding_store.delete_many(stale)
+    product_index.delete(stale)
+    product_index.save(Config.VECTOR_INDEX_PATH)
+    print(f"Embedding store holds {len(embedding_store)} products.")
+
+
+if __name__ == "__main__":
+    backfill()
@@ -0,0 +1,41 @@
+import argparse
+import random
+import time
+
+from config import Config
+from embedder import Embedder
+
+WORDS = (
+    "wireless mouse laptop stand keyboard usb cable ergonomic chair desk lamp".split()
+)
+
+
+def random_texts(rng, count):
+    """Product-like texts of varied length."""
+    return [" ".join(rng.choices(WORDS, k=rng.randint(3, 120))) for _ in range(count)]
+
+
+def throughput(embed, texts):
+    start = time.perf_counter()
+    embed(texts)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark batched embedding throughput"
+    )
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 64])
+    args = parser.parse_args()
+
+    texts = random_texts(random.Random(0), args.texts)
+    for batch_size in args.batch_sizes:
+        embedder = Embedder(Config.EMBEDDING_MODEL, Config.CUDA_DEVICE, batch_size)
+        print(
+            f"batch_size={batch_size}: {throughput(embedder.embed, texts):.1f} texts/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
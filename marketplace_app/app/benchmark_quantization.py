@@ -0,0 +1,52 @@
+import argparse
+
+import numpy as np
+
+from benchmark_vector_index import clustered_vectors, recall_at_k, timed_search
+from vector_index import ExactIndex
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the ranking loss and memory of int8 vectors"
+    )
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--rescore-factors", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = clustered_vectors(rng, args.products, args.dim, clusters=1000)
+    queries = clustered_vectors(rng, args.queries, args.dim, clusters=1000)
+    ids = [str(i) for i in range(args.products)]
+    full_vectors = dict(zip(ids, vectors))
+
+    def rescore(candidate_ids):
+        return {product_id: full_vectors[product_id] for product_id in candidate_ids}
+
+    exact = ExactIndex(ids, vectors)
+    expected, latency = timed_search(exact, queries, args.k)
+    print(f"float32: {exact.nbytes() / 2**20:.1f} MiB, {latency * 1000:.2f} ms/query")
+
+    quantized = ExactIndex(ids, vectors, quantize=True)
+    results, latency = timed_search(quantized, queries, args.k)
+    print(
+        f"int8: {quantized.nbytes() / 2**20:.1f} MiB, "
+        f"recall@{args.k}={recall_at_k(results, expected):.3f}, "
+        f"{latency * 1000:.2f} ms/query"
+    )
+
+    for rescore_factor in args.rescore_factors:
+        quantized.rescore_factor = rescore_factor
+        results, latency = timed_search(quantized, queries, args.k, rescore=rescore)
+        print(
+            f"int8 rescoring {rescore_factor * args.k} candidates: "
+            f"recall@{args.k}={recall_at_k(results, expected):.3f}, "
+            f"{latency * 1000:.2f} ms/query"
+        )
+
+
+if __name__ == "__main__":
+    main()
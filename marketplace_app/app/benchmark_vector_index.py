@@ -0,0 +1,75 @@
+import argparse
+import time
+
+import numpy as np
+
+from vector_index import ExactIndex, IVFIndex
+
+
+def clustered_vectors(rng, count, dim, clusters):
+    """Random vectors grouped around cluster centers, like embeddings of a catalog."""
+    centers = rng.normal(size=(clusters, dim))
+    labels = rng.integers(clusters, size=count)
+    return (centers[labels] + 0.5 * rng.normal(size=(count, dim))).astype(np.float32)
+
+
+def nearby_queries(rng, vectors, count):
+    """Queries close to indexed vectors, so they fall in the indexed clusters."""
+    sample = vectors[rng.choice(len(vectors), count, replace=False)]
+    return sample + 0.1 * rng.normal(size=sample.shape).astype(np.float32)
+
+
+def timed_search(index, queries, k, **search_options):
+    """Run every query and return the result ids and the mean latency."""
+    start = time.perf_counter()
+    results = [
+        [product_id for product_id, _ in index.search(query, k, **search_options)]
+        for query in queries
+    ]
+    return results, (time.perf_counter() - start) / len(queries)
+
+
+def recall_at_k(results, expected):
+    """The share of the exact top k found by the approximate search."""
+    hits = sum(len(set(found) & set(exact)) for found, exact in zip(results, expected))
+    return hits / sum(len(exact) for exact in expected)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark IVF recall@k against brute force"
+    )
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--lists", type=int, default=256)
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = clustered_vectors(rng, args.products, args.dim, clusters=1000)
+    queries = nearby_queries(rng, vectors, args.queries)
+    ids = [str(i) for i in range(args.products)]
+
+    exact = ExactIndex(ids, vectors)
+    expected, exact_latency = timed_search(exact, queries, args.k)
+    print(f"exact: {exact_latency * 1000:.2f} ms/query")
+
+    start = time.perf_counter()
+    ivf = IVFIndex(n_lists=args.lists)
+    ivf.insert(ids, vectors)
+    print(f"ivf build: {time.perf_counter() - start:.1f} s")
+
+    for n_probe in args.probes:
+        ivf.n_probe = n_probe
+        results, latency = timed_search(ivf, queries, args.k)
+        recall = recall_at_k(results, expected)
+        print(
+            f"ivf n_probe={n_probe}: recall@{args.k}={recall:.3f}, "
+            f"{latency * 1000:.2f} ms/query"
+        )
+
+
+if __name__ == "__main__":
+    main()
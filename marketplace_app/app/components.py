@@ -0,0 +1,26 @@
+from config import Config
+from embedder import Embedder
+from embedding_store import EmbeddingStore
+from query_cache import QueryEmbeddingCache
+from recommender import Recommender
+
+# The LLM embedding texts in batches of EMBEDDING_BATCH_SIZE. It is only loaded by
+# the first semantic query, or warmed up at startup.
+embedder = Embedder(
+    Config.EMBEDDING_MODEL, Config.CUDA_DEVICE, Config.EMBEDDING_BATCH_SIZE
+)
+
+# Embeddings of recent queries, so repeated searches skip the model
+query_cache = QueryEmbeddingCache(Config.QUERY_CACHE_SIZE, Config.QUERY_CACHE_TTL)
+
+# Product embeddings persisted across queries and runs
+embedding_store = EmbeddingStore(Config.EMBEDDING_STORE_PATH, Config.EMBEDDING_MODEL)
+
+
+# Finds the products matching semantic queries
+recommender = Recommender(embedder, embedding_store, query_cache)
+
+
+def embed_texts(texts):
+    """Generate the embeddings of a list of texts, in length-bucketed batches."""
+    return embedder.embed(texts)
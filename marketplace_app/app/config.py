@@ -14,3 +14,56 @@ class Config:
 
     # Device configuration (0 for GPU, -1 for CPU)
     CUDA_DEVICE = int(os.getenv("CUDA_DEVICE", 0))
+
+    # Embedding model and the file storing the product embeddings
+    EMBEDDING_MODEL = os.getenv(
+        "EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"
+    )
+    EMBEDDING_STORE_PATH = os.getenv("EMBEDDING_STORE_PATH", "embeddings.db")
+
+    # Number of texts run through the embedding model at once
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 32))
+
+    # Load the embedding model in the background at startup, instead of on the
+    # first semantic query
+    EMBEDDING_WARMUP = os.getenv("EMBEDDING_WARMUP", "false").lower() == "true"
+
+    # Query embeddings kept in the cache, and seconds before they expire
+    QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", 1024))
+    QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", 3600))
+
+    # Vector index searched for recommendations ("exact" or "ivf") and its snapshot
+    VECTOR_INDEX = os.getenv("VECTOR_INDEX", "ivf")
+    VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", "vector_index.vec")
+
+    # IVF lists, and lists scanned per query (higher is slower but more accurate)
+    IVF_LISTS = int(os.getenv("IVF_LISTS", 256))
+    IVF_PROBES = int(os.getenv("IVF_PROBES", 16))
+
+    # Store the index vectors as int8, ranking RESCORE_FACTOR times the requested
+    # matches again on the full precision vectors of the embedding store
+    VECTOR_INDEX_QUANTIZE = (
+        os.getenv("VECTOR_INDEX_QUANTIZE", "false").lower() == "true"
+    )
+    RESCORE_FACTOR = int(os.getenv("RESCORE_FACTOR", 4))
+
+    # Subject and queue group of the recommendation service, and the time the CLI
+    # waits for its reply before searching locally
+    RECOMMEND_SUBJECT = os.getenv("RECOMMEND_SUBJECT", "recommend.query")
+    RECOMMEND_QUEUE_GROUP = os.getenv("RECOMMEND_QUEUE_GROUP", "recommenders")
+    RECOMMEND_TIMEOUT = float(os.getenv("RECOMMEND_TIMEOUT", 5))
+
+    # Queries embedded together by the recommendation service, and how long it
+    # waits for further queries to join a batch
+    RECOMMEND_BATCH_SIZE = int(os.getenv("RECOMMEND_BATCH_SIZE", 32))
+    RECOMMEND_BATCH_INTERVAL = float(os.getenv("RECOMMEND_BATCH_INTERVAL", 0.01))
+
+    # Most recommendations the recommendation service returns per request
+    RECOMMEND_MAX_LIMIT = int(os.getenv("RECOMMEND_MAX_LIMIT", 50))
+
+    # Product events embedded per micro-batch, and how long to wait to fill one
+    INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", 64))
+    INDEX_BATCH_INTERVAL = float(os.getenv("INDEX_BATCH_INTERVAL", 0.5))
+
+    # Minimum seconds between two snapshots of the vector index
+    INDEX_SNAPSHOT_INTERVAL = float(os.getenv("INDEX_SNAPSHOT_INTERVAL", 5))
@@ -0,0 +1,80 @@
+import threading
+
+import numpy as np
+
+
+class Embedder:
+    """Embeds texts in batches with mean pooling over their token embeddings.
+
+    Texts are tokenized once, sorted by token count and cut into batches of
+    batch_size, so every batch holds texts of about the same length and little
+    padding is computed. Padding tokens are masked out of the mean.
+
+    torch, transformers and the model are only loaded by the first embedding, or
+    ahead of it in the background by warm_up, so processes that never embed a text
+    start fast and stay small.
+    """
+
+    def __init__(self, model_name, device=-1, batch_size=32):
+        self.model_name = model_name
+        self.device_number = device
+        self.batch_size = batch_size
+        self.device = None
+        self.tokenizer = None
+        self.model = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        """Import torch and transformers and load the model, unless already loaded."""
+        with self.lock:
+            if self.model is not None:
+                return
+            import torch
+            from transformers import AutoModel, AutoTokenizer
+
+            # Use the configured GPU if one is available
+            if self.device_number >= 0 and torch.cuda.is_available():
+                self.device = torch.device(f"cuda:{self.device_number}")
+            else:
+                self.device = torch.device("cpu")
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            self.model = (
+                AutoModel.from_pretrained(self.model_name).to(self.device).eval()
+            )
+
+    def warm_up(self):
+        """Load the model in a background thread."""
+        thread = threading.Thread(target=self.load, daemon=True)
+        thread.start()
+        return thread
+
+    def embed(self, texts):
+        """Embed a list of texts into a float32 matrix, one row per text."""
+        self.load()
+        texts = list(texts)
+        embeddings = np.empty(
+            (len(texts), self.model.config.hidden_size), dtype=np.float32
+        )
+        if not texts:
+            return embeddings
+
+        encodings = self.tokenizer(texts, truncation=True)["input_ids"]
+        order = np.argsort([len(input_ids) for input_ids in encodings], kind="stable")
+        for start in range(0, len(texts), self.batch_size):
+            end = start + self.batch_size
+            rows = order[start:end]
+            batch = self.tokenizer.pad(
+                {"input_ids": [encodings[row] for row in rows]}, return_tensors="pt"
+            ).to(self.device)
+            embeddings[rows] = self._mean_pool(batch)
+        return embeddings
+
+    def _mean_pool(self, batch):
+        import torch
+
+        with torch.inference_mode():
+            token_embeddings = self.model(**batch).last_hidden_state
+            mask = batch["attention_mask"].unsqueeze(-1).to(token_embeddings.dtype)
+            summed = (token_embeddings * mask).sum(dim=1)
+            counts = mask.sum(dim=1).clamp(min=1)
+            return (summed / counts).float().cpu().numpy()
@@ -0,0 +1,141 @@
+import hashlib
+import sqlite3
+
+import numpy as np
+
+# Number of ids per query, below SQLite's limit on bound parameters
+_CHUNK_SIZE = 500
+
+
+def product_text(product):
+    """Build the text of a product that gets embedded."""
+    return f"{product['title']} {product['description']}"
+
+
+def content_hash(product, model_name):
+    """Hash the embedded content of a product together with the model embedding it.
+
+    A stored vector is only reused while the hash matches, so editing a product or
+    switching the model invalidates it.
+    """
+    digest = hashlib.sha256()
+    digest.update(model_name.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(product_text(product).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class EmbeddingStore:
+    """Persistent product embeddings, keyed by product id and content hash."""
+
+    def __init__(self, path, model_name):
+        self.path = path
+        self.model_name = model_name
+        # Used from worker threads too, one call at a time
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "product_id TEXT PRIMARY KEY, "
+            "content_hash TEXT NOT NULL, "
+            "vector BLOB NOT NULL)"
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def product_ids(self):
+        """Return the ids of all stored products."""
+        return [
+            row[0]
+            for row in self.connection.execute("SELECT product_id FROM embeddings")
+        ]
+
+    def get_many(self, product_ids):
+        """Return the stored (content_hash, vector) pairs of the given products."""
+        product_ids = list(product_ids)
+        found = {}
+        for start in range(0, len(product_ids), _CHUNK_SIZE):
+            end = start + _CHUNK_SIZE
+            chunk = product_ids[start:end]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.connection.execute(
+                "SELECT product_id, content_hash, vector FROM embeddings "
+                f"WHERE product_id IN ({placeholders})",
+                chunk,
+            )
+            for product_id, stored_hash, vector in rows:
+                found[product_id] = (
+                    stored_hash,
+                    np.frombuffer(vector, dtype=np.float32),
+                )
+        return found
+
+    def vectors(self, product_ids):
+        """Return the stored vectors of the given products, keyed by product id."""
+        return {
+            product_id: vector
+            for product_id, (_, vector) in self.get_many(product_ids).items()
+        }
+
+    def put_many(self, items):
+        """Store (product_id, content_hash, vector) triples, replacing older ones."""
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO embeddings (product_id, content_hash, vector) "
+            "VALUES (?, ?, ?)",
+            [
+                (str(product_id), stored_hash, np.asarray(vector, np.float32).tobytes())
+                for product_id, stored_hash, vector in items
+            ],
+        )
+        self.connection.commit()
+
+    def delete_many(self, product_ids):
+        """Forget the vectors of the given products."""
+        self.connection.executemany(
+            "DELETE FROM embeddings WHERE product_id = ?",
+            [(str(product_id),) for product_id in product_ids],
+        )
+        self.connection.commit()
+
+    def sync(self, products, embed_texts):
+        """Return a vector per product, embedding only new or changed products.
+
+        Args:
+            products (dict): Products keyed by id, with a title and description.
+            embed_texts (Callable): Embeds a list of texts into a list of vectors.
+
+        Returns:
+            tuple[dict, list]: The vector of every product keyed by product id, and
+            the ids of the products that were (re-)embedded.
+        """
+        hashes = {
+            product_id: content_hash(product, self.model_name)
+            for product_id, product in products.items()
+        }
+        stored = self.get_many(products)
+
+        vectors = {}
+        stale = []
+        for product_id, expected_hash in hashes.items():
+            stored_hash, vector = stored.get(product_id, (None, None))
+            if stored_hash == expected_hash:
+                vectors[product_id] = vector
+            else:
+                stale.append(product_id)
+
+        if stale:
+            texts = [product_text(products[product_id]) for product_id in stale]
+            new_vectors = embed_texts(texts)
+            self.put_many(
+                (product_id, hashes[product_id], vector)
+                for product_id, vector in zip(stale, new_vectors)
+            )
+            vectors.update(
+                (product_id, np.asarray(vector, np.float32))
+                for product_id, vector in zip(stale, new_vectors)
+            )
+        return vectors, stale
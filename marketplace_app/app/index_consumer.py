@@ -0,0 +1,202 @@
+import asyncio
+import json
+import time
+
+from nats.aio.client import Client as NATS
+
+from config import Config
+from components import embed_texts, embedding_store
+from recommender import open_product_index
+
+# Subjects announcing product changes, and whether their events delete products
+PRODUCT_SUBJECTS = {
+    "product.created": False,
+    "product.created.batch": False,
+    "product.updated": False,
+    "product.deleted": True,
+}
+
+
+def parse_product_event(subject, data):
+    """Return the (product_id, product or None when deleted) changes of an event."""
+    try:
+        event = json.loads(data.decode())
+        event_object = event["object"]
+    except (ValueError, KeyError, TypeError):
+        return []
+    items = event_object.get("items", [event_object])
+
+    deleted = PRODUCT_SUBJECTS[subject]
+    changes = []
+    for item in items:
+        product_id = item.get("product_id")
+        if not product_id:
+            continue
+        if deleted:
+            changes.append((product_id, None))
+        else:
+            product = {
+                "title": item.get("title") or "",
+                "description": item.get("description") or "",
+            }
+            changes.append((product_id, product))
+    return changes
+
+
+class ProductIndexConsumer:
+    """Keeps the embedding store and vector index in line with product events.
+
+    Created and updated products are embedded in micro-batches of up to batch_size
+    events, or what arrived within batch_interval seconds. Deleted products are
+    removed from the store and the index. The index is snapshotted at most every
+    snapshot_interval seconds, and once more on stop.
+    """
+
+    def __init__(
+        self,
+        nc,
+        store,
+        index,
+        embed_texts,
+        snapshot_path=Config.VECTOR_INDEX_PATH,
+        batch_size=Config.INDEX_BATCH_SIZE,
+        batch_interval=Config.INDEX_BATCH_INTERVAL,
+        snapshot_interval=Config.INDEX_SNAPSHOT_INTERVAL,
+    ):
+        self.nc = nc
+        self.store = store
+        self.index = index
+        self.embed_texts = embed_texts
+        self.snapshot_path = snapshot_path
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.snapshot_interval = snapshot_interval
+        self.queue = asyncio.Queue()
+        self.subscriptions = []
+        self.task = None
+        self.dirty = False
+        self.last_snapshot = time.monotonic()
+
+    async def start(self):
+        for subject in PRODUCT_SUBJECTS:
+            self.subscriptions.append(
+                await self.nc.subscribe(subject, cb=self.handle_event)
+            )
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Stop consuming, apply the changes received so far and snapshot the index."""
+        for subscription in self.subscriptions:
+            await subscription.unsubscribe()
+        self.subscriptions = []
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        changes = []
+        while not self.queue.empty():
+            changes.append(self.queue.get_nowait())
+        await self.apply(changes)
+        self.snapshot()
+
+    async def handle_event(self, msg):
+        """Queue the product changes of a received event."""
+        for change in parse_product_event(msg.subject, msg.data):
+            self.queue.put_nowait(change)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if self.dirty:
+                # Snapshot pending changes once no further event arrived in time
+                timeout = self.last_snapshot + self.snapshot_interval - time.monotonic()
+                try:
+                    change = await asyncio.wait_for(self.queue.get(), max(timeout, 0))
+                except asyncio.TimeoutError:
+                    self.snapshot()
+                    continue
+            else:
+                change = await self.queue.get()
+
+            changes = [change]
+            deadline = loop.time() + self.batch_interval
+            while len(changes) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    changes.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self.apply(changes)
+            except Exception as e:
+                print(f"Failed to index {len(changes)} product changes: {e}")
+            if time.monotonic() - self.last_snapshot >= self.snapshot_interval:
+                self.snapshot()
+
+    async def apply(self, changes):
+        """Embed and index the changed products, and remove the deleted ones."""
+        # Only the last change of each product counts
+        latest = dict(changes)
+        upserts = {
+            product_id: product
+            for product_id, product in latest.items()
+            if product is not None
+        }
+        deletes = [
+            product_id for product_id, product in latest.items() if product is None
+        ]
+
+        if upserts:
+            # Embedding blocks, so it runs outside of the event loop
+            vectors, changed = await asyncio.to_thread(
+                self.store.sync, upserts, self.embed_texts
+            )
+            changed = set(changed)
+            inserted = [
+                product_id
+                for product_id in upserts
+                if product_id in changed or product_id not in self.index
+            ]
+            # Inserting can train the IVF centroids, which blocks as well
+            await asyncio.to_thread(
+                self.index.insert,
+                inserted,
+                [vectors[product_id] for product_id in inserted],
+                self.store.vectors,
+            )
+            self.dirty = self.dirty or bool(inserted)
+        if deletes:
+            self.store.delete_many(deletes)
+            self.index.delete(deletes)
+            self.dirty = True
+
+    def snapshot(self):
+        """Save the index if it changed since the last snapshot."""
+        if self.dirty:
+            self.index.save(self.snapshot_path)
+            self.dirty = False
+        self.last_snapshot = time.monotonic()
+
+
+async def main():
+    product_index = open_product_index()
+    nc = NATS()
+    await nc.connect(servers=Config.NATS_SERVER_URL)
+    consumer = ProductIndexConsumer(nc, embedding_store, product_index, embed_texts)
+    await consumer.start()
+    print(f"Indexing product events, {len(product_index)} products indexed.")
+    try:
+        while True:
+            await asyncio.sleep(1)
+    finally:
+        await consumer.stop()
+        await nc.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,21 +1,11 @@
-from transformers import pipeline
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 import json
 import asyncio
 from nats.aio.client import Client as NATS
-import torch
+from nats.errors import NoRespondersError
 from config import Config
+from components import embedder, recommender
 import requests
 
-# Determine if a GPU is available and assign device accordingly
-device = Config.CUDA_DEVICE if torch.cuda.is_available() else -1
-
-# Load the LLM (using Hugging Face pipeline here)
-query_model = pipeline(
-    "feature-extraction", model="sentence-transformers/all-MiniLM-L6-v2", device=device
-)
-
 logged_in_user = None
 
 nats_client = NATS()
@@ -31,57 +21,59 @@ async def publish_event(subject, message):
     await nats_client.publish(subject, json.dumps(message).encode())
 
 
-def generate_embeddings(text):
-    """Generate embeddings using the LLM."""
-    # Set clean_up_tokenization_spaces explicitly to False
-    embeddings = query_model(text, clean_up_tokenization_spaces=False)
-    return np.mean(embeddings[0], axis=0)  # Get the mean of the token embeddings
+def fetch_products():
+    """Fetch the whole catalog, following the pages of /products, keyed by id."""
+    products = {}
+    params = {"limit": 500}
+    while True:
+        response = requests.get(f"{server_url}/products", params=params)
+        if response.status_code == 404:
+            break
+        response.raise_for_status()
+        page = response.json()
+        products.update((product["id"], product) for product in page["products"])
+        if not page.get("next_cursor"):
+            break
+        params["cursor"] = page["next_cursor"]
+    return products
 
 
-def find_best_products(query, product_listings):
+def find_best_products(query, limit=5):
     """Find the best products based on the user's query using LLM embeddings."""
-    query_embedding = generate_embeddings(query)
-
-    product_similarities = []
-    for product_id, product in product_listings.items():
-        product_text = f"{product['title']} {product['description']}"
-        product_embedding = generate_embeddings(product_text)
-
-        # Calculate similarity between query and product
-        similarity = cosine_similarity([query_embedding], [product_embedding])[0][0]
-        product_similarities.append((product_id, similarity))
+    return recommender.find_best_products(query, limit)
 
-    # Sort products by similarity score and then by rating
-    product_similarities.sort(
-        key=lambda x: (-x[1], -product_listings[x[0]]["average_rating"])
-    )
 
-    return product_similarities[:5]  # Return top 5 matched products
+async def request_recommendations(query, limit=5):
+    """Ask the recommendation service for products, or search locally if no
+    service answers."""
+    try:
+        response = await nats_client.request(
+            Config.RECOMMEND_SUBJECT,
+            json.dumps({"query": query, "limit": limit}).encode(),
+            timeout=Config.RECOMMEND_TIMEOUT,
+        )
+        reply = json.loads(response.data.decode())
+        if "error" not in reply:
+            return reply["recommendations"]
+        print(f"Recommendation service failed: {reply['error']}")
+    except (NoRespondersError, asyncio.TimeoutError):
+        pass
+    return find_best_products(query, limit)
 
 
 async def recommend_products_by_query(query):
     """Recommend products based on a natural language query and publish the event."""
     if logged_in_user:
-        products = requests.get(f"{server_url}/products").json()
-        best_products = find_best_products(query, products)
+        recommendations = await request_recommendations(query)
 
-        if best_products:
+        if recommendations:
             print("\nRecommended Products:")
-            recommendations = []
-            for product_id, similarity in best_products:
-                product = products[product_id]
+            for recommendation in recommendations:
                 print(
-                    f"Title: {product['title']}, Price: {product['price']}, "
-                    f"Rating: {product['average_rating']:.1f}, "
-                    f"Relevance: {similarity:.2f}"
-                )
-                recommendations.append(
-                    {
-                        "title": product["title"],
-                        "price": product["price"],
-                        "rating": product["average_rating"],
-                        "similarity": similarity,
-                    }
+                    f"Title: {recommendation['title']}, "
+                    f"Price: {recommendation['price']}, "
+                    f"Rating: {recommendation['rating']:.1f}, "
+                    f"Relevance: {recommendation['similarity']:.2f}"
                 )
 
             # Publish query and recommendation event
@@ -169,29 +161,23 @@ async def create_product_listing(title, description, price):
 def view_product_listings():
     print("\nAvailable Products:")
 
-    response = requests.get(f"{server_url}/products")
+    try:
+        product_listings = fetch_products()
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching product listings. Please try again. {e}")
+        return
+
+    if not product_listings:
+        print("No products available.")
+        return
 
-    if response.ok:
-        try:
-            product_listings = response.json().get("products", [])
-        except requests.exceptions.JSONDecodeError:
-            print("Error: Received invalid JSON from the server.")
-            print("Response content:", response.text)
-            return
-
-        if not product_listings:
-            print("No products available.")
-            return
-
-        for product in product_listings:
-            print(
-                f"ID: {product['id']} | Title: {product['title']} | "
-                f"Price: {product['price']} | "
-                f"Seller: {product['seller_id']} | "
-                f"Rating: {product['average_rating']:.1f}"
-            )
-    else:
-        print(f"Error fetching product listings. Please try again. {response.text}")
+    for product in product_listings.values():
+        print(
+            f"ID: {product['id']} | Title: {product['title']} | "
+            f"Price: {product['price']} | "
+            f"Seller: {product['seller_id']} | "
+            f"Rating: {product['average_rating']:.1f}"
+        )
 
 
 async def add_product_review(product_id, rating, content):
@@ -344,11 +330,11 @@ def recommend_products():
     if logged_in_user:
         user = requests.get(url=f"{server_url}/users/{logged_in_user.get('id')}").json()
         viewed_products = user.get("viewed_products", [])
-        products = requests.get(f"{server_url}/products").json()
+        products = fetch_products()
 
         recommended = [
             product
-            for product in products
+            for product in products.values()
             if product["average_rating"] >= 4.0
             and product["seller_id"] != logged_in_user.get("id")
             and str(product) not in viewed_products
@@ -370,6 +356,9 @@ def recommend_products():
 async def main():
     await connect_to_nats()
 
+    if Config.EMBEDDING_WARMUP:
+        embedder.warm_up()
+
     while True:
         if logged_in_user:
             print(f"\nLogged in as: {logged_in_user.get('username')}")
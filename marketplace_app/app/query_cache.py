@@ -0,0 +1,62 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_query(query):
+    """Normalize a query so repeated searches share a cache entry."""
+    return " ".join(query.casefold().split())
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU cache of query embeddings whose entries expire after ttl seconds.
+
+    Safe to use from several threads, such as the worker threads of the
+    recommendation service.
+
+    Attributes:
+        hits (int): Lookups answered from the cache.
+        misses (int): Lookups that had to compute the embedding.
+    """
+
+    def __init__(self, max_size=1024, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, query):
+        """Return the cached embedding of the normalized query, or None on a miss."""
+        key = normalize_query(query)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, query, embedding):
+        """Cache the embedding of the normalized query, evicting the oldest entries."""
+        key = normalize_query(query)
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, embedding)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
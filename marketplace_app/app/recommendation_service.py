@@ -0,0 +1,144 @@
+import asyncio
+import json
+
+from nats.aio.client import Client as NATS
+
+from config import Config
+from components import recommender
+
+
+class RecommendationService:
+    """Answers recommendation requests sent to a NATS subject.
+
+    A request is a JSON object with a "query" and an optional "limit", capped at
+    max_limit, answered with {"query": ..., "recommendations": [...]} or
+    {"error": ...}. Requests arriving while the model is busy are queued, and up to
+    batch_size of them are embedded with a single model call. Workers subscribe in
+    a queue group, so NATS spreads the requests over every running worker.
+    """
+
+    def __init__(
+        self,
+        nc,
+        recommender,
+        subject=Config.RECOMMEND_SUBJECT,
+        queue_group=Config.RECOMMEND_QUEUE_GROUP,
+        batch_size=Config.RECOMMEND_BATCH_SIZE,
+        batch_interval=Config.RECOMMEND_BATCH_INTERVAL,
+        max_limit=Config.RECOMMEND_MAX_LIMIT,
+    ):
+        self.nc = nc
+        self.recommender = recommender
+        self.subject = subject
+        self.queue_group = queue_group
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.max_limit = max_limit
+        self.queue = asyncio.Queue()
+        self.subscription = None
+        self.task = None
+
+    async def start(self):
+        self.subscription = await self.nc.subscribe(
+            self.subject, queue=self.queue_group, cb=self.handle_request
+        )
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Stop taking requests, and answer the queued ones."""
+        if self.subscription is not None:
+            await self.subscription.unsubscribe()
+            self.subscription = None
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        requests = []
+        while not self.queue.empty():
+            requests.append(self.queue.get_nowait())
+        if requests:
+            await self.answer(requests)
+
+    async def handle_request(self, msg):
+        """Queue a valid request, and reject an invalid one right away."""
+        try:
+            request = json.loads(msg.data.decode())
+            query = request["query"]
+            limit = int(request.get("limit", 5))
+            if not isinstance(query, str) or not query.strip() or limit < 1:
+                raise ValueError
+        except (ValueError, KeyError, TypeError, AttributeError):
+            await self.reply(msg, {"error": "Expected a non-empty query and limit"})
+            return
+        self.queue.put_nowait((query, min(limit, self.max_limit), msg))
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            requests = [await self.queue.get()]
+            deadline = loop.time() + self.batch_interval
+            while len(requests) < self.batch_size:
+                # Take whatever is queued already, then wait out the interval
+                if self.queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        request = await asyncio.wait_for(self.queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    request = self.queue.get_nowait()
+                requests.append(request)
+            await self.answer(requests)
+
+    async def answer(self, requests):
+        """Embed a batch of queries in one model call and reply to each request."""
+        try:
+            replies = await asyncio.to_thread(self.recommend, requests)
+        except Exception as e:
+            print(f"Failed to answer {len(requests)} recommendation requests: {e}")
+            replies = [{"error": "Recommendation failed"}] * len(requests)
+        for (_, _, msg), reply in zip(requests, replies):
+            await self.reply(msg, reply)
+
+    def recommend(self, requests):
+        self.recommender.refresh_index()
+        queries = [query for query, _, _ in requests]
+        embeddings = self.recommender.embed_queries(queries)
+        return [
+            {
+                "query": query,
+                "recommendations": self.recommender.recommend(embedding, limit),
+            }
+            for (query, limit, _), embedding in zip(requests, embeddings)
+        ]
+
+    async def reply(self, msg, reply):
+        if msg.reply:
+            await msg.respond(json.dumps(reply).encode())
+
+
+async def main():
+    nc = NATS()
+    await nc.connect(servers=Config.NATS_SERVER_URL)
+
+    # Load the model before taking requests
+    await asyncio.to_thread(recommender.embedder.load)
+
+    service = RecommendationService(nc, recommender)
+    await service.start()
+    print(f"Answering {service.subject} requests in queue group {service.queue_group}.")
+    try:
+        while True:
+            await asyncio.sleep(1)
+    finally:
+        await service.stop()
+        await nc.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
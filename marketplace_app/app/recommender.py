@@ -0,0 +1,130 @@
+import os
+
+import requests
+
+from config import Config
+from query_cache import normalize_query
+from vector_index import create_index, load_index
+
+# Most products the API returns per request
+FETCH_PAGE_SIZE = 500
+
+
+def open_product_index(path=Config.VECTOR_INDEX_PATH):
+    """Load the vector index snapshot, or create an empty index."""
+    if os.path.exists(path):
+        return load_index(path)
+    options = {
+        "quantize": Config.VECTOR_INDEX_QUANTIZE,
+        "rescore_factor": Config.RESCORE_FACTOR,
+    }
+    if Config.VECTOR_INDEX == "ivf":
+        options.update(n_lists=Config.IVF_LISTS, n_probe=Config.IVF_PROBES)
+    return create_index(Config.VECTOR_INDEX, **options)
+
+
+def snapshot_mtime(path):
+    """Return the modification time of a vector index snapshot, or None if there
+    is none yet."""
+    try:
+        return os.path.getmtime(path)
+    except FileNotFoundError:
+        return None
+
+
+class Recommender:
+    """Finds the products best matching natural language queries.
+
+    The vector index is kept up to date by the index consumer, which snapshots it
+    to index_path; the snapshot is reloaded whenever it changed. Only the matched
+    products are fetched from the API, in one request.
+    """
+
+    def __init__(
+        self,
+        embedder,
+        store,
+        query_cache,
+        index_path=Config.VECTOR_INDEX_PATH,
+        server_url=Config.FASTAPI_URL,
+    ):
+        self.embedder = embedder
+        self.store = store
+        self.query_cache = query_cache
+        self.index_path = index_path
+        self.server_url = server_url
+        # Taken before loading, so a snapshot written meanwhile is reloaded
+        self.index_mtime = snapshot_mtime(index_path)
+        self.index = open_product_index(index_path)
+        self.session = requests.Session()
+
+    def refresh_index(self):
+        """Reload the vector index when the index consumer wrote a newer snapshot."""
+        mtime = snapshot_mtime(self.index_path)
+        if mtime is not None and mtime != self.index_mtime:
+            self.index = load_index(self.index_path)
+            self.index_mtime = mtime
+
+    def embed_queries(self, queries):
+        """Embed a list of queries, running the model once for all uncached ones."""
+        keys = [normalize_query(query) for query in queries]
+        embeddings = {key: self.query_cache.get(key) for key in keys}
+        missing = list(dict.fromkeys(key for key in keys if embeddings[key] is None))
+        if missing:
+            for key, embedding in zip(missing, self.embedder.embed(missing)):
+                self.query_cache.put(key, embedding)
+                embeddings[key] = embedding
+        return [embeddings[key] for key in keys]
+
+    def fetch_products(self, product_ids):
+        """Fetch the given products, keyed by id, leaving out those that no longer
+        exist."""
+        product_ids = list(product_ids)
+        products = {}
+        for start in range(0, len(product_ids), FETCH_PAGE_SIZE):
+            end = start + FETCH_PAGE_SIZE
+            response = self.session.get(
+                f"{self.server_url}/products",
+                params={"ids": product_ids[start:end], "limit": FETCH_PAGE_SIZE},
+            )
+            if response.status_code == 404:
+                continue
+            response.raise_for_status()
+            products.update(
+                (str(product["id"]), product) for product in response.json()["products"]
+            )
+        return products
+
+    def recommend(self, query_embedding, limit=5):
+        """Find the products best matching an embedded query.
+
+        Returns:
+            list[dict]: The best products, most similar first, with their id, title,
+            price, rating and similarity.
+        """
+        # Products tied with the last match are kept to rank them by rating
+        matches = self.index.search(
+            query_embedding, limit, keep_ties=True, rescore=self.store.vectors
+        )
+        products = self.fetch_products(product_id for product_id, _ in matches)
+
+        # Rank products by similarity score and then by rating
+        best_products = sorted(
+            (match for match in matches if match[0] in products),
+            key=lambda match: (-match[1], -(products[match[0]]["average_rating"] or 0)),
+        )
+        return [
+            {
+                "product_id": product_id,
+                "title": products[product_id]["title"],
+                "price": products[product_id]["price"],
+                "rating": products[product_id]["average_rating"],
+                "similarity": similarity,
+            }
+            for product_id, similarity in best_products[:limit]
+        ]
+
+    def find_best_products(self, query, limit=5):
+        """Find the products best matching a query."""
+        self.refresh_index()
+        return self.recommend(self.embed_queries([query])[0], limit)
@@ -0,0 +1,92 @@
+"""
+Unit tests for the persistent product embeddings in `embedding_store`.
+
+Functions:
+    test_sync_embeds_only_new_and_changed_products(tmp_path): Tests that stored
+        vectors are reused while the product content and model are unchanged.
+    test_sync_reembeds_after_model_change(tmp_path): Tests that switching the model
+        invalidates the stored vectors.
+    test_delete_many(tmp_path): Tests that deleted products are forgotten.
+"""
+
+import numpy as np
+
+from embedding_store import EmbeddingStore, product_text
+
+
+class FakeEmbedder:
+    """
+    Embeds texts into vectors derived from their length, recording the texts.
+
+    Attributes:
+        texts (list[str]): Every text embedded so far.
+    """
+
+    def __init__(self):
+        self.texts = []
+
+    def __call__(self, texts):
+        self.texts.extend(texts)
+        return [np.full(4, len(text), dtype=np.float32) for text in texts]
+
+
+PRODUCTS = {
+    "p1": {"title": "Chair", "description": "Wooden"},
+    "p2": {"title": "Table", "description": "Oak"},
+}
+
+
+def test_sync_embeds_only_new_and_changed_products(tmp_path):
+    """
+    Tests that stored vectors are reused while the product content is unchanged,
+    also after reopening the store.
+    """
+    path = str(tmp_path / "embeddings.db")
+    embed = FakeEmbedder()
+    store = EmbeddingStore(path, "model")
+
+    vectors, embedded = store.sync(PRODUCTS, embed)
+    assert sorted(embedded) == ["p1", "p2"]
+    assert set(vectors) == {"p1", "p2"}
+    store.close()
+
+    store = EmbeddingStore(path, "model")
+    changed = {**PRODUCTS, "p2": {"title": "Table", "description": "Walnut"}}
+    changed["p3"] = {"title": "Lamp", "description": "Brass"}
+    vectors, embedded = store.sync(changed, embed)
+
+    assert sorted(embedded) == ["p2", "p3"]
+    assert len(embed.texts) == 4
+    assert embed.texts[-2:] == [
+        product_text(changed["p2"]),
+        product_text(changed["p3"]),
+    ]
+    np.testing.assert_array_equal(
+        vectors["p1"], np.full(4, len(product_text(PRODUCTS["p1"])))
+    )
+    assert len(store) == 3
+
+
+def test_sync_reembeds_after_model_change(tmp_path):
+    """
+    Tests that switching the model invalidates the stored vectors.
+    """
+    path = str(tmp_path / "embeddings.db")
+    EmbeddingStore(path, "model").sync(PRODUCTS, FakeEmbedder())
+
+    _, embedded = EmbeddingStore(path, "other-model").sync(PRODUCTS, FakeEmbedder())
+
+    assert sorted(embedded) == ["p1", "p2"]
+
+
+def test_delete_many(tmp_path):
+    """
+    Tests that deleted products are forgotten.
+    """
+    store = EmbeddingStore(str(tmp_path / "embeddings.db"), "model")
+    store.sync(PRODUCTS, FakeEmbedder())
+
+    store.delete_many(["p1"])
+
+    assert store.product_ids() == ["p2"]
+    assert set(store.vectors(["p1", "p2"])) == {"p2"}
@@ -0,0 +1,58 @@
+"""
+Unit tests for the query embedding cache in `query_cache`.
+
+Functions:
+    test_cache_normalizes_queries(): Tests that queries differing in case and
+        spacing share an entry.
+    test_cache_evicts_least_recently_used(): Tests that the least recently used
+        entry is evicted when the cache is full.
+    test_cache_entries_expire(monkeypatch): Tests that entries expire after the ttl.
+"""
+
+import query_cache
+from query_cache import QueryEmbeddingCache
+
+
+def test_cache_normalizes_queries():
+    """
+    Tests that queries differing in case and spacing share an entry.
+    """
+    cache = QueryEmbeddingCache()
+
+    cache.put("Red  Shoes", [1.0])
+
+    assert cache.get(" red shoes ") == [1.0]
+    assert cache.stats()["hits"] == 1
+
+
+def test_cache_evicts_least_recently_used():
+    """
+    Tests that the least recently used entry is evicted when the cache is full.
+    """
+    cache = QueryEmbeddingCache(max_size=2)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+
+    assert cache.get("a") == [1.0]
+    cache.put("c", [3.0])
+
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == [1.0]
+    assert cache.get("c") == [3.0]
+    assert cache.stats()["misses"] == 1
+
+
+def test_cache_entries_expire(monkeypatch):
+    """
+    Tests that entries are no longer returned once their ttl has passed.
+    """
+    now = [1000.0]
+    monkeypatch.setattr(query_cache.time, "monotonic", lambda: now[0])
+    cache = QueryEmbeddingCache(ttl=10)
+    cache.put("a", [1.0])
+
+    now[0] += 9
+    assert cache.get("a") == [1.0]
+    now[0] += 2
+    assert cache.get("a") is None
@@ -0,0 +1,108 @@
+"""
+Unit tests for the recommender in `recommender`.
+
+Functions:
+    test_recommend_fetches_matches_in_one_request(tmp_path): Tests that the matched
+        products are fetched with a single request and ranked by similarity and
+        rating.
+    test_refresh_keeps_the_loaded_snapshot(tmp_path): Tests that the snapshot
+        loaded on start is only loaded again once it changed.
+"""
+
+import os
+from types import SimpleNamespace
+
+import numpy as np
+
+from recommender import Recommender
+from vector_index import ExactIndex
+
+
+class FakeResponse:
+    """
+    Stand-in for a requests response carrying a page of products.
+    """
+
+    status_code = 200
+
+    def __init__(self, products):
+        self.products = products
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"products": self.products}
+
+
+class FakeSession:
+    """
+    Stand-in for a requests session serving products by id.
+
+    Attributes:
+        requests (list[dict]): The query parameters of every request.
+    """
+
+    def __init__(self, products):
+        self.products = products
+        self.requests = []
+
+    def get(self, url, params=None):
+        self.requests.append(params)
+        return FakeResponse(
+            [self.products[i] for i in params["ids"] if i in self.products]
+        )
+
+
+def test_recommend_fetches_matches_in_one_request(tmp_path):
+    """
+    Tests that the matched products are fetched with a single request, and that
+    products with the same similarity are ranked by rating.
+    """
+    products = {
+        product_id: {
+            "id": product_id,
+            "title": product_id,
+            "price": 1.0,
+            "average_rating": rating,
+        }
+        for product_id, rating in (("a", 2.0), ("b", 5.0), ("c", 4.0))
+    }
+    recommender = Recommender(
+        embedder=None,
+        store=SimpleNamespace(vectors=lambda product_ids: {}),
+        query_cache=None,
+        index_path=str(tmp_path / "index.vec"),
+    )
+    recommender.session = FakeSession(products)
+    recommender.index.insert(
+        ["a", "b", "c", "gone"],
+        [[1.0, 0.0], [1.0, 0.0], [0.0, 1.0], [1.0, 0.0]],
+    )
+
+    results = recommender.recommend(np.array([1.0, 0.0]), limit=2)
+
+    assert len(recommender.session.requests) == 1
+    assert sorted(recommender.session.requests[0]["ids"]) == ["a", "b", "gone"]
+    assert [result["product_id"] for result in results] == ["b", "a"]
+
+
+def test_refresh_keeps_the_loaded_snapshot(tmp_path):
+    """
+    Tests that the snapshot loaded on start is only loaded again once it changed.
+    """
+    index_path = tmp_path / "index.vec"
+    ExactIndex(["a"], [[1.0, 0.0]]).save(str(index_path))
+    recommender = Recommender(
+        embedder=None, store=None, query_cache=None, index_path=str(index_path)
+    )
+    loaded = recommender.index
+
+    recommender.refresh_index()
+    assert recommender.index is loaded
+
+    ExactIndex(["a", "b"], [[1.0, 0.0], [0.0, 1.0]]).save(str(index_path))
+    os.utime(index_path, (0, 0))
+    recommender.refresh_index()
+    assert recommender.index is not loaded
+    assert len(recommender.index) == 2
@@ -0,0 +1,63 @@
+"""
+Unit tests for the memory-mapped snapshots in `vector_file`.
+
+Functions:
+    test_vector_file_round_trip(tmp_path): Tests that ids, arrays and metadata are
+        read back as written.
+    test_vector_file_empty(tmp_path): Tests that a file without rows can be read.
+    test_vector_file_rejects_other_files(tmp_path): Tests that other files are not
+        read as vector files.
+"""
+
+import numpy as np
+import pytest
+
+from vector_file import ALIGNMENT, read_vector_file, write_vector_file
+
+
+def test_vector_file_round_trip(tmp_path):
+    """
+    Tests that ids, arrays and metadata are read back as written, with the arrays
+    memory-mapped at aligned offsets.
+    """
+    path = str(tmp_path / "index.vec")
+    ids = ["a", "b", "ç"]
+    vectors = np.arange(12, dtype=np.float32).reshape(3, 4)
+    codes = np.array([[1, -2], [3, -4], [5, -6]], dtype=np.int8)
+
+    write_vector_file(path, ids, {"vectors": vectors, "codes": codes}, {"kind": "x"})
+    metadata, read_ids, arrays = read_vector_file(path)
+
+    assert metadata == {"kind": "x"}
+    assert read_ids == ids
+    np.testing.assert_array_equal(arrays["vectors"], vectors)
+    np.testing.assert_array_equal(arrays["codes"], codes)
+    assert arrays["codes"].dtype == np.int8
+    for array in arrays.values():
+        assert isinstance(array, np.memmap)
+        assert array.offset % ALIGNMENT == 0
+
+
+def test_vector_file_empty(tmp_path):
+    """
+    Tests that a file without rows can be written and read.
+    """
+    path = str(tmp_path / "index.vec")
+
+    write_vector_file(path, [], {"vectors": np.empty((0, 4), dtype=np.float32)})
+    metadata, ids, arrays = read_vector_file(path)
+
+    assert metadata == {}
+    assert ids == []
+    assert arrays["vectors"].shape == (0, 4)
+
+
+def test_vector_file_rejects_other_files(tmp_path):
+    """
+    Tests that files that are not vector files raise a ValueError.
+    """
+    path = tmp_path / "index.vec"
+    path.write_bytes(b"\0" * 64)
+
+    with pytest.raises(ValueError):
+        read_vector_file(str(path))
@@ -0,0 +1,226 @@
+"""
+Unit tests for the vector indexes in `vector_index`.
+
+Functions:
+    make_index(kind, quantize): Create an index whose IVF variant trains on few
+        vectors.
+    test_search_finds_nearest_vectors(kind, quantize): Tests that a search returns
+        the most similar vectors, best first.
+    test_insert_replaces_vectors(kind, quantize): Tests that inserting a known id
+        replaces its vector.
+    test_delete_removes_vectors(kind, quantize): Tests that deleted vectors are no
+        longer found.
+    test_rescore_ranks_on_full_vectors(kind): Tests that a quantized index ranks
+        its candidates on the full precision vectors.
+    test_training_quantizes_full_vectors_once(): Tests that a quantized IVF index
+        trains on the full precision vectors without quantizing them twice.
+    test_save_and_load(tmp_path, kind, quantize): Tests that a loaded snapshot
+        returns the same results and can still be changed.
+    test_search_empty_index(kind): Tests that an empty index finds nothing.
+    test_top_k_breaks_ties(): Tests that equal scores are ordered by the tie breaker.
+    test_top_k_keeps_ties(): Tests that keep_ties returns the ties at the cut-off.
+    test_top_k_empty(): Tests that top_k of no scores is empty.
+"""
+
+import numpy as np
+import pytest
+
+from vector_index import ExactIndex, IVFIndex, load_index, normalize, quantize, top_k
+
+DIM = 16
+INDEXES = [(kind, quantize) for kind in ("exact", "ivf") for quantize in (False, True)]
+
+
+def make_index(kind, quantize=False):
+    """
+    Create an index; the IVF index trains its centroids after 4 * 39 vectors.
+    """
+    if kind == "exact":
+        return ExactIndex(quantize=quantize)
+    return IVFIndex(n_lists=4, n_probe=4, quantize=quantize)
+
+
+def random_vectors(count, seed=0):
+    """
+    Create random float32 vectors of DIM dimensions.
+    """
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=(count, DIM)).astype(np.float32)
+
+
+def filled_index(kind, quantize, count=200):
+    """
+    Create an index holding count random vectors with the ids p0, p1, ...
+    """
+    vectors = random_vectors(count)
+    ids = [f"p{i}" for i in range(count)]
+    index = make_index(kind, quantize)
+    index.insert(ids, vectors)
+    return index, ids, vectors
+
+
+@pytest.mark.parametrize("kind,quantize", INDEXES)
+def test_search_finds_nearest_vectors(kind, quantize):
+    """
+    Tests that a search returns the most similar vectors, best first.
+    """
+    index, ids, vectors = filled_index(kind, quantize)
+    if kind == "ivf":
+        assert index.centroids is not None
+
+    results = index.search(vectors[7], 3)
+
+    assert len(results) == 3
+    assert results[0][0] == "p7"
+    assert results[0][1] == pytest.approx(1.0, abs=0.01)
+    similarities = [similarity for _, similarity in results]
+    assert similarities == sorted(similarities, reverse=True)
+
+
+@pytest.mark.parametrize("kind,quantize", INDEXES)
+def test_insert_replaces_vectors(kind, quantize):
+    """
+    Tests that inserting a known id replaces its vector instead of adding one.
+    """
+    index, ids, vectors = filled_index(kind, quantize)
+
+    index.insert(["p7"], [vectors[8]])
+
+    assert len(index) == len(ids)
+    assert {product_id for product_id, _ in index.search(vectors[8], 2)} == {
+        "p7",
+        "p8",
+    }
+
+
+@pytest.mark.parametrize("kind,quantize", INDEXES)
+def test_delete_removes_vectors(kind, quantize):
+    """
+    Tests that deleted vectors are no longer found, and unknown ids are ignored.
+    """
+    index, ids, vectors = filled_index(kind, quantize)
+
+    index.delete(["p7", "unknown"])
+
+    assert len(index) == len(ids) - 1
+    assert "p7" not in index
+    assert "p7" not in [product_id for product_id, _ in index.search(vectors[7], 5)]
+    # The row moved into the deleted one is still found
+    assert index.search(vectors[-1], 1)[0][0] == ids[-1]
+
+
+@pytest.mark.parametrize("kind", ["exact", "ivf"])
+def test_rescore_ranks_on_full_vectors(kind):
+    """
+    Tests that a quantized index ranks its candidates on the full precision
+    vectors returned by rescore.
+    """
+    index, ids, vectors = filled_index(kind, quantize=True)
+    full_vectors = dict(zip(ids, vectors))
+    requested = []
+
+    def rescore(candidate_ids):
+        requested.append(list(candidate_ids))
+        return {product_id: full_vectors[product_id] for product_id in candidate_ids}
+
+    results = index.search(vectors[7], 2, rescore=rescore)
+
+    assert len(requested[0]) == 2 * index.rescore_factor
+    assert results[0][0] == "p7"
+    assert results[0][1] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_training_quantizes_full_vectors_once():
+    """
+    Tests that a quantized IVF index trains on the full precision vectors returned
+    by full_vectors, and stores their codes without quantizing them twice.
+    """
+    vectors = random_vectors(200)
+    ids = [f"p{i}" for i in range(200)]
+    full_vectors = dict(zip(ids, vectors))
+    requested = []
+
+    def lookup(product_ids):
+        requested.append(list(product_ids))
+        return {product_id: full_vectors[product_id] for product_id in product_ids}
+
+    index = make_index("ivf", quantize=True)
+    index.insert(ids, vectors, full_vectors=lookup)
+
+    assert index.centroids is not None
+    assert len(requested) == 1
+    expected_codes, expected_scales = quantize(normalize(vectors))
+    for row, product_id in enumerate(ids):
+        list_no, position = index.positions[product_id]
+        vector_list = index.lists[list_no]
+        assert np.array_equal(vector_list.codes[position], expected_codes[row])
+        assert vector_list.scales[position] == expected_scales[row]
+
+
+@pytest.mark.parametrize("kind,quantize", INDEXES)
+def test_save_and_load(tmp_path, kind, quantize):
+    """
+    Tests that a loaded snapshot returns the same results and can still be changed.
+    """
+    index, ids, vectors = filled_index(kind, quantize)
+    path = str(tmp_path / "index.vec")
+
+    index.save(path)
+    loaded = load_index(path)
+
+    assert type(loaded) is type(index)
+    assert loaded.quantize == quantize
+    assert sorted(loaded.ids()) == sorted(ids)
+    assert loaded.search(vectors[3], 5) == index.search(vectors[3], 5)
+
+    loaded.delete(["p3"])
+    loaded.insert(["new"], [vectors[3]])
+    assert loaded.search(vectors[3], 1)[0][0] == "new"
+    # Changes stay private to the process, the snapshot is untouched
+    assert "p3" in load_index(path)
+
+
+@pytest.mark.parametrize("kind", ["exact", "ivf"])
+def test_search_empty_index(kind, tmp_path):
+    """
+    Tests that an empty index, saved and loaded or not, finds nothing.
+    """
+    index = make_index(kind)
+    path = str(tmp_path / "index.vec")
+    index.save(path)
+
+    assert index.search(random_vectors(1)[0], 5) == []
+    assert load_index(path).search(random_vectors(1)[0], 5) == []
+
+
+def test_top_k_breaks_ties():
+    """
+    Tests that equal scores are ordered by the highest tie breaker value,
+    including at the cut-off.
+    """
+    scores = np.array([0.5, 0.9, 0.5, 0.5, 0.1])
+    tie_values = np.array([1, 0, 3, 2, 9])
+
+    def tie_breaker(indices):
+        return tie_values[indices]
+
+    assert list(top_k(scores, 2, tie_breaker)) == [1, 2]
+    assert list(top_k(scores, 4, tie_breaker)) == [1, 2, 3, 0]
+    assert list(top_k(scores, 10)) == [1, 0, 2, 3, 4]
+
+
+def test_top_k_keeps_ties():
+    """
+    Tests that keep_ties also returns the scores tied with the k-th one.
+    """
+    scores = np.array([0.5, 0.9, 0.5, 0.5, 0.1])
+
+    assert sorted(top_k(scores, 2, keep_ties=True)) == [0, 1, 2, 3]
+
+
+def test_top_k_empty():
+    """
+    Tests that top_k of no scores, or of zero results, is empty.
+    """
+    assert len(top_k(np.array([]), 5)) == 0
+    assert len(top_k(np.array([0.3, 0.2]), 0)) == 0
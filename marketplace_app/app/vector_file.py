@@ -0,0 +1,110 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+# File layout:
+#   header    magic, format version and the length of the metadata
+#   metadata  JSON: caller metadata, the id map location and the array sections
+#   id map    the ids of the rows, UTF-8, separated by newlines
+#   arrays    one section per array (such as the float32 vectors), each aligned to
+#             ALIGNMENT bytes so it can be memory-mapped in place
+MAGIC = b"MKTVEC\0\0"
+VERSION = 1
+HEADER = struct.Struct("<8sIQ")
+ALIGNMENT = 64
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write_vector_file(path, ids, arrays, metadata=None):
+    """Write ids and arrays to a vector file, replacing the previous file atomically.
+
+    Readers that mapped the previous file keep reading it until they reopen the path.
+
+    Args:
+        path (str): The file to write.
+        ids (list[str]): The ids of the rows.
+        arrays (dict[str, np.ndarray]): The arrays to store, by name.
+        metadata (dict, optional): JSON serializable data stored in the header.
+    """
+    id_map = "\n".join(ids).encode("utf-8")
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+
+    # The metadata length fixes every offset, so lay out the sections with
+    # placeholders until the length stops changing
+    sections = {}
+    meta_length = 0
+    while True:
+        offset = HEADER.size + meta_length
+        ids_offset = offset
+        offset = _aligned(offset + len(id_map))
+        for name, array in arrays.items():
+            sections[name] = {
+                "dtype": array.dtype.str,
+                "shape": list(array.shape),
+                "offset": offset,
+            }
+            offset = _aligned(offset + array.nbytes)
+        meta = json.dumps(
+            {
+                "metadata": metadata or {},
+                "count": len(ids),
+                "ids": {"offset": ids_offset, "length": len(id_map)},
+                "arrays": sections,
+            }
+        ).encode("utf-8")
+        if len(meta) == meta_length:
+            break
+        meta_length = len(meta)
+
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as vector_file:
+        vector_file.write(HEADER.pack(MAGIC, VERSION, meta_length))
+        vector_file.write(meta)
+        vector_file.write(id_map)
+        for name, array in arrays.items():
+            vector_file.seek(sections[name]["offset"])
+            vector_file.write(array.tobytes())
+    os.replace(temporary_path, path)
+
+
+def read_vector_file(path, mode="r"):
+    """Open a vector file, memory-mapping its arrays instead of reading them.
+
+    Args:
+        path (str): The file to open.
+        mode (str): The np.memmap mode; "r" maps the arrays read-only, "c" maps
+            them copy-on-write so changes stay private to the process.
+
+    Returns:
+        tuple[dict, list[str], dict[str, np.memmap]]: The metadata, the ids and
+        the arrays.
+    """
+    with open(path, "rb") as vector_file:
+        magic, version, meta_length = HEADER.unpack(vector_file.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} vector file")
+        meta = json.loads(vector_file.read(meta_length))
+        vector_file.seek(meta["ids"]["offset"])
+        id_map = vector_file.read(meta["ids"]["length"]).decode("utf-8")
+    ids = id_map.split("\n") if meta["count"] else []
+
+    arrays = {}
+    for name, section in meta["arrays"].items():
+        shape = tuple(section["shape"])
+        if 0 in shape:
+            # Empty arrays cannot be mapped
+            arrays[name] = np.empty(shape, dtype=section["dtype"])
+        else:
+            arrays[name] = np.memmap(
+                path,
+                dtype=section["dtype"],
+                mode=mode,
+                offset=section["offset"],
+                shape=shape,
+            )
+    return meta["metadata"], ids, arrays
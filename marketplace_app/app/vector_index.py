@@ -0,0 +1,467 @@
+import numpy as np
+
+from vector_file import read_vector_file, write_vector_file
+
+# Minimum number of vectors per list before an IVF index trains its centroids
+MIN_VECTORS_PER_LIST = 39
+
+# Vectors per list sampled to train the centroids, and k-means iterations
+TRAINING_VECTORS_PER_LIST = 256
+TRAINING_ITERATIONS = 10
+
+# Rows of a quantized list converted to float32 at once while scoring
+SCORE_CHUNK_ROWS = 1024
+
+
+def normalize(vectors):
+    """L2-normalize vectors into a contiguous float32 array, leaving zero vectors
+    as is."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def quantize(vectors):
+    """Quantize vectors to int8 codes with one float32 scale per vector."""
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def top_k(scores, k, tie_breaker=None, keep_ties=False):
+    """Return the indices of the k highest scores, best first.
+
+    Equal scores are ordered by the highest tie_breaker value, a function returning
+    the values of the given indices. Only the candidates selected by argpartition
+    are sorted, together with every score tied with the k-th one so ties at the
+    cut-off are broken on tie_breaker too. With keep_ties, those tied scores are
+    returned as well, for the caller to break the ties.
+    """
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.intp)
+    if k < len(scores):
+        kth_score = scores[np.argpartition(scores, -k)[-k]]
+        candidates = np.flatnonzero(scores >= kth_score)
+    else:
+        candidates = np.arange(len(scores))
+
+    if tie_breaker is None:
+        order = np.argsort(-scores[candidates], kind="stable")
+    else:
+        # lexsort sorts on the last key first
+        ties = np.asarray(tie_breaker(candidates), dtype=np.float64)
+        order = np.lexsort((-ties, -scores[candidates]))
+    if keep_ties:
+        return candidates[order]
+    return candidates[order[:k]]
+
+
+def spherical_kmeans(vectors, n_clusters, iterations=TRAINING_ITERATIONS, seed=0):
+    """Cluster normalized vectors by cosine similarity, returning normalized
+    centroids."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), n_clusters * TRAINING_VECTORS_PER_LIST)
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(sample_size, n_clusters, replace=False)]
+    for _ in range(iterations):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        # Clusters left empty keep their previous centroid
+        empty = ~sums.any(axis=1)
+        sums[empty] = centroids[empty]
+        centroids = normalize(sums)
+    return centroids
+
+
+class _VectorList:
+    """Growable matrix of vectors with the id of every row.
+
+    Quantized lists store int8 codes and a scale per row instead of float32 rows,
+    taking about a quarter of the memory.
+    """
+
+    def __init__(self, dim, quantized=False):
+        self.ids = []
+        self.quantized = quantized
+        self.buffer = np.empty((0, dim), dtype=np.int8 if quantized else np.float32)
+        self.scales = np.empty(0, dtype=np.float32)
+
+    @classmethod
+    def mapped(cls, ids, buffer, scales=None):
+        """Wrap existing rows, such as a memory-mapped file section, without copying."""
+        vector_list = cls(buffer.shape[1], quantized=scales is not None)
+        vector_list.ids = list(ids)
+        vector_list.buffer = buffer
+        if scales is not None:
+            vector_list.scales = scales
+        return vector_list
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def codes(self):
+        """The stored rows: int8 codes when quantized, float32 vectors otherwise."""
+        return self.buffer[: len(self.ids)]
+
+    @property
+    def vectors(self):
+        """The stored rows as float32 vectors."""
+        if self.quantized:
+            return self.codes.astype(np.float32) * self.scales[: len(self.ids), None]
+        return self.codes
+
+    def nbytes(self):
+        return self.codes.nbytes + (
+            self.scales[: len(self.ids)].nbytes if self.quantized else 0
+        )
+
+    def scores(self, query):
+        """Return the dot product of every row with a normalized query."""
+        if not self.quantized:
+            return self.codes @ query
+        scores = np.empty(len(self.ids), dtype=np.float32)
+        for start in range(0, len(self.ids), SCORE_CHUNK_ROWS):
+            end = min(start + SCORE_CHUNK_ROWS, len(self.ids))
+            scores[start:end] = self.buffer[start:end].astype(np.float32) @ query
+        return scores * self.scales[: len(self.ids)]
+
+    def append(self, ids, vectors, scales=None):
+        """Append rows, doubling the buffer when full, and return the first row.
+
+        Quantized lists take float32 vectors, or int8 codes with their scales.
+        """
+        if self.quantized and scales is None:
+            vectors, scales = quantize(vectors)
+        start = len(self.ids)
+        end = start + len(ids)
+        if end > len(self.buffer):
+            capacity = max(end, 2 * len(self.buffer), 16)
+            buffer = np.empty((capacity, self.buffer.shape[1]), dtype=self.buffer.dtype)
+            buffer[:start] = self.buffer[:start]
+            self.buffer = buffer
+            if self.quantized:
+                self.scales = np.resize(self.scales, capacity)
+        self.buffer[start:end] = vectors
+        if self.quantized:
+            self.scales[start:end] = scales
+        self.ids.extend(ids)
+        return start
+
+    def remove(self, row):
+        """Remove a row by moving the last row into it, returning the moved id."""
+        last = len(self.ids) - 1
+        moved = self.ids[last]
+        self.buffer[row] = self.buffer[last]
+        if self.quantized:
+            self.scales[row] = self.scales[last]
+        self.ids[row] = moved
+        self.ids.pop()
+        return moved if row != last else None
+
+
+class VectorIndex:
+    """Cosine similarity search over normalized vectors split into lists.
+
+    Subclasses decide which list a vector is stored in and which lists a query
+    scans. Vectors are inserted and deleted in place, and the index is saved to and
+    loaded from a memory-mapped vector file snapshot.
+
+    With quantize, vectors are stored as int8 codes. A search then scores
+    rescore_factor times the requested number of candidates on the codes, and
+    ranks them on their full precision vectors when a rescore function is given.
+    """
+
+    kind = None
+
+    def __init__(self, quantize=False, rescore_factor=4):
+        self.quantize = quantize
+        self.rescore_factor = rescore_factor
+        self.dim = None
+        self.lists = []
+        # The (list, row) of every id
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, product_id):
+        return product_id in self.positions
+
+    def ids(self):
+        return list(self.positions)
+
+    def nbytes(self):
+        """Return the memory taken by the stored vectors."""
+        return sum(vector_list.nbytes() for vector_list in self.lists)
+
+    def _assign(self, vectors):
+        """Return the list each normalized vector is stored in."""
+        raise NotImplementedError
+
+    def _probe(self, query):
+        """Return the lists a normalized query scans."""
+        raise NotImplementedError
+
+    def _options(self):
+        """Return the constructor arguments stored in snapshots."""
+        return {"quantize": self.quantize, "rescore_factor": self.rescore_factor}
+
+    def insert(self, ids, vectors, full_vectors=None):
+        """Insert vectors, replacing the vectors already stored for their ids.
+
+        full_vectors optionally returns the full precision vectors of a list of ids
+        as a dict, for indexes training on insert.
+        """
+        ids = list(ids)
+        if not ids:
+            return
+        vectors = normalize(np.stack(vectors))
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        self.delete(product_id for product_id in ids if product_id in self.positions)
+        self._insert_normalized(ids, vectors)
+
+    def _insert_normalized(self, ids, vectors, codes=None, scales=None):
+        # Quantized indexes store the given codes and scales rather than
+        # quantizing the vectors again
+        assignments = self._assign(vectors)
+        for list_no in np.unique(assignments):
+            rows = np.flatnonzero(assignments == list_no)
+            while len(self.lists) <= list_no:
+                self.lists.append(_VectorList(self.dim, self.quantize))
+            start = self.lists[list_no].append(
+                [ids[row] for row in rows],
+                vectors[rows] if codes is None else codes[rows],
+                None if scales is None else scales[rows],
+            )
+            for offset, row in enumerate(rows):
+                self.positions[ids[row]] = (int(list_no), start + offset)
+
+    def delete(self, ids):
+        """Delete the vectors of the given ids, ignoring unknown ids."""
+        for product_id in list(ids):
+            position = self.positions.pop(product_id, None)
+            if position is None:
+                continue
+            list_no, row = position
+            moved = self.lists[list_no].remove(row)
+            if moved is not None:
+                self.positions[moved] = (list_no, row)
+
+    def search(self, query, k, tie_breaker=None, keep_ties=False, rescore=None):
+        """Find the k stored vectors most similar to the query vector.
+
+        Args:
+            query (np.ndarray): The query embedding.
+            k (int): The number of results to return.
+            tie_breaker (dict, optional): Per id, the value ranking results with
+                equal similarity.
+            keep_ties (bool): Also return the results tied with the k-th one.
+            rescore (Callable, optional): Returns the full precision vectors of a
+                list of ids as a dict, to rank the candidates of a quantized index.
+
+        Returns:
+            list: (id, similarity) pairs, most similar first.
+        """
+        if not self.positions:
+            return []
+        query = normalize(query)
+        probed = [
+            self.lists[list_no]
+            for list_no in self._probe(query)
+            if list_no < len(self.lists) and len(self.lists[list_no])
+        ]
+        if not probed:
+            return []
+        scores = np.concatenate([vector_list.scores(query) for vector_list in probed])
+        ids = [product_id for vector_list in probed for product_id in vector_list.ids]
+
+        if self.quantize and rescore is not None:
+            candidates = top_k(scores, k * self.rescore_factor)
+            full_vectors = rescore([ids[i] for i in candidates])
+            ids = [ids[i] for i in candidates if ids[i] in full_vectors]
+            if not ids:
+                return []
+            scores = normalize(np.stack([full_vectors[i] for i in ids])) @ query
+
+        def ties(candidates):
+            return [tie_breaker.get(ids[i]) or 0 for i in candidates]
+
+        selected = top_k(
+            scores, k, ties if tie_breaker is not None else None, keep_ties
+        )
+        return [(ids[i], float(scores[i])) for i in selected]
+
+    def save(self, path):
+        """Write a snapshot of the index to a vector file, replacing the previous one
+        atomically."""
+        ids = [
+            product_id for vector_list in self.lists for product_id in vector_list.ids
+        ]
+        arrays = {
+            "vectors": (
+                np.concatenate([vector_list.codes for vector_list in self.lists])
+                if self.lists
+                else np.empty((0, self.dim or 0), dtype=np.float32)
+            ),
+        }
+        if self.quantize:
+            arrays["scales"] = np.concatenate(
+                [vector_list.scales[: len(vector_list)] for vector_list in self.lists]
+                or [np.empty(0, dtype=np.float32)]
+            )
+        arrays.update(self._snapshot_arrays())
+        metadata = {
+            "kind": self.kind,
+            "options": self._options(),
+            "list_sizes": [len(vector_list) for vector_list in self.lists],
+        }
+        write_vector_file(path, ids, arrays, metadata)
+
+    def _snapshot_arrays(self):
+        return {}
+
+    def _restore(self, metadata, ids, arrays):
+        vectors = arrays["vectors"]
+        if not ids:
+            return
+        self.dim = vectors.shape[1]
+        scales = arrays.get("scales")
+        start = 0
+        for list_no, size in enumerate(metadata["list_sizes"]):
+            end = start + size
+            self.lists.append(
+                _VectorList.mapped(
+                    ids[start:end],
+                    vectors[start:end],
+                    scales[start:end] if scales is not None else None,
+                )
+            )
+            for row, product_id in enumerate(ids[start:end]):
+                self.positions[product_id] = (list_no, row)
+            start = end
+
+
+class ExactIndex(VectorIndex):
+    """Brute-force search scanning every vector, in a single list."""
+
+    kind = "exact"
+
+    def __init__(self, ids=(), vectors=(), **options):
+        super().__init__(**options)
+        self.insert(ids, vectors)
+
+    def _assign(self, vectors):
+        return np.zeros(len(vectors), dtype=np.intp)
+
+    def _probe(self, query):
+        return [0]
+
+
+class IVFIndex(VectorIndex):
+    """Inverted file index: vectors are clustered around centroids, and a query only
+    scans the lists of its n_probe nearest centroids.
+
+    Raising n_probe trades latency for recall; n_probe equal to n_lists scans every
+    vector. The centroids are trained once the index holds MIN_VECTORS_PER_LIST
+    vectors per list, until then every vector is kept in one list and scanned.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, n_lists=256, n_probe=16, **options):
+        super().__init__(**options)
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.centroids = None
+
+    def _options(self):
+        return {**super()._options(), "n_lists": self.n_lists, "n_probe": self.n_probe}
+
+    def _assign(self, vectors):
+        if self.centroids is None:
+            return np.zeros(len(vectors), dtype=np.intp)
+        return np.argmax(vectors @ self.centroids.T, axis=1)
+
+    def _probe(self, query):
+        if self.centroids is None:
+            return [0]
+        similarities = self.centroids @ query
+        n_probe = min(self.n_probe, len(similarities))
+        return np.argpartition(similarities, -n_probe)[-n_probe:]
+
+    def insert(self, ids, vectors, full_vectors=None):
+        super().insert(ids, vectors)
+        if self.centroids is None and len(self) >= self.n_lists * MIN_VECTORS_PER_LIST:
+            self.train(full_vectors)
+
+    def train(self, full_vectors=None):
+        """Cluster the stored vectors into n_lists lists around trained centroids.
+
+        A quantized index trains on the full precision vectors returned by
+        full_vectors for a list of ids as a dict, and quantizes them again. The
+        vectors it does not return are trained on their codes, which are kept.
+        """
+        ids = [
+            product_id for vector_list in self.lists for product_id in vector_list.ids
+        ]
+        codes = scales = None
+        if self.quantize:
+            codes = np.concatenate([vector_list.codes for vector_list in self.lists])
+            scales = np.concatenate(
+                [vector_list.scales[: len(vector_list)] for vector_list in self.lists]
+            )
+            vectors = codes.astype(np.float32) * scales[:, None]
+            found = full_vectors(ids) if full_vectors is not None else {}
+            rows = [row for row, product_id in enumerate(ids) if product_id in found]
+            if rows:
+                vectors[rows] = normalize(np.stack([found[ids[row]] for row in rows]))
+                codes[rows], scales[rows] = quantize(vectors[rows])
+        else:
+            vectors = np.concatenate(
+                [vector_list.vectors for vector_list in self.lists]
+            )
+        self.centroids = spherical_kmeans(vectors, self.n_lists)
+        self.lists = []
+        self.positions = {}
+        self._insert_normalized(ids, vectors, codes, scales)
+
+    def _snapshot_arrays(self):
+        if self.centroids is None:
+            return {}
+        return {"centroids": self.centroids}
+
+    def _restore(self, metadata, ids, arrays):
+        super()._restore(metadata, ids, arrays)
+        if "centroids" in arrays:
+            self.centroids = np.array(arrays["centroids"])
+
+
+INDEX_TYPES = {index_type.kind: index_type for index_type in (ExactIndex, IVFIndex)}
+
+
+def create_index(kind, **options):
+    """Create an empty index of the given kind ("exact" or "ivf")."""
+    if kind not in INDEX_TYPES:
+        raise ValueError(
+            f"Unknown vector index {kind!r}, expected one of {list(INDEX_TYPES)}"
+        )
+    return INDEX_TYPES[kind](**options)
+
+
+def load_index(path):
+    """Load an index from a snapshot written by VectorIndex.save.
+
+    The vectors are memory-mapped copy-on-write rather than read, so processes
+    loading the same snapshot share one copy in the page cache, and rows are only
+    copied into memory once a process changes them.
+    """
+    metadata, ids, arrays = read_vector_file(path, mode="c")
+    index = create_index(metadata["kind"], **metadata["options"])
+    index._restore(metadata, ids, arrays)
+    return index
@@ -0,0 +1,416 @@
+"""
+Cluster Module
+
+This module lets several replicas of the notification service share the WebSocket
+clients. Every replica holds its own sockets, and:
+- Consumes the marketplace events in a NATS queue group, so each event is routed by
+  exactly one replica.
+- Advertises on the presence subject which subjects and entities its clients are
+  subscribed to, whenever they change and on a heartbeat. Replicas that stop
+  advertising expire from the presence table. An advertisement too large for one
+  NATS message is split into parts, applied once every part arrived.
+- Subscribes to its own delivery subject, `<prefix>.<replica id>`.
+
+The replica routing an event looks up the replicas interested in it in the presence
+table and forwards the event to their delivery subjects only. Each replica then
+numbers, keeps and queues the notification for its own clients, so sequence numbers
+and backlogs are per replica: clients reconnecting with `?since` have to be routed
+back to the same replica, for instance by a load balancer keyed on the user. The
+cursors carry the replica id, `<replica id>:<seq>`, so a replica recognizes a cursor
+handed out by another one and replays its own history instead (see
+`parse_cursor`). The subscriptions of disconnected clients stay advertised for a
+while, so their backlog keeps being recorded until they reconnect.
+
+Classes:
+    Presence: The subjects and entities every replica holds clients for.
+    ClusterRouter: Routes events between the replicas.
+
+Functions:
+    parse_cursor: Split a replay cursor into its replica id and sequence number.
+    chunk_subscriptions: Split subscriptions into parts of bounded size.
+"""
+
+import asyncio
+import json
+import time
+from collections import namedtuple
+
+from loguru import logger
+
+from subscriptions import WILDCARDS, entity_ids, subject_matches
+
+ReplicaInterest = namedtuple(
+    "ReplicaInterest", ["expires", "unfiltered", "subjects", "patterns"]
+)
+
+
+def parse_cursor(cursor):
+    """
+    Split a replay cursor into its replica id and sequence number.
+
+    Args:
+        cursor (str): `<replica id>:<seq>`, or `<seq>` outside of cluster mode.
+
+    Returns:
+        tuple[str | None, int]: The replica id, None if the cursor has none, and
+        the sequence number.
+
+    Raises:
+        ValueError: If the sequence number is not an integer.
+    """
+    replica_id, _, seq = cursor.rpartition(":")
+    return replica_id or None, int(seq)
+
+
+def chunk_subscriptions(subscriptions, max_bytes):
+    """
+    Split subscriptions into parts whose JSON encoding fits in a number of bytes.
+
+    Args:
+        subscriptions (list): The (subject, entity id) subscriptions.
+        max_bytes (int): The room for the subscriptions of one part.
+
+    Returns:
+        list[list]: The parts, at least one, each holding at least one
+        subscription unless there are none.
+    """
+    parts = [[]]
+    size = 2
+    for subscription in subscriptions:
+        length = len(json.dumps(subscription)) + 2
+        if parts[-1] and size + length > max_bytes:
+            parts.append([])
+            size = 2
+        parts[-1].append(subscription)
+        size += length
+    return parts
+
+
+class Presence:
+    """
+    The subjects and entities every replica holds clients for, as advertised.
+
+    Attributes:
+        replicas (dict[str, ReplicaInterest]): The interests of the replicas by id.
+    """
+
+    def __init__(self):
+        self.replicas = {}
+
+    def update(self, replica_id, unfiltered, subscriptions, ttl):
+        """
+        Record what a replica advertised.
+
+        Args:
+            replica_id (str): The id of the replica.
+            unfiltered (bool): Whether the replica holds clients receiving everything.
+            subscriptions (Iterable): The (subject, entity id) subscriptions of its
+                clients.
+            ttl (float): The number of seconds the advertisement is valid.
+
+        Returns:
+            bool: True if the replica was not known yet.
+        """
+        subjects = set()
+        patterns = []
+        for subject, entity_id in subscriptions:
+            if any(token in WILDCARDS for token in subject.split(".")):
+                patterns.append((subject, entity_id))
+            else:
+                subjects.add((subject, entity_id))
+        known = replica_id in self.replicas
+        self.replicas[replica_id] = ReplicaInterest(
+            time.monotonic() + ttl, unfiltered, subjects, patterns
+        )
+        return not known
+
+    def remove(self, replica_id):
+        """
+        Forget a replica that left the cluster.
+        """
+        self.replicas.pop(replica_id, None)
+
+    def replicas_for(self, subject, ids):
+        """
+        Find the replicas holding clients interested in an event.
+
+        Args:
+            subject (str): The subject of the event.
+            ids (Iterable[str]): The entity ids named by the event.
+
+        Returns:
+            list[str]: The ids of the replicas to deliver the event to.
+        """
+        now = time.monotonic()
+        keys = [None, *ids]
+        targets = []
+        for replica_id, interest in list(self.replicas.items()):
+            if interest.expires < now:
+                logger.warning(f"Replica {replica_id} stopped advertising presence")
+                del self.replicas[replica_id]
+                continue
+            if (
+                interest.unfiltered
+                or any((subject, key) in interest.subjects for key in keys)
+                or any(
+                    subject_matches(pattern, subject) and entity_id in keys
+                    for pattern, entity_id in interest.patterns
+                )
+            ):
+                targets.append(replica_id)
+        return targets
+
+
+class ClusterRouter:
+    """
+    Routes events between the replicas of the notification service.
+
+    Attributes:
+        nc (NATS): The NATS client instance.
+        service (NotificationService): The service delivering to the local clients.
+        subscriptions (SubscriptionIndex): The subscriptions of the local clients.
+        replica_id (str): The id of this replica.
+        presence (Presence): What every replica holds clients for.
+        presence_subject (str): The subject the replicas advertise presence on.
+        delivery_prefix (str): The prefix of the delivery subjects of the replicas.
+        presence_interval (float): Seconds between two presence heartbeats.
+        linger (float): Seconds the subscriptions of disconnected clients stay
+            advertised.
+        max_presence_bytes (int): Size in bytes a presence message is kept under.
+    """
+
+    def __init__(
+        self,
+        nc,
+        service,
+        subscriptions,
+        replica_id,
+        presence_subject="notifications.presence",
+        delivery_prefix="notifications.deliver",
+        presence_interval=5.0,
+        linger=300.0,
+        max_presence_bytes=512 * 1024,
+    ):
+        self.nc = nc
+        self.service = service
+        self.subscriptions = subscriptions
+        self.replica_id = replica_id
+        self.presence = Presence()
+        self.presence_subject = presence_subject
+        self.delivery_prefix = delivery_prefix
+        self.presence_interval = presence_interval
+        self.linger = linger
+        self.max_presence_bytes = max_presence_bytes
+        self.lingering = {}
+        self.advertisement = 0
+        # The parts received so far of the advertisements split in parts, by replica
+        self.partial = {}
+        self.changed = asyncio.Event()
+        self.task = None
+
+    def delivery_subject(self, replica_id):
+        """
+        The subject a replica receives the events for its clients on.
+        """
+        return f"{self.delivery_prefix}.{replica_id}"
+
+    async def start(self):
+        """
+        Subscribe to the delivery subject of this replica and to the presence of
+        the other replicas, and start advertising.
+        """
+        await self.nc.subscribe(
+            self.delivery_subject(self.replica_id), cb=self.handle_delivery
+        )
+        await self.nc.subscribe(self.presence_subject, cb=self.handle_presence)
+        self.task = asyncio.create_task(self._advertise_loop())
+        logger.info(f"Joined the notification cluster as replica {self.replica_id}")
+
+    async def stop(self):
+        """
+        Stop advertising and tell the other replicas this replica left.
+        """
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.nc.publish(
+            self.presence_subject,
+            json.dumps({"replica_id": self.replica_id, "leaving": True}).encode(),
+        )
+
+    def interests_changed(self):
+        """
+        Advertise the subscriptions of the local clients as soon as possible.
+        """
+        self.changed.set()
+
+    def client_left(self, unfiltered, client_subscriptions):
+        """
+        Keep advertising the subscriptions of a disconnected client for a while.
+
+        Args:
+            unfiltered (bool): Whether the client received every notification.
+            client_subscriptions (Iterable): The (subject, entity id) subscriptions
+                of the client.
+        """
+        expires = time.monotonic() + self.linger
+        for subscription in [None] if unfiltered else client_subscriptions:
+            self.lingering[subscription] = expires
+        self.changed.set()
+
+    def local_interests(self):
+        """
+        Collect what the local clients, connected or lingering, are subscribed to.
+
+        Returns:
+            tuple[bool, list]: Whether some client receives everything, and the
+            (subject, entity id) subscriptions.
+        """
+        now = time.monotonic()
+        self.lingering = {
+            subscription: expires
+            for subscription, expires in self.lingering.items()
+            if expires > now
+        }
+        unfiltered = bool(self.subscriptions.unfiltered) or None in self.lingering
+        subscriptions = set(self.subscriptions.subjects)
+        for pattern, entity_ids_by_pattern in self.subscriptions.patterns.items():
+            subscriptions.update(
+                (pattern, entity_id) for entity_id in entity_ids_by_pattern
+            )
+        subscriptions.update(key for key in self.lingering if key is not None)
+        return unfiltered, sorted(subscriptions, key=str)
+
+    async def advertise(self):
+        """
+        Publish the interests of this replica to the other replicas.
+        """
+        unfiltered, subscriptions = self.local_interests()
+        ttl = 3 * self.presence_interval
+        self.presence.update(self.replica_id, unfiltered, subscriptions, ttl)
+        self.advertisement += 1
+        envelope = {
+            "replica_id": self.replica_id,
+            "unfiltered": unfiltered,
+            "ttl": ttl,
+            "advertisement": self.advertisement,
+        }
+        # Leave room for the envelope and the part numbers
+        room = self.max_presence_bytes - len(json.dumps(envelope)) - 64
+        parts = chunk_subscriptions(subscriptions, room)
+        for part, part_subscriptions in enumerate(parts):
+            await self.nc.publish(
+                self.presence_subject,
+                json.dumps(
+                    {
+                        **envelope,
+                        "subscriptions": part_subscriptions,
+                        "part": part,
+                        "parts": len(parts),
+                    }
+                ).encode(),
+            )
+
+    async def _advertise_loop(self):
+        while True:
+            try:
+                await self.advertise()
+            except Exception as e:
+                logger.error(f"Failed to advertise presence: {e}")
+            try:
+                await asyncio.wait_for(self.changed.wait(), self.presence_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.changed.clear()
+
+    async def handle_presence(self, msg):
+        """
+        Record the presence advertised by another replica.
+        """
+        try:
+            presence = json.loads(msg.data.decode())
+            replica_id = presence["replica_id"]
+            if replica_id == self.replica_id:
+                return
+            if presence.get("leaving"):
+                self.presence.remove(replica_id)
+                self.partial.pop(replica_id, None)
+                logger.info(f"Replica {replica_id} left the notification cluster")
+                return
+            subscriptions = [
+                (subject, entity_id) for subject, entity_id in presence["subscriptions"]
+            ]
+            parts = presence.get("parts", 1)
+            if parts > 1:
+                subscriptions = self._assemble(
+                    replica_id,
+                    presence["advertisement"],
+                    presence["part"],
+                    parts,
+                    subscriptions,
+                )
+                if subscriptions is None:
+                    return
+            joined = self.presence.update(
+                replica_id, presence["unfiltered"], subscriptions, presence["ttl"]
+            )
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error(f"Ignoring invalid presence message: {e}")
+            return
+        if joined:
+            # Let the new replica know about this one without waiting a heartbeat
+            logger.info(f"Replica {replica_id} joined the notification cluster")
+            self.changed.set()
+
+    def _assemble(self, replica_id, advertisement, part, parts, subscriptions):
+        """
+        Collect the parts of an advertisement split in parts.
+
+        Returns:
+            list | None: The subscriptions of all parts once the last one arrived,
+            None until then. Parts of an older advertisement are discarded.
+        """
+        pending, received = self.partial.get(replica_id, (None, {}))
+        if pending != advertisement:
+            received = {}
+        received[part] = subscriptions
+        if len(received) < parts:
+            self.partial[replica_id] = (advertisement, received)
+            return None
+        self.partial.pop(replica_id, None)
+        return [
+            subscription
+            for part_no in range(parts)
+            for subscription in received[part_no]
+        ]
+
+    async def route(self, subject, message):
+        """
+        Forward an event to the replicas holding clients interested in it.
+
+        Args:
+            subject (str): The subject of the event.
+            message (str): The event message.
+        """
+        targets = self.presence.replicas_for(subject, entity_ids(message))
+        data = json.dumps({"subject": subject, "message": message}).encode()
+        for replica_id in targets:
+            await self.nc.publish(self.delivery_subject(replica_id), data)
+        logger.debug(f"Routed '{subject}' to replicas {targets}")
+
+    async def handle_delivery(self, msg):
+        """
+        Deliver an event forwarded by the routing replica to the local clients.
+        """
+        try:
+            delivery = json.loads(msg.data.decode())
+            subject = delivery["subject"]
+            message = delivery["message"]
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error(f"Ignoring invalid delivery: {e}")
+            return
+        await self.service.send_notification(subject, message)
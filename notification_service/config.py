@@ -1,4 +1,5 @@
 import os
+import socket
 from dotenv import load_dotenv
 
 # Load the environment variables from the .env file
@@ -8,3 +9,45 @@ load_dotenv(dotenv_path="./.env")
 class Config:
     NATS_SERVER_URL = os.getenv("NATS_SERVER_URL", "nats://nats:4222")
     NOTIFICATION_TYPE = os.getenv("NOTIFICATION_TYPE", "in_app")
+    # Notifications queued per WebSocket client before the slow-consumer policy applies
+    CLIENT_QUEUE_SIZE = int(os.getenv("CLIENT_QUEUE_SIZE", 100))
+    # What to do with a client whose queue is full: "drop_oldest" or "disconnect"
+    SLOW_CONSUMER_POLICY = os.getenv("SLOW_CONSUMER_POLICY", "drop_oldest")
+    # Notifications kept per topic and per entity for clients reconnecting with ?since
+    HISTORY_SIZE = int(os.getenv("HISTORY_SIZE", 1000))
+    # Seconds notifications are kept for reconnecting clients
+    HISTORY_MAX_AGE = float(os.getenv("HISTORY_MAX_AGE", 3600))
+    # Topic and entity buffers kept, evicting the least recently used ones
+    HISTORY_MAX_BUFFERS = int(os.getenv("HISTORY_MAX_BUFFERS", 10000))
+    # Directory of the notification log on disk; empty to keep notifications in memory
+    NOTIFICATION_LOG_DIR = os.getenv("NOTIFICATION_LOG_DIR", "notification_log")
+    # Size in bytes after which the notification log starts a new segment
+    NOTIFICATION_LOG_SEGMENT_BYTES = int(
+        os.getenv("NOTIFICATION_LOG_SEGMENT_BYTES", 64 * 1024 * 1024)
+    )
+    # Seconds notifications are kept in the notification log
+    NOTIFICATION_LOG_RETENTION = float(
+        os.getenv("NOTIFICATION_LOG_RETENTION", 7 * 24 * 3600)
+    )
+    # Size in bytes the notification log is kept under
+    NOTIFICATION_LOG_RETENTION_BYTES = int(
+        os.getenv("NOTIFICATION_LOG_RETENTION_BYTES", 1024 * 1024 * 1024)
+    )
+    # Run as one of several replicas sharing the WebSocket clients
+    CLUSTER_ENABLED = os.getenv("CLUSTER_ENABLED", "false").lower() == "true"
+    # Id of this replica, used in its delivery subject
+    REPLICA_ID = os.getenv("REPLICA_ID", socket.gethostname()).replace(".", "-")
+    # Queue group the replicas consume the marketplace events in
+    CLUSTER_QUEUE_GROUP = os.getenv("CLUSTER_QUEUE_GROUP", "notification-service")
+    # Subject the replicas advertise the subscriptions of their clients on
+    PRESENCE_SUBJECT = os.getenv("PRESENCE_SUBJECT", "notifications.presence")
+    # Prefix of the subjects events are delivered to the replicas on
+    DELIVERY_SUBJECT_PREFIX = os.getenv(
+        "DELIVERY_SUBJECT_PREFIX", "notifications.deliver"
+    )
+    # Seconds between two presence advertisements of a replica
+    PRESENCE_INTERVAL = float(os.getenv("PRESENCE_INTERVAL", 5))
+    # Seconds the subscriptions of disconnected clients stay advertised
+    PRESENCE_LINGER = float(os.getenv("PRESENCE_LINGER", 300))
+    # Size in bytes a presence message is kept under, below the NATS max_payload
+    PRESENCE_MAX_BYTES = int(os.getenv("PRESENCE_MAX_BYTES", 512 * 1024))
@@ -0,0 +1,183 @@
+"""
+Client Connections Module
+
+This module gives every WebSocket client of the notification service its own
+bounded outbound queue, drained by a writer task per client. Delivering a
+notification only enqueues it, so a slow client no longer delays the other clients
+or the NATS message callback.
+
+When the queue of a client is full, the slow-consumer policy decides what happens:
+- `drop_oldest`: the oldest queued notification is dropped to make room.
+- `disconnect`: the client is disconnected.
+
+A client can be held while its backlog is replayed: its notifications are then
+kept without applying the policy, and sent after the backlog once the writer
+starts.
+
+Notifications are kept as `<seq> [<subject>] <message>`. Only the clients asking
+for sequence numbers receive them with the `<seq> ` prefix, the others receive
+`[<subject>] <message>` as before.
+
+Classes:
+    SlowConsumerPolicy: What to do when the queue of a client is full.
+    ClientConnection: A WebSocket client with its own outbound queue and writer task.
+"""
+
+import asyncio
+from collections import deque
+from enum import Enum
+
+from loguru import logger
+
+# WebSocket close code sent to clients disconnected for being too slow
+POLICY_VIOLATION = 1008
+
+
+class SlowConsumerPolicy(str, Enum):
+    """
+    What to do when the queue of a client is full.
+    """
+
+    DROP_OLDEST = "drop_oldest"
+    DISCONNECT = "disconnect"
+
+
+class ClientConnection:
+    """
+    A WebSocket client with its own bounded outbound queue and writer task.
+
+    Attributes:
+        websocket (WebSocket): The WebSocket connection of the client.
+        queue (asyncio.Queue): The notifications waiting to be sent.
+        policy (SlowConsumerPolicy): What to do when the queue is full.
+        dropped (int): The number of notifications dropped for this client.
+        closed (bool): Whether the client stopped receiving notifications.
+        held (deque): The notifications kept while the client is held, None when
+            it is not.
+        sequenced (bool): Whether the client receives the sequence numbers.
+    """
+
+    def __init__(
+        self, websocket, max_queue_size=100, policy="drop_oldest", sequenced=False
+    ):
+        self.websocket = websocket
+        self.sequenced = sequenced
+        self.queue = asyncio.Queue(maxsize=max_queue_size)
+        self.policy = SlowConsumerPolicy(policy)
+        self.dropped = 0
+        self.closed = False
+        self.held = None
+        self.writer = None
+
+    def hold(self):
+        """
+        Keep the notifications of the client, without applying the slow-consumer
+        policy, until the writer task starts.
+        """
+        self.held = deque()
+
+    def start(self, backlog=()):
+        """
+        Start the writer task sending the backlog first, then the notifications
+        kept while the client was held, then the queued notifications.
+
+        Args:
+            backlog (Iterable[str]): The notifications the client missed.
+        """
+        pending = [*backlog, *(self.held or ())]
+        self.held = None
+        self.writer = asyncio.create_task(self._write(pending))
+
+    def enqueue(self, notification):
+        """
+        Queue a notification for the client without waiting.
+
+        Args:
+            notification (str): The notification to send.
+
+        Returns:
+            bool: False if the client is closed, or was disconnected because its
+            queue was full.
+        """
+        if self.closed:
+            return False
+        if self.held is not None:
+            self.held.append(notification)
+            return True
+        if self.queue.full():
+            if self.policy == SlowConsumerPolicy.DISCONNECT:
+                logger.warning(
+                    f"Disconnecting slow WebSocket client {self.websocket.client}"
+                )
+                self.close()
+                return False
+            self.queue.get_nowait()
+            self.queue.task_done()
+            self.dropped += 1
+        self.queue.put_nowait(notification)
+        return True
+
+    async def _write(self, pending):
+        for notification in pending:
+            if not await self._send(notification):
+                return
+        while True:
+            notification = await self.queue.get()
+            try:
+                if not await self._send(notification):
+                    return
+            finally:
+                self.queue.task_done()
+
+    def wire_text(self, notification):
+        """
+        Return a kept notification as it is sent to the client.
+
+        Args:
+            notification (str): The notification, prefixed by its sequence number.
+
+        Returns:
+            str: The notification, without the sequence number unless the client
+            asked for it.
+        """
+        if self.sequenced:
+            return notification
+        return notification.partition(" ")[2]
+
+    async def _send(self, notification):
+        try:
+            await self.websocket.send_text(self.wire_text(notification))
+        except Exception as e:
+            logger.error(f"Failed to send notification to client: {e}")
+            self.closed = True
+            return False
+        return True
+
+    def close(self):
+        """
+        Stop sending notifications and close the WebSocket connection.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        if self.writer is not None:
+            self.writer.cancel()
+        asyncio.create_task(self._close_websocket())
+
+    async def _close_websocket(self):
+        try:
+            await self.websocket.close(code=POLICY_VIOLATION)
+        except Exception as e:
+            logger.debug(f"Failed to close WebSocket connection: {e}")
+
+    async def stop(self):
+        """
+        Stop the writer task, dropping the notifications still queued.
+        """
+        self.closed = True
+        if self.writer is not None:
+            self.writer.cancel()
+            try:
+                await self.writer
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,157 @@
+"""
+Notification History Module
+
+This module keeps the recent notifications so WebSocket clients can catch up on
+what they missed while disconnected. Every notification gets a sequence number and
+is stored in a bounded buffer per topic (its subject) and per entity it names (such
+as a user or product). Buffers are capped by count and by age, and only the most
+recently used buffers are kept, so memory stays bounded however long clients are
+away.
+
+A client reconnecting with the last sequence number it received gets the newer
+notifications of its own subscriptions only, oldest first. When the history no
+longer holds everything after that number, the notification log on disk has to be
+replayed instead (see `notification_log`).
+
+Classes:
+    StoredNotification: A notification kept in the history.
+    NotificationHistory: Bounded buffers of the recent notifications.
+"""
+
+import time
+from collections import OrderedDict, deque, namedtuple
+
+from subscriptions import WILDCARDS, subject_matches
+
+StoredNotification = namedtuple(
+    "StoredNotification", ["seq", "timestamp", "subject", "text"]
+)
+
+
+class NotificationHistory:
+    """
+    Bounded buffers of the recent notifications, per topic and per entity.
+
+    Attributes:
+        max_size (int): The number of notifications kept per buffer.
+        max_age (float): The number of seconds notifications are kept.
+        max_buffers (int): The number of buffers kept; the least recently used
+            buffers are evicted first.
+        buffers (OrderedDict): The buffers by ("subject", subject) or ("id", entity id).
+        last_seq (int): The sequence number of the last notification.
+        evicted_seq (int): The highest sequence number dropped from any buffer.
+    """
+
+    def __init__(self, max_size=1000, max_age=3600, max_buffers=10000):
+        self.max_size = max_size
+        self.max_age = max_age
+        self.max_buffers = max_buffers
+        self.buffers = OrderedDict()
+        self.last_seq = 0
+        self.evicted_seq = 0
+
+    def start_after(self, seq):
+        """
+        Continue the sequence numbers after those of a previous run.
+
+        Args:
+            seq (int): The last sequence number handed out before.
+        """
+        self.last_seq = max(self.last_seq, seq)
+        self.evicted_seq = max(self.evicted_seq, seq)
+
+    def covers(self, since):
+        """
+        Check whether the history holds every notification after a sequence number.
+
+        Args:
+            since (int): The sequence number of the last notification a client
+                received.
+
+        Returns:
+            bool: False if some newer notification was evicted.
+        """
+        return since >= self.evicted_seq
+
+    def next_seq(self):
+        """
+        Take the sequence number of a new notification.
+
+        Returns:
+            int: The sequence number.
+        """
+        self.last_seq += 1
+        return self.last_seq
+
+    def append(self, seq, subject, text, entity_ids=()):
+        """
+        Store a notification under its topic and the entities it names.
+
+        Args:
+            seq (int): The sequence number of the notification.
+            subject (str): The subject of the notification.
+            text (str): The notification as sent to clients.
+            entity_ids (Iterable[str]): The ids of the entities named by the event.
+        """
+        notification = StoredNotification(seq, time.monotonic(), subject, text)
+        keys = [("subject", subject)]
+        keys.extend(("id", entity_id) for entity_id in entity_ids)
+        for key in keys:
+            buffer = self.buffers.get(key)
+            if buffer is None:
+                buffer = self.buffers[key] = deque(maxlen=self.max_size)
+            else:
+                self.buffers.move_to_end(key)
+                if len(buffer) == buffer.maxlen:
+                    self.evicted_seq = max(self.evicted_seq, buffer[0].seq)
+            buffer.append(notification)
+        while len(self.buffers) > self.max_buffers:
+            _, buffer = self.buffers.popitem(last=False)
+            self.evicted_seq = max(self.evicted_seq, buffer[-1].seq)
+
+    def _recent(self, key, since, cutoff):
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            return
+        # Drop the notifications that aged out
+        while buffer and buffer[0].timestamp < cutoff:
+            self.evicted_seq = max(self.evicted_seq, buffer.popleft().seq)
+        for notification in reversed(buffer):
+            if notification.seq <= since:
+                break
+            yield notification
+
+    def replay(self, since, subscriptions=()):
+        """
+        Find the notifications a client missed since a sequence number. Call
+        `covers` afterwards to know whether some were evicted already.
+
+        Args:
+            since (int): The sequence number of the last notification the client
+                received. Numbers ahead of the history, such as those handed out
+                before a restart, replay everything kept.
+            subscriptions (Iterable[tuple[str, str | None]]): The (subject, entity
+                id) subscriptions of the client; all topics if empty.
+
+        Returns:
+            list[str]: The missed notifications, oldest first.
+        """
+        if since > self.last_seq:
+            since = 0
+        cutoff = time.monotonic() - self.max_age
+        subscriptions = list(subscriptions) or [(">", None)]
+        topics = [key for key in self.buffers if key[0] == "subject"]
+
+        missed = {}
+        for subject, entity_id in subscriptions:
+            if entity_id is not None:
+                keys = [("id", entity_id)]
+            elif any(token in WILDCARDS for token in subject.split(".")):
+                keys = [key for key in topics if subject_matches(subject, key[1])]
+            else:
+                keys = [("subject", subject)]
+            for key in keys:
+                for notification in self._recent(key, since, cutoff):
+                    if subject_matches(subject, notification.subject):
+                        missed[notification.seq] = notification.text
+        return [missed[seq] for seq in sorted(missed)]
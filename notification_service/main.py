@@ -8,14 +8,29 @@ handles different notification types such as email and in-app.
 The service includes:
 - Connection management with NATS.
 - Subscription to predefined NATS subjects.
-- Sending notifications to connected WebSocket clients.
-- Storing missed notifications for offline clients.
+- Sending notifications to connected WebSocket clients through a bounded queue per
+  client, so a slow client never delays the others (see `connections`).
+- Routing notifications only to the clients subscribed to their subject or entity
+  (see `subscriptions`).
+- Keeping the recent notifications per topic and entity, numbered by sequence, so
+  clients reconnecting with `?since=<seq>` catch up on their own backlog (see
+  `history`), and in an append-only log on disk that survives restarts and covers
+  longer outages (see `notification_log`).
+- Optionally running as one of several replicas, routing every event only to the
+  replicas holding interested clients (see `cluster`).
 
 Classes:
     NotificationService: Handles NATS integration and notification delivery.
 
 Routes:
-    - `/ws`: WebSocket endpoint for real-time notifications.
+    - `/ws`: WebSocket endpoint for real-time notifications. Notifications are sent
+      as `[<subject>] <message>`. Optional query parameters:
+      `seq=1` prefixes every notification with its sequence number, as
+      `<seq> [<subject>] <message>`, or `<replica id>:<seq> [<subject>] <message>`
+      in cluster mode,
+      `since=<seq>` replays the notifications after that sequence number,
+      `subject=<subject>` and `id=<entity id>` (both repeatable) subscribe the
+      client from the start.
     - `/`: Root endpoint for the API.
 
 Events:
@@ -24,17 +39,102 @@ Events:
 """
 
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import FastAPI, WebSocket
 from nats.aio.client import Client as NATS
 from loguru import logger
 import uvicorn
+from cluster import ClusterRouter, parse_cursor
 from config import Config
+from connections import ClientConnection
+from history import NotificationHistory
+from notification_log import NotificationLog
+from subscriptions import (
+    SubscriptionIndex,
+    entity_ids,
+    parse_subscription,
+    subscribed,
+)
 
 NOTIFICATION_TYPES = ["email", "in_app"]
 
 app = FastAPI()
 connected_clients = []
-missed_notifications = []
+subscriptions = SubscriptionIndex()
+notification_history = NotificationHistory(
+    Config.HISTORY_SIZE, Config.HISTORY_MAX_AGE, Config.HISTORY_MAX_BUFFERS
+)
+notification_log = NotificationLog(
+    Config.NOTIFICATION_LOG_DIR,
+    Config.NOTIFICATION_LOG_SEGMENT_BYTES,
+    Config.NOTIFICATION_LOG_RETENTION,
+    Config.NOTIFICATION_LOG_RETENTION_BYTES,
+)
+# Sequence numbers are per replica, so in cluster mode they are qualified by the
+# replica id to let a replica recognize the cursors handed out by another one
+CURSOR_PREFIX = f"{Config.REPLICA_ID}:" if Config.CLUSTER_ENABLED else ""
+
+# Runs every notification log operation off the event loop, one at a time and in
+# order, so a replay always sees the notifications appended before it
+log_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="notification-log")
+
+
+def register_client(client):
+    """
+    Add a client to the connected clients, receiving every notification until it
+    subscribes.
+
+    Args:
+        client (ClientConnection): The connected client.
+    """
+    connected_clients.append(client)
+    subscriptions.add(client)
+    interests_changed()
+
+
+def unregister_client(client):
+    """
+    Remove a client and its subscriptions.
+
+    Args:
+        client (ClientConnection): The disconnected client.
+    """
+    if client in connected_clients:
+        connected_clients.remove(client)
+    if notification_service.router is not None:
+        notification_service.router.client_left(
+            client in subscriptions.unfiltered,
+            subscriptions.client_subscriptions.get(client, ()),
+        )
+    subscriptions.remove(client)
+
+
+def run_on_log(function, *args):
+    """
+    Run a notification log operation on the log executor.
+
+    Args:
+        function (Callable): The operation, such as `notification_log.append`.
+        *args: The arguments of the operation.
+
+    Returns:
+        asyncio.Future: Resolves with the result of the operation.
+    """
+    return asyncio.wrap_future(log_executor.submit(function, *args))
+
+
+def _log_append_failure(future):
+    error = future.exception()
+    if error is not None:
+        logger.error(f"Failed to write notification to the log: {error}")
+
+
+def interests_changed():
+    """
+    Let the other replicas know the subscriptions of the local clients changed.
+    """
+    if notification_service.router is not None:
+        notification_service.router.interests_changed()
 
 
 class NotificationService:
@@ -47,6 +147,7 @@ class NotificationService:
         notification_type (str): Type of notifications supported (e.g., email, in-app).
         lock (asyncio.Lock): Ensures thread-safe operations.
         connected (bool): Tracks whether the service is connected to the NATS server.
+        router (ClusterRouter): Routes events between the replicas in cluster mode.
     """
 
     def __init__(self):
@@ -55,6 +156,7 @@ class NotificationService:
         self.notification_type = Config.NOTIFICATION_TYPE
         self.lock = asyncio.Lock()
         self.connected = False
+        self.router = None
 
     async def connect_to_nats(self):
         """
@@ -85,6 +187,10 @@ class NotificationService:
         """
         Subscribe to a NATS subject and handle incoming messages.
 
+        In cluster mode the replicas subscribe in a queue group, and the replica
+        receiving an in-app notification routes it to the replicas holding
+        interested clients.
+
         Args:
             subject (str): The subject to subscribe to.
         """
@@ -93,17 +199,25 @@ class NotificationService:
             subject = msg.subject
             data = msg.data.decode()
             logger.info(f"Received a message on '{subject}': {data}")
-            await self.send_notification(subject, data)
+            if self.router is not None and self.notification_type == "in_app":
+                await self.router.route(subject, data)
+            else:
+                await self.send_notification(subject, data)
 
         async with self.lock:
             logger.debug(f"Subscribing to NATS subject: {subject}")
-            await self.nc.subscribe(subject, cb=message_handler)
+            if self.router is not None:
+                await self.nc.subscribe(
+                    subject, queue=Config.CLUSTER_QUEUE_GROUP, cb=message_handler
+                )
+            else:
+                await self.nc.subscribe(subject, cb=message_handler)
         logger.info(f"Subscribed to NATS subject: {subject}")
 
     async def send_notification(self, subject, message):
         """
-        Send notifications to connected WebSocket clients or store them as missed
-        notifications.
+        Send notifications to the WebSocket clients interested in them, and keep them
+        in the history for the clients reconnecting later.
 
         Args:
             subject (str): The subject of the notification.
@@ -120,19 +234,25 @@ class NotificationService:
 
         notification = f"[{subject}] {message}"
         if self.notification_type == "in_app":
+            seq = notification_history.next_seq()
+            notification = f"{CURSOR_PREFIX}{seq} {notification}"
             logger.info(f"In-app Notification: {notification}")
-            if not connected_clients:
-                missed_notifications.append(notification)
-            else:
-                disconnected_clients = []
-                for client in connected_clients:
-                    try:
-                        await client.send_text(notification)
-                    except Exception as e:
-                        logger.error(f"Failed to send notification to client: {e}")
-                        disconnected_clients.append(client)
-                for client in disconnected_clients:
-                    connected_clients.remove(client)
+            ids = entity_ids(message)
+            notification_history.append(seq, subject, notification, ids)
+            if notification_log.opened:
+                # Written by the log executor, the event loop does not wait for it
+                log_executor.submit(
+                    notification_log.append, seq, subject, notification, ids
+                ).add_done_callback(_log_append_failure)
+
+            # Only queue the notification; every client has its own writer task
+            disconnected_clients = [
+                client
+                for client in subscriptions.match(subject, ids)
+                if not client.enqueue(notification)
+            ]
+            for client in disconnected_clients:
+                unregister_client(client)
         elif self.notification_type == "email":
             logger.info(f"Email Notification: {notification}")
 
@@ -142,22 +262,42 @@ class NotificationService:
         """
         async with self.lock:
             if self.connected:
+                if self.router is not None:
+                    await self.router.stop()
+                    self.router = None
                 await self.nc.close()
                 self.connected = False
                 logger.info("Disconnected from NATS server.")
 
     async def run(self):
         """
-        Connect to NATS and subscribe to predefined subjects.
+        Connect to NATS and subscribe to predefined subjects, joining the other
+        replicas first in cluster mode.
         """
         await self.connect_to_nats()
+        if Config.CLUSTER_ENABLED and self.router is None:
+            self.router = ClusterRouter(
+                self.nc,
+                self,
+                subscriptions,
+                Config.REPLICA_ID,
+                Config.PRESENCE_SUBJECT,
+                Config.DELIVERY_SUBJECT_PREFIX,
+                Config.PRESENCE_INTERVAL,
+                Config.PRESENCE_LINGER,
+                Config.PRESENCE_MAX_BYTES,
+            )
+            await self.router.start()
         subjects = [
             "user.created",
             "user.deleted",
             "product.created",
+            "product.created.batch",
             "product.deleted",
             "review.created",
+            "review.created.batch",
             "transaction.created",
+            "transaction.created.batch",
         ]
         logger.debug("Starting to subscribe to subjects")
         await asyncio.gather(
@@ -173,9 +313,20 @@ async def startup_event():
     """
     Event triggered on application startup.
 
-    Connects to the NATS server and starts the notification service.
-    Logs any errors encountered during initialization.
+    Opens the notification log, connects to the NATS server and starts the
+    notification service. Logs any errors encountered during initialization; the
+    service runs with the in-memory history only if the log cannot be opened.
     """
+    if Config.NOTIFICATION_LOG_DIR:
+        try:
+            await run_on_log(notification_log.open)
+            notification_history.start_after(notification_log.last_seq)
+        except Exception as e:
+            notification_log.close()
+            logger.error(
+                "Failed to open the notification log, keeping the in-memory "
+                f"history only: {e}"
+            )
     try:
         logger.debug("Starting startup event and connecting to NATS")
         await notification_service.connect_to_nats()
@@ -190,15 +341,38 @@ async def shutdown_event():
     """
     Event triggered on application shutdown.
 
-    Closes the connection to the NATS server.
+    Closes the connection to the NATS server and the notification log.
     Logs any errors encountered during shutdown.
     """
     try:
         await notification_service.close_connection()
+        await run_on_log(notification_log.close)
     except Exception as e:
         logger.error(f"Error during shutdown: {e}")
 
 
+async def replay_from_log(client, since, until, client_subscriptions):
+    """
+    Send a client the notifications of its subscriptions kept in the notification
+    log, reading the log in batches on the log executor.
+
+    Args:
+        client (ClientConnection): The client to send the notifications to.
+        since (int): The sequence number to replay after.
+        until (int): The last sequence number to replay.
+        client_subscriptions (list): The (subject, entity id) subscriptions of the
+            client.
+    """
+    while True:
+        records = await run_on_log(notification_log.replay, since, until)
+        if not records:
+            return
+        for record in records:
+            if subscribed(client_subscriptions, record.subject, record.ids):
+                await client.websocket.send_text(client.wire_text(record.text))
+        since = records[-1].seq
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """
@@ -207,29 +381,79 @@ async def websocket_endpoint(websocket: WebSocket):
     Args:
         websocket (WebSocket): The WebSocket connection object.
 
-    Stores missed notifications if there are no connected clients or delivers them
-    to the connected client when a connection opens.
+    A client connecting with `?seq=1` receives the sequence number of every
+    notification. Reconnecting with `?since=<seq>`, it first receives the
+    notifications of its subscriptions it missed, from the notification log if the
+    in-memory history no longer holds all of them. Notifications are sent by a
+    writer task draining the bounded queue of the client. The client may send
+    subscription requests to only receive some subjects or entities.
     """
     await websocket.accept()
-    connected_clients.append(websocket)
-
-    if missed_notifications:
-        for notification in missed_notifications:
-            try:
-                await websocket.send_text(notification)
-            except Exception as e:
-                logger.error(f"Failed to send missed notification: {e}")
-        missed_notifications.clear()
+    params = websocket.query_params
+    client = ClientConnection(
+        websocket,
+        Config.CLIENT_QUEUE_SIZE,
+        Config.SLOW_CONSUMER_POLICY,
+        sequenced=params.get("seq", "").lower() in ("1", "true"),
+    )
+    # Live notifications are held while the backlog is replayed, and only sent
+    # after it, without being dropped or disconnecting the client
+    client.hold()
+    register_client(client)
+    subjects = params.getlist("subject") or [">"]
+    for entity_id in params.getlist("id") or ([None] if "subject" in params else []):
+        for subject in subjects:
+            subscriptions.subscribe(client, subject, entity_id)
+
+    # The backlog is taken before any new notification can be held, so the client
+    # receives every notification exactly once and in order
+    try:
+        replica_id, since = (
+            parse_cursor(params["since"]) if "since" in params else (None, None)
+        )
+    except ValueError:
+        logger.warning(f"Ignoring invalid since from {websocket.client}")
+        replica_id, since = None, None
+    backlog = []
+    client_subscriptions = list(subscriptions.client_subscriptions.get(client, ()))
+    until = notification_history.last_seq
+    if replica_id is not None and f"{replica_id}:" != CURSOR_PREFIX:
+        # The sequence numbers of another replica mean nothing here: replay what
+        # this replica still keeps in memory, as after a restart
+        logger.warning(
+            f"Resetting the cursor of replica {replica_id} from {websocket.client}"
+        )
+        backlog = notification_history.replay(0, client_subscriptions)
+    elif since is not None:
+        backlog = notification_history.replay(since, client_subscriptions)
+        if notification_log.opened and not notification_history.covers(since):
+            backlog = None
 
     try:
         logger.info(f"WebSocket connection opened from {websocket.client}")
+        if backlog is None:
+            await replay_from_log(client, since, until, client_subscriptions)
+            backlog = []
+        client.start(backlog)
         while True:
-            await websocket.receive_text()
+            text = await websocket.receive_text()
+            try:
+                action, subject, entity_id = parse_subscription(text)
+            except ValueError as e:
+                logger.warning(f"Ignoring message from {websocket.client}: {e}")
+                continue
+            if action == "subscribe":
+                subscriptions.subscribe(client, subject, entity_id)
+            else:
+                subscriptions.unsubscribe(client, subject, entity_id)
+            interests_changed()
+            logger.debug(f"{websocket.client} {action}d {subject} for {entity_id}")
     except Exception as e:
         logger.error(f"Error: {e}")
     finally:
         logger.info(f"WebSocket connection closed from {websocket.client}")
-        connected_clients.remove(websocket)
+        unregister_client(client)
+        await client.stop()
 
 
 @app.get("/", tags=["Root"])
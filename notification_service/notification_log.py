@@ -0,0 +1,269 @@
+"""
+Notification Log Module
+
+This module keeps every in-app notification in an append-only log on local disk, so
+notifications survive restarts of the service and clients can catch up after being
+offline for longer than the in-memory history covers.
+
+The log is a directory of segments. Each segment is a pair of files named after the
+sequence number of its first notification:
+- `<base seq>.log`: the records, each a header (payload length, sequence number and
+  timestamp) followed by a JSON payload with the subject, entity ids and text.
+- `<base seq>.index`: the offset index, one (sequence number, position) entry per
+  record, used to find where replaying has to start.
+
+New notifications are appended to the last segment, and a new segment is started
+once it grows past the segment size. Replaying memory-maps the index and the
+segments instead of reading them into memory. Whole segments are deleted once all
+their notifications are older than the retention time, or while the log is larger
+than the retention size.
+
+Classes:
+    LogRecord: A notification read back from the log.
+    NotificationLog: Append-only segmented log of the notifications.
+"""
+
+import bisect
+import json
+import mmap
+import os
+import struct
+import time
+from collections import namedtuple
+
+from loguru import logger
+
+RECORD_HEADER = struct.Struct("<IQd")
+INDEX_ENTRY = struct.Struct("<QQ")
+
+LogRecord = namedtuple("LogRecord", ["seq", "timestamp", "subject", "ids", "text"])
+
+
+class NotificationLog:
+    """
+    Append-only segmented log of the notifications, with an offset index.
+
+    Attributes:
+        directory (str): The directory holding the segments.
+        segment_bytes (int): The size after which a new segment is started.
+        retention_seconds (float): The age after which notifications are deleted.
+        retention_bytes (int): The size the log is kept under.
+        segments (list[int]): The base sequence numbers of the segments, oldest first.
+        last_seq (int): The sequence number of the last notification, 0 if none.
+    """
+
+    def __init__(
+        self,
+        directory,
+        segment_bytes=64 * 1024 * 1024,
+        retention_seconds=7 * 24 * 3600,
+        retention_bytes=1024 * 1024 * 1024,
+    ):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.retention_seconds = retention_seconds
+        self.retention_bytes = retention_bytes
+        self.segments = []
+        self.last_seq = 0
+        self.log_file = None
+        self.index_file = None
+
+    @property
+    def opened(self):
+        """
+        Whether the log is open for appending.
+        """
+        return self.log_file is not None
+
+    def _path(self, base_seq, extension):
+        return os.path.join(self.directory, f"{base_seq:020d}.{extension}")
+
+    def open(self):
+        """
+        Open the log, recovering the last segment if the service stopped while
+        appending to it.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self.segments = sorted(
+            int(name[: -len(".log")])
+            for name in os.listdir(self.directory)
+            if name.endswith(".log") and name[: -len(".log")].isdigit()
+        )
+        if self.segments:
+            self._recover(self.segments[-1])
+            self._open_segment(self.segments[-1])
+        self.enforce_retention()
+        logger.info(
+            f"Opened notification log in {self.directory} with {len(self.segments)} "
+            f"segments up to {self.last_seq}"
+        )
+
+    def _recover(self, base_seq):
+        # Rebuild the index of the last segment from its records, dropping a record
+        # that was not written completely
+        log_path = self._path(base_seq, "log")
+        entries = []
+        end = 0
+        with open(log_path, "rb") as log_file:
+            data = log_file.read()
+        while end + RECORD_HEADER.size <= len(data):
+            length, seq, _ = RECORD_HEADER.unpack_from(data, end)
+            if end + RECORD_HEADER.size + length > len(data):
+                break
+            entries.append(INDEX_ENTRY.pack(seq, end))
+            end += RECORD_HEADER.size + length
+            self.last_seq = seq
+        if end != len(data):
+            logger.warning(f"Truncating the incomplete record at the end of {log_path}")
+            os.truncate(log_path, end)
+        with open(self._path(base_seq, "index"), "wb") as index_file:
+            index_file.write(b"".join(entries))
+        if not entries:
+            self.last_seq = max(self.last_seq, base_seq - 1)
+
+    def _open_segment(self, base_seq):
+        self.close()
+        self.log_file = open(self._path(base_seq, "log"), "ab")
+        self.index_file = open(self._path(base_seq, "index"), "ab")
+
+    def append(self, seq, subject, text, ids=()):
+        """
+        Append a notification to the log.
+
+        Args:
+            seq (int): The sequence number of the notification; it must be greater
+                than the last one.
+            subject (str): The subject of the notification.
+            text (str): The notification as sent to clients.
+            ids (Iterable[str]): The ids of the entities named by the event.
+        """
+        if seq <= self.last_seq:
+            raise ValueError(f"Sequence number {seq} is not after {self.last_seq}")
+        if not self.segments or self.log_file.tell() >= self.segment_bytes:
+            self.segments.append(seq)
+            self._open_segment(seq)
+            self.enforce_retention()
+
+        payload = json.dumps(
+            {"subject": subject, "ids": sorted(ids), "text": text}
+        ).encode("utf-8")
+        position = self.log_file.tell()
+        self.log_file.write(RECORD_HEADER.pack(len(payload), seq, time.time()))
+        self.log_file.write(payload)
+        self.log_file.flush()
+        self.index_file.write(INDEX_ENTRY.pack(seq, position))
+        self.index_file.flush()
+        self.last_seq = seq
+
+    def _start_position(self, base_seq, since):
+        # Binary search the memory-mapped index for the first record after since
+        index_path = self._path(base_seq, "index")
+        size = os.path.getsize(index_path)
+        entries = size // INDEX_ENTRY.size
+        if not entries:
+            return None
+        with open(index_path, "rb") as index_file:
+            with mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ) as index:
+                low, high = 0, entries
+                while low < high:
+                    middle = (low + high) // 2
+                    seq, _ = INDEX_ENTRY.unpack_from(index, middle * INDEX_ENTRY.size)
+                    if seq <= since:
+                        low = middle + 1
+                    else:
+                        high = middle
+                if low == entries:
+                    return None
+                return INDEX_ENTRY.unpack_from(index, low * INDEX_ENTRY.size)[1]
+
+    def replay(self, since, until=None, limit=500):
+        """
+        Read the notifications after a sequence number.
+
+        Args:
+            since (int): The sequence number to read after.
+            until (int, optional): The last sequence number to read.
+            limit (int): The maximum number of notifications to read; call again
+                after the last one read to continue.
+
+        Returns:
+            list[LogRecord]: The notifications, oldest first.
+        """
+        until = self.last_seq if until is None else until
+        cutoff = time.time() - self.retention_seconds
+        records = []
+        first = max(bisect.bisect_right(self.segments, since) - 1, 0)
+        for base_seq in list(self.segments[first:]):
+            if base_seq > until or len(records) >= limit:
+                break
+            try:
+                position = self._start_position(base_seq, since)
+                if position is None:
+                    continue
+                with open(self._path(base_seq, "log"), "rb") as log_file:
+                    with mmap.mmap(
+                        log_file.fileno(), 0, access=mmap.ACCESS_READ
+                    ) as segment:
+                        while (
+                            position + RECORD_HEADER.size <= len(segment)
+                            and len(records) < limit
+                        ):
+                            length, seq, timestamp = RECORD_HEADER.unpack_from(
+                                segment, position
+                            )
+                            start = position + RECORD_HEADER.size
+                            position = start + length
+                            if position > len(segment) or seq > until:
+                                break
+                            if timestamp < cutoff:
+                                continue
+                            payload = json.loads(segment[start:position])
+                            records.append(
+                                LogRecord(
+                                    seq,
+                                    timestamp,
+                                    payload["subject"],
+                                    payload["ids"],
+                                    payload["text"],
+                                )
+                            )
+            except FileNotFoundError:
+                # The segment was deleted by retention while replaying
+                continue
+        return records
+
+    def enforce_retention(self):
+        """
+        Delete the oldest segments that are past the retention time or size. The
+        segment being appended to is always kept.
+        """
+        cutoff = time.time() - self.retention_seconds
+        sizes = {
+            base_seq: os.path.getsize(self._path(base_seq, "log"))
+            + os.path.getsize(self._path(base_seq, "index"))
+            for base_seq in self.segments
+            if os.path.exists(self._path(base_seq, "index"))
+        }
+        total = sum(sizes.values())
+        while len(self.segments) > 1:
+            base_seq = self.segments[0]
+            # The modification time of a segment is the time of its last record
+            expired = os.path.getmtime(self._path(base_seq, "log")) < cutoff
+            if not expired and total <= self.retention_bytes:
+                break
+            os.remove(self._path(base_seq, "log"))
+            if os.path.exists(self._path(base_seq, "index")):
+                os.remove(self._path(base_seq, "index"))
+            total -= sizes.get(base_seq, 0)
+            self.segments.pop(0)
+            logger.info(f"Deleted notification log segment {base_seq}")
+
+    def close(self):
+        """
+        Close the files of the segment being appended to.
+        """
+        for log_file in (self.log_file, self.index_file):
+            if log_file is not None:
+                log_file.close()
+        self.log_file = None
+        self.index_file = None
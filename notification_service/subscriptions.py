@@ -0,0 +1,231 @@
+"""
+Subscriptions Module
+
+This module routes notifications to the WebSocket clients interested in them.
+Clients subscribe over their socket to a subject, optionally for a single entity:
+
+    {"action": "subscribe", "subject": "review.created", "id": "<product id>"}
+    {"action": "unsubscribe", "subject": "review.created", "id": "<product id>"}
+
+Subjects may use the NATS wildcards `*` (one token) and `>` (the remaining tokens).
+Without an id the client receives every event on the subject. With an id it only
+receives the events naming that entity: any `*_id` field of the event object (or
+of the items of a batch event), or the id of the actor.
+
+Clients that never subscribed keep receiving every notification. A client that
+unsubscribed from everything receives nothing.
+
+Functions:
+    subject_matches: Check whether a subject matches a subscription pattern.
+    entity_ids: Collect the entity ids named by an event message.
+    parse_subscription: Parse a subscription request sent by a client.
+    subscribed: Check whether subscriptions cover an event.
+
+Classes:
+    SubscriptionIndex: Routing index of the subscriptions, by subject and entity id.
+"""
+
+import json
+from collections import defaultdict
+
+WILDCARDS = ("*", ">")
+
+
+def subject_matches(pattern, subject):
+    """
+    Check whether a subject matches a subscription pattern with NATS wildcards.
+
+    Args:
+        pattern (str): The subscribed subject, such as `review.*` or `product.>`.
+        subject (str): The subject of the event.
+
+    Returns:
+        bool: True if the subject matches the pattern.
+    """
+    pattern_tokens = pattern.split(".")
+    subject_tokens = subject.split(".")
+    for index, token in enumerate(pattern_tokens):
+        if token == ">":
+            return len(subject_tokens) > index
+        if index >= len(subject_tokens):
+            return False
+        if token != "*" and token != subject_tokens[index]:
+            return False
+    return len(pattern_tokens) == len(subject_tokens)
+
+
+def entity_ids(message):
+    """
+    Collect the entity ids named by an event message.
+
+    Args:
+        message (str): The event message, as published by the marketplace API.
+
+    Returns:
+        set[str]: The `*_id` fields of the event object or its items, and the id of
+        the actor. Empty if the message is not an event.
+    """
+    try:
+        event = json.loads(message)
+    except ValueError:
+        return set()
+    if not isinstance(event, dict):
+        return set()
+
+    ids = set()
+    actor = event.get("actor")
+    if isinstance(actor, dict) and actor.get("actor_id"):
+        ids.add(str(actor["actor_id"]))
+    event_object = event.get("object")
+    if isinstance(event_object, dict):
+        items = event_object.get("items", [event_object])
+        for item in items if isinstance(items, list) else []:
+            if isinstance(item, dict):
+                ids.update(
+                    str(value)
+                    for key, value in item.items()
+                    if key.endswith("_id") and value
+                )
+    return ids
+
+
+def parse_subscription(text):
+    """
+    Parse a subscription request sent by a client.
+
+    Args:
+        text (str): The text received on the WebSocket connection.
+
+    Returns:
+        tuple[str, str, str | None]: The action, subject and entity id.
+
+    Raises:
+        ValueError: If the text is not a valid subscription request.
+    """
+    try:
+        request = json.loads(text)
+        action = request["action"]
+        subject = request["subject"]
+        entity_id = request.get("id")
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise ValueError(f"Invalid subscription request: {text}")
+    if action not in ("subscribe", "unsubscribe"):
+        raise ValueError(f"Unsupported subscription action: {action}")
+    if not isinstance(subject, str) or not subject or ".." in subject:
+        raise ValueError(f"Invalid subscription subject: {subject}")
+    return action, subject, None if entity_id is None else str(entity_id)
+
+
+def subscribed(subscriptions, subject, ids):
+    """
+    Check whether subscriptions cover an event.
+
+    Args:
+        subscriptions (Iterable[tuple[str, str | None]]): The (subject, entity id)
+            subscriptions of a client; everything if empty.
+        subject (str): The subject of the event.
+        ids (Iterable[str]): The entity ids named by the event.
+
+    Returns:
+        bool: True if the client is interested in the event.
+    """
+    subscriptions = list(subscriptions)
+    if not subscriptions:
+        return True
+    ids = set(ids)
+    return any(
+        subject_matches(pattern, subject) and (entity_id is None or entity_id in ids)
+        for pattern, entity_id in subscriptions
+    )
+
+
+class SubscriptionIndex:
+    """
+    Routing index of the subscriptions, by subject and entity id.
+
+    Subscriptions to plain subjects are looked up directly by (subject, entity id),
+    so routing an event only touches the clients interested in it. Wildcard
+    patterns are matched against the subject once per pattern.
+
+    Attributes:
+        unfiltered (set): The clients that never subscribed, receiving everything.
+        subjects (dict): The clients by plain subject and entity id.
+        patterns (dict): The clients by wildcard pattern and entity id.
+        client_subscriptions (dict): The (subject, entity id) pairs of every client.
+    """
+
+    def __init__(self):
+        self.unfiltered = set()
+        self.subjects = defaultdict(set)
+        self.patterns = defaultdict(lambda: defaultdict(set))
+        self.client_subscriptions = defaultdict(set)
+
+    def add(self, client):
+        """
+        Register a connected client, receiving every notification until it
+        subscribes.
+        """
+        self.unfiltered.add(client)
+
+    def subscribe(self, client, subject, entity_id=None):
+        """
+        Subscribe a client to a subject, optionally for a single entity.
+        """
+        self.unfiltered.discard(client)
+        self.client_subscriptions[client].add((subject, entity_id))
+        if any(token in WILDCARDS for token in subject.split(".")):
+            self.patterns[subject][entity_id].add(client)
+        else:
+            self.subjects[(subject, entity_id)].add(client)
+
+    def unsubscribe(self, client, subject, entity_id=None):
+        """
+        Unsubscribe a client from a subject it subscribed to.
+        """
+        self.unfiltered.discard(client)
+        self.client_subscriptions[client].discard((subject, entity_id))
+        if subject in self.patterns:
+            clients = self.patterns[subject].get(entity_id)
+            if clients is not None:
+                clients.discard(client)
+                if not clients:
+                    del self.patterns[subject][entity_id]
+                if not self.patterns[subject]:
+                    del self.patterns[subject]
+        else:
+            clients = self.subjects.get((subject, entity_id))
+            if clients is not None:
+                clients.discard(client)
+                if not clients:
+                    del self.subjects[(subject, entity_id)]
+
+    def remove(self, client):
+        """
+        Remove a disconnected client and all its subscriptions.
+        """
+        for subject, entity_id in list(self.client_subscriptions.get(client, ())):
+            self.unsubscribe(client, subject, entity_id)
+        self.unfiltered.discard(client)
+        self.client_subscriptions.pop(client, None)
+
+    def match(self, subject, ids=()):
+        """
+        Find the clients interested in an event.
+
+        Args:
+            subject (str): The subject of the event.
+            ids (Iterable[str]): The entity ids named by the event, as collected by
+                `entity_ids`.
+
+        Returns:
+            set: The clients to send the event to.
+        """
+        clients = set(self.unfiltered)
+        keys = [None, *ids]
+        for entity_id in keys:
+            clients.update(self.subjects.get((subject, entity_id), ()))
+        for pattern, subscribers in self.patterns.items():
+            if subject_matches(pattern, subject):
+                for entity_id in keys:
+                    clients.update(subscribers.get(entity_id, ()))
+        return clients
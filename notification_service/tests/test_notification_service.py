@@ -17,25 +17,72 @@ Tests:
     - `test_connect_to_nats_failure`: Ensures retry logic is executed
         on connection failure.
     - `test_subscribe_to_subject`: Tests subscribing to a NATS subject.
-    - `test_send_notification_in_app`: Validates in-app notifications are stored
-        when no clients are connected.
+    - `test_send_notification_in_app`: Validates in-app notifications are kept in
+        the history with a sequence number.
     - `test_send_notification_with_connected_clients`: Ensures notifications are sent
         to connected WebSocket clients.
+    - `test_slow_client_does_not_block_others`: Ensures a slow client does not delay
+        delivery to the other clients.
+    - `test_slow_consumer_drop_oldest`: Verifies the oldest queued notifications are
+        dropped when the queue of a client is full.
+    - `test_slow_consumer_disconnect`: Verifies a client whose queue is full is
+        disconnected.
+    - `test_held_client_receives_backlog_first`: Ensures notifications arriving
+        while a client is held are sent after its backlog, without applying the
+        slow-consumer policy.
+    - `test_subject_matches`: Validates matching subjects against NATS wildcards.
+    - `test_subscription_index_routes_by_subject_and_entity`: Ensures events are routed
+        only to the clients subscribed to their subject or entity.
+    - `test_websocket_subscription`: Tests subscribing over the WebSocket connection.
     - `test_send_notification_unsupported_type`: Confirms unsupported notification types
         are logged as errors.
     - `test_websocket_endpoint_connect_and_receive`: Tests WebSocket endpoint
         connectivity.
     - `test_startup_event`: Verifies behavior during application startup.
+    - `test_startup_event_without_notification_log`: Verifies the service starts
+        with the in-memory history only when the log cannot be opened.
     - `test_shutdown_event`: Verifies behavior during application shutdown.
-    - `test_websocket_missed_notifications`: Ensures missed notifications are sent
-      when a client connects.
+    - `test_notification_history_eviction`: Verifies the history is bounded by count,
+        age and number of buffers.
+    - `test_websocket_replay_since`: Ensures a client reconnecting with `since` only
+        receives its own missed notifications.
+    - `test_notification_log_segments_and_recovery`: Verifies the notification log
+        rolls segments, replays from an offset and recovers from a torn write.
+    - `test_notification_log_retention`: Verifies old segments are deleted by size.
+    - `test_websocket_replay_from_log`: Ensures notifications evicted from memory are
+        replayed from the notification log.
+    - `test_presence_routes_to_interested_replicas`: Verifies events are routed only
+        to the replicas holding interested clients.
+    - `test_cluster_router_delivery`: Tests advertising presence, routing events
+        to delivery subjects and delivering them to the local clients.
+    - `test_presence_split_in_parts`: Verifies large advertisements are split in
+        bounded messages and applied once complete.
+    - `test_websocket_replay_foreign_cursor`: Ensures a cursor of another replica
+        replays the in-memory history instead of a meaningless sequence range.
 """
 
+import asyncio
+import json
+import os
+import time
 from unittest.mock import AsyncMock, patch
 from loguru import logger
 import pytest
 from fastapi.testclient import TestClient
-from main import app, NotificationService, connected_clients, missed_notifications
+from connections import ClientConnection
+from main import (
+    app,
+    NotificationService,
+    connected_clients,
+    notification_history,
+    register_client,
+    subscriptions,
+    unregister_client,
+)
+from cluster import ClusterRouter, Presence, parse_cursor
+from history import NotificationHistory
+from notification_log import NotificationLog
+from subscriptions import SubscriptionIndex, entity_ids, subject_matches
 
 
 @pytest.fixture
@@ -114,13 +161,15 @@ async def test_send_notification_in_app(notification_service):
     """
     Test sending in-app notifications when no clients are connected.
 
-    Ensures notifications are stored in the `missed_notifications` list.
+    Ensures notifications are numbered and kept in the notification history.
     """
     notification_service.notification_type = "in_app"
     connected_clients.clear()
-    missed_notifications.clear()
     await notification_service.send_notification("test.subject", "Test Message")
-    assert missed_notifications == ["[test.subject] Test Message"]
+    seq = notification_history.last_seq
+    assert notification_history.replay(seq - 1) == [
+        f"{seq} [test.subject] Test Message"
+    ]
 
 
 @pytest.mark.asyncio
@@ -131,12 +180,187 @@ async def test_send_notification_with_connected_clients(notification_service):
     Verifies that the notification is sent to all connected clients.
     """
     notification_service.notification_type = "in_app"
-    mock_client = AsyncMock()
-    connected_clients.append(mock_client)
+    mock_websocket = AsyncMock()
+    mock_client = ClientConnection(mock_websocket)
+    mock_client.start()
+    register_client(mock_client)
     await notification_service.send_notification("test.subject", "Test Message")
+    await mock_client.queue.join()
 
-    mock_client.send_text.assert_called_once_with("[test.subject] Test Message")
+    mock_websocket.send_text.assert_called_once_with("[test.subject] Test Message")
     assert mock_client in connected_clients
+    unregister_client(mock_client)
+    await mock_client.stop()
+
+
+@pytest.mark.asyncio
+async def test_slow_client_does_not_block_others(notification_service):
+    """
+    Test that a slow client does not delay delivery to the other clients.
+
+    Verifies that sending only queues the notification, and the fast client receives
+    it while the slow client is still blocked.
+    """
+    notification_service.notification_type = "in_app"
+    blocked = asyncio.Event()
+    slow_websocket = AsyncMock()
+    slow_websocket.send_text.side_effect = lambda _: blocked.wait()
+    fast_websocket = AsyncMock()
+    clients = [ClientConnection(slow_websocket), ClientConnection(fast_websocket)]
+    for client in clients:
+        client.start()
+    for client in clients:
+        register_client(client)
+
+    await asyncio.wait_for(
+        notification_service.send_notification("test.subject", "Test Message"), 1
+    )
+    await asyncio.wait_for(clients[1].queue.join(), 1)
+    fast_websocket.send_text.assert_called_once_with("[test.subject] Test Message")
+    slow_websocket.send_text.assert_called_once()
+
+    blocked.set()
+    await asyncio.wait_for(clients[0].queue.join(), 1)
+    for client in clients:
+        unregister_client(client)
+        await client.stop()
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_drop_oldest(notification_service):
+    """
+    Test the drop_oldest slow-consumer policy.
+
+    Verifies that the oldest queued notifications make room for new ones and the
+    client stays connected.
+    """
+    notification_service.notification_type = "in_app"
+    client = ClientConnection(AsyncMock(), max_queue_size=2, policy="drop_oldest")
+    register_client(client)
+    for message in ["first", "second", "third"]:
+        await notification_service.send_notification("test.subject", message)
+
+    assert client in connected_clients
+    assert client.dropped == 1
+    seq = notification_history.last_seq
+    assert [client.queue.get_nowait() for _ in range(2)] == [
+        f"{seq - 1} [test.subject] second",
+        f"{seq} [test.subject] third",
+    ]
+    unregister_client(client)
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_disconnect(notification_service):
+    """
+    Test the disconnect slow-consumer policy.
+
+    Verifies that a client whose queue is full is removed and its WebSocket closed.
+    """
+    notification_service.notification_type = "in_app"
+    mock_websocket = AsyncMock()
+    client = ClientConnection(mock_websocket, max_queue_size=1, policy="disconnect")
+    register_client(client)
+    for message in ["first", "second"]:
+        await notification_service.send_notification("test.subject", message)
+    await asyncio.sleep(0)
+
+    assert client not in connected_clients
+    assert client.closed
+    mock_websocket.close.assert_called_once_with(code=1008)
+
+
+@pytest.mark.asyncio
+async def test_held_client_receives_backlog_first():
+    """
+    Test holding a client while its backlog is replayed.
+
+    Verifies that notifications queued while the client is held neither disconnect
+    it nor get dropped, and are sent after the backlog, in order.
+    """
+    mock_websocket = AsyncMock()
+    client = ClientConnection(
+        mock_websocket, max_queue_size=1, policy="disconnect", sequenced=True
+    )
+    client.hold()
+    assert all(client.enqueue(message) for message in ["live 1", "live 2", "live 3"])
+    assert not client.closed
+
+    client.start(["backlog 1", "backlog 2"])
+    client.enqueue("live 4")
+    await asyncio.sleep(0.01)
+
+    assert [call.args[0] for call in mock_websocket.send_text.call_args_list] == [
+        "backlog 1",
+        "backlog 2",
+        "live 1",
+        "live 2",
+        "live 3",
+        "live 4",
+    ]
+    await client.stop()
+
+
+def test_subject_matches():
+    """
+    Test matching subjects against subscription patterns with NATS wildcards.
+    """
+    assert subject_matches("review.created", "review.created")
+    assert subject_matches("review.*", "review.created")
+    assert subject_matches("product.>", "product.created.batch")
+    assert not subject_matches("review.*", "review.created.batch")
+    assert not subject_matches("product.>", "product")
+    assert not subject_matches("review.created", "review.deleted")
+
+
+def test_subscription_index_routes_by_subject_and_entity():
+    """
+    Test routing events through the subscription index.
+
+    Verifies that clients only receive the events of the subjects and entities they
+    subscribed to, and that clients that never subscribed receive everything.
+    """
+    index = SubscriptionIndex()
+    for client in ["all", "reviews", "product", "batch"]:
+        index.add(client)
+    index.subscribe("reviews", "review.*")
+    index.subscribe("product", "review.created", "p1")
+    index.subscribe("batch", "product.>", "p2")
+
+    review = '{"actor": {"actor_id": "u1"}, "object": {"product_id": "p1"}}'
+    assert index.match("review.created", entity_ids(review)) == {
+        "all",
+        "reviews",
+        "product",
+    }
+    batch = '{"object": {"count": 2, "items": [{"product_id": "p2"}, {}]}}'
+    assert index.match("product.created.batch", entity_ids(batch)) == {"all", "batch"}
+    assert index.match("user.created", entity_ids("not an event")) == {"all"}
+
+    index.unsubscribe("product", "review.created", "p1")
+    index.remove("reviews")
+    assert index.match("review.created", entity_ids(review)) == {"all"}
+    assert not index.subjects and list(index.patterns) == ["product.>"]
+
+
+def test_websocket_subscription(client):
+    """
+    Test subscribing over the WebSocket connection.
+
+    Verifies that a subscribed client only receives the notifications matching its
+    subscription.
+    """
+    service = NotificationService()
+    service.notification_type = "in_app"
+    with client.websocket_connect("/ws") as websocket:
+        websocket.send_text('{"action": "subscribe", "subject": "review.created"}')
+        deadline = time.monotonic() + 1
+        while ("review.created", None) not in subscriptions.subjects:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        websocket.portal.call(service.send_notification, "user.created", "{}")
+        websocket.portal.call(service.send_notification, "review.created", "{}")
+        assert websocket.receive_text() == "[review.created] {}"
 
 
 @pytest.mark.asyncio
@@ -174,6 +398,26 @@ async def test_startup_event():
     Verifies that the NATS connection and subscription process are initiated.
     """
     with (
+        patch("main.NotificationLog.open") as mock_open,
+        patch("main.NotificationService.connect_to_nats") as mock_connect,
+        patch("main.NotificationService.run") as mock_run,
+    ):
+        await app.router.startup()
+        mock_open.assert_called_once()
+        mock_connect.assert_called_once()
+        mock_run.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_startup_event_without_notification_log():
+    """
+    Test application startup when the notification log cannot be opened.
+
+    Verifies that the service still connects to NATS and runs, with the in-memory
+    history only.
+    """
+    with (
+        patch("main.NotificationLog.open", side_effect=OSError("read-only")),
         patch("main.NotificationService.connect_to_nats") as mock_connect,
         patch("main.NotificationService.run") as mock_run,
     ):
@@ -194,15 +438,247 @@ async def test_shutdown_event():
         mock_close.assert_called_once()
 
 
-def test_websocket_missed_notifications(client):
+def test_notification_history_eviction():
     """
-    Test sending missed notifications to a WebSocket client.
+    Test the bounds of the notification history.
 
-    Verifies that missed notifications are delivered when a client connects.
+    Verifies that buffers keep the newest notifications, that aged out notifications
+    are not replayed and that the least recently used buffers are evicted.
     """
-    missed_notifications.append("[test.subject] Test Message")
+    history = NotificationHistory(max_size=2, max_age=60, max_buffers=3)
+    for text in ["first", "second", "third"]:
+        history.append(history.next_seq(), "user.created", text, ["u1"])
+    assert history.replay(0) == ["second", "third"]
+    assert history.replay(2) == ["third"]
+    assert history.replay(0, [("review.*", "u1")]) == []
 
-    with client.websocket_connect("/ws") as websocket:
-        received_message = websocket.receive_text()
-        assert received_message == "[test.subject] Test Message"
-        assert not missed_notifications
+    history.append(history.next_seq(), "review.created", "review", ["p1"])
+    assert ("subject", "user.created") not in history.buffers
+    assert history.replay(3, [(">", "u1"), (">", "p1")]) == ["review"]
+
+    history.max_age = 0
+    assert history.replay(0) == []
+
+
+def test_websocket_replay_since(client):
+    """
+    Test replaying missed notifications to a reconnecting WebSocket client.
+
+    Verifies that a client connecting with `since` and an entity id only receives
+    the newer notifications naming that entity, before the live ones.
+    """
+    service = NotificationService()
+    service.notification_type = "in_app"
+    connected_clients.clear()
+    since = notification_history.last_seq
+    for user_id in ["u1", "u2", "u1"]:
+        event = '{"actor": {"actor_id": "%s"}, "object": {}}' % user_id
+        asyncio.run(service.send_notification("user.created", event))
+
+    with client.websocket_connect(f"/ws?seq=1&id=u1&since={since}") as websocket:
+        assert websocket.receive_text().startswith(f"{since + 1} [user.created]")
+        assert websocket.receive_text().startswith(f"{since + 3} [user.created]")
+        websocket.portal.call(
+            service.send_notification, "user.deleted", '{"object": {"user_id": "u1"}}'
+        )
+        assert websocket.receive_text().startswith(f"{since + 4} [user.deleted]")
+
+
+def test_notification_log_segments_and_recovery(tmp_path):
+    """
+    Test appending to and replaying from the notification log.
+
+    Verifies that segments roll over, that replay starts after the given sequence
+    number in any segment, and that reopening drops an incomplete last record.
+    """
+    log = NotificationLog(str(tmp_path), segment_bytes=200)
+    log.open()
+    for seq in range(1, 11):
+        log.append(seq, "user.created", f"{seq} [user.created] {{}}", [f"u{seq}"])
+    assert len(log.segments) > 2
+
+    records = log.replay(3, limit=4)
+    assert [record.seq for record in records] == [4, 5, 6, 7]
+    assert records[0].ids == ["u4"] and records[0].text == "4 [user.created] {}"
+    assert [record.seq for record in log.replay(7, until=9)] == [8, 9]
+    with pytest.raises(ValueError):
+        log.append(10, "user.created", "duplicate")
+
+    # Simulate a crash in the middle of writing a record
+    log.log_file.write(b"torn")
+    log.close()
+    reopened = NotificationLog(str(tmp_path), segment_bytes=200)
+    reopened.open()
+    assert reopened.last_seq == 10
+    reopened.append(11, "user.deleted", "11 [user.deleted] {}")
+    assert [record.seq for record in reopened.replay(9)] == [10, 11]
+    reopened.close()
+
+
+def test_notification_log_retention(tmp_path):
+    """
+    Test the size-based retention of the notification log.
+
+    Verifies that the oldest segments are deleted once the log grows past the
+    retention size, and that replay skips the deleted notifications.
+    """
+    log = NotificationLog(str(tmp_path), segment_bytes=100, retention_bytes=300)
+    log.open()
+    for seq in range(1, 21):
+        log.append(seq, "review.created", "x" * 50)
+    assert log.segments[0] > 1
+    assert len(os.listdir(tmp_path)) == 2 * len(log.segments)
+    assert log.replay(0)[0].seq == log.segments[0]
+    log.close()
+
+
+def test_websocket_replay_from_log(client, tmp_path):
+    """
+    Test replaying notifications from the notification log.
+
+    Verifies that a client reconnecting with a sequence number the in-memory history
+    no longer covers receives its notifications from the log.
+    """
+    service = NotificationService()
+    service.notification_type = "in_app"
+    connected_clients.clear()
+    log = NotificationLog(str(tmp_path))
+    log.open()
+    since = notification_history.last_seq
+    with patch("main.notification_log", log):
+        for user_id in ["u1", "u2", "u1"]:
+            event = '{"actor": {"actor_id": "%s"}, "object": {}}' % user_id
+            asyncio.run(service.send_notification("user.created", event))
+        notification_history.evicted_seq = notification_history.last_seq
+
+        with client.websocket_connect(f"/ws?seq=1&id=u1&since={since}") as websocket:
+            assert websocket.receive_text().startswith(f"{since + 1} [user.created]")
+            assert websocket.receive_text().startswith(f"{since + 3} [user.created]")
+    log.close()
+
+
+def test_presence_routes_to_interested_replicas():
+    """
+    Test finding the replicas interested in an event.
+
+    Verifies that events are routed to the replicas with matching subscriptions or
+    unfiltered clients, and that replicas stop receiving events once they left or
+    their advertisement expired.
+    """
+    presence = Presence()
+    assert presence.update("a", False, [("review.created", "p1")], ttl=10)
+    assert presence.update("b", False, [("user.*", None)], ttl=10)
+    assert presence.update("c", True, [], ttl=-1)
+    assert not presence.update("a", False, [("review.created", "p1")], ttl=10)
+
+    assert presence.replicas_for("review.created", ["p1", "u1"]) == ["a"]
+    assert presence.replicas_for("review.created", ["p2"]) == []
+    assert presence.replicas_for("user.created", ["u1"]) == ["b"]
+    assert "c" not in presence.replicas
+
+    presence.remove("b")
+    assert presence.replicas_for("user.created", ["u1"]) == []
+
+
+@pytest.mark.asyncio
+async def test_cluster_router_delivery():
+    """
+    Test routing events between replicas.
+
+    Verifies that a replica advertises the subscriptions of its clients, forwards
+    events to the delivery subjects of interested replicas only, and delivers the
+    forwarded events to its own clients.
+    """
+    index = SubscriptionIndex()
+    index.add("client")
+    index.subscribe("client", "review.created", "p1")
+    service = AsyncMock()
+    router = ClusterRouter(AsyncMock(), service, index, "replica-1")
+
+    await router.advertise()
+    subject, data = router.nc.publish.call_args[0]
+    assert subject == "notifications.presence"
+    assert json.loads(data)["subscriptions"] == [["review.created", "p1"]]
+
+    other = AsyncMock()
+    other.data = json.dumps(
+        {
+            "replica_id": "replica-2",
+            "unfiltered": False,
+            "subscriptions": [["user.created", "u1"]],
+            "ttl": 15,
+        }
+    ).encode()
+    await router.handle_presence(other)
+    assert router.changed.is_set()
+
+    router.nc.publish.reset_mock()
+    review = '{"actor": {"actor_id": "u1"}, "object": {"product_id": "p1"}}'
+    await router.route("review.created", review)
+    await router.route("user.created", '{"object": {"user_id": "u1"}}')
+    assert [call[0][0] for call in router.nc.publish.call_args_list] == [
+        "notifications.deliver.replica-1",
+        "notifications.deliver.replica-2",
+    ]
+
+    delivery = AsyncMock()
+    delivery.data = router.nc.publish.call_args_list[0][0][1]
+    await router.handle_delivery(delivery)
+    service.send_notification.assert_called_once_with("review.created", review)
+
+    router.client_left(False, [("review.created", "p1")])
+    index.remove("client")
+    assert router.local_interests() == (False, [("review.created", "p1")])
+
+
+@pytest.mark.asyncio
+async def test_presence_split_in_parts():
+    """
+    Test advertising more subscriptions than fit in one presence message.
+
+    Verifies that every message stays under the size limit, and that the other
+    replicas only apply the advertisement once all of its parts arrived.
+    """
+    index = SubscriptionIndex()
+    index.add("client")
+    for n in range(50):
+        index.subscribe("client", "review.created", f"product-{n}")
+    sender = ClusterRouter(
+        AsyncMock(), AsyncMock(), index, "replica-1", max_presence_bytes=500
+    )
+    await sender.advertise()
+    messages = [call[0][1] for call in sender.nc.publish.call_args_list]
+    assert len(messages) > 1
+    assert all(len(message) <= 500 for message in messages)
+
+    receiver = ClusterRouter(AsyncMock(), AsyncMock(), SubscriptionIndex(), "r2")
+    for message in messages:
+        assert "replica-1" not in receiver.presence.replicas
+        await receiver.handle_presence(AsyncMock(data=message))
+    interest = receiver.presence.replicas["replica-1"]
+    assert len(interest.subjects) == 50
+    assert receiver.presence.replicas_for("review.created", ["product-49"]) == [
+        "replica-1"
+    ]
+
+
+def test_websocket_replay_foreign_cursor(client):
+    """
+    Test reconnecting with the cursor of another replica.
+
+    Verifies that the cursor is recognized by its replica id, and that the client
+    receives the notifications this replica keeps rather than those after an
+    unrelated sequence number.
+    """
+    assert parse_cursor("replica-2:7") == ("replica-2", 7)
+    assert parse_cursor("7") == (None, 7)
+
+    service = NotificationService()
+    service.notification_type = "in_app"
+    connected_clients.clear()
+    event = '{"actor": {"actor_id": "u9"}, "object": {}}'
+    asyncio.run(service.send_notification("user.created", event))
+    seq = notification_history.last_seq
+
+    with client.websocket_connect(f"/ws?seq=1&id=u9&since=replica-2:{seq}") as ws:
+        assert ws.receive_text().startswith(f"{seq} [user.created]")